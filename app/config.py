@@ -1,21 +1,34 @@
-import yaml
+import os
 import logging
 
 class Config:
-    def __init__(self, config_file: str = 'config.yaml'):
+    """
+    配置在第一次 get() 时才读取并解析 YAML，创建对象本身没有任何 I/O；
+    日志也不在导入时初始化，由 lifespan 启动阶段（或脚本入口）显式调用 setup_logging()。
+    """
+
+    def __init__(self, config_file: str = os.environ.get('HELLO_NIHONGO_CONFIG', 'config.yaml')):
         self.config_file = config_file
-        self.config_data = self.load_config()
-        self.setup_logging()
-        
+        self._config_data = None
+
+    @property
+    def config_data(self) -> dict:
+        if self._config_data is None:
+            self._config_data = self.load_config()
+        return self._config_data
+
     def load_config(self) -> dict:
+        import yaml
+        # 有 libyaml 时使用 C 实现的加载器
+        loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
         try:
             with open(self.config_file, 'r', encoding='utf-8') as f:
-                config = yaml.safe_load(f)
+                config = yaml.load(f, Loader=loader)
                 return config or {}
         except FileNotFoundError:
             logging.error(f'配置文件{self.config_file}未找到，使用默认配置。')
             return {}
-    
+
     def get(self, key: str, default=None):
         keys = key.split('.')
         value = self.config_data
@@ -25,19 +38,9 @@ class Config:
             return value
         except (KeyError, ValueError):
             return default
-    
+
     def setup_logging(self):
-        log_level = self.get('logging.level', 'INFO').upper()
-        log_format = self.get('logging.format', '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        log_file = self.get('logging.file', 'app.log')
-        
-        logging.basicConfig(
-            level=log_level,
-            format=log_format,
-            handlers=[
-                logging.FileHandler(log_file, encoding='utf-8'),
-                logging.StreamHandler()
-            ]
-        )
-        
+        from app.logs import setup_logging
+        setup_logging(self.get)
+
 config = Config()
\ No newline at end of file
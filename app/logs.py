@@ -0,0 +1,124 @@
+import os
+import json
+import queue
+import atexit
+import logging
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+DEFAULT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出一行 JSON，便于日志系统采集"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+class _EnqueueHandler(QueueHandler):
+    """
+    标准 QueueHandler 入队前会调用 format() 把消息格式化好，格式化仍然发生在请求所在的线程；
+    这里只合并 msg 与 args，时间、JSON 等格式化交给后台线程的 handler。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            # 异常对象含 traceback 帧，不能跨线程长期持有，先转成文本
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+_listener: QueueListener | None = None
+
+def setup_logging(get):
+    """
+    按配置初始化根日志器，get 为 Config.get。
+    logging.queue 为 true 时请求线程只把日志放进队列，写文件与控制台由 QueueListener 的后台线程完成，
+    磁盘变慢时不会阻塞事件循环。
+    """
+    global _listener
+    level = get('logging.level', 'INFO').upper()
+    if get('logging.json', False):
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(get('logging.format', DEFAULT_FORMAT))
+
+    handlers = []
+    log_file = get('logging.file', 'app.log')
+    if log_file:
+        max_bytes = get('logging.max_bytes', 10 * 1024 * 1024)
+        # 多个 worker 各自轮转同一个文件会互相覆盖，此时只追加写入，轮转交给 logrotate（copytruncate）
+        multi_process = os.environ.get('HELLO_NIHONGO_WORKERS', '1') not in ('', '0', '1')
+        if max_bytes and not multi_process:
+            handlers.append(RotatingFileHandler(log_file, maxBytes=max_bytes,
+                                                backupCount=get('logging.backup_count', 5), encoding='utf-8'))
+        else:
+            handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+    if get('logging.console', True):
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    root = logging.getLogger()
+    stop_logging()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    root.setLevel(level)
+
+    if get('logging.queue', True):
+        # 队列无上限：宁可占用内存也不在请求线程里阻塞或丢日志
+        log_queue = queue.SimpleQueue()
+        root.addHandler(_EnqueueHandler(log_queue))
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+    else:
+        for handler in handlers:
+            root.addHandler(handler)
+
+def stop_logging():
+    """停止后台写日志线程并写完队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+atexit.register(stop_logging)
+
+class SampledLogger:
+    """
+    逐 token 的调试日志只按 1/every 采样输出。
+    DEBUG 未开启时 debug() 直接返回，不计数也不格式化参数；消息使用 % 占位符，只有真正输出时才格式化。
+    """
+
+    def __init__(self, logger: logging.Logger, every=100):
+        self.logger = logger
+        # every 也可以是返回采样间隔的函数，第一次输出时才调用，模块级实例因此不必在导入时读取配置
+        self._every = every
+        self._count = 0
+
+    @property
+    def every(self) -> int:
+        if callable(self._every):
+            self._every = self._every()
+        return max(int(self._every), 1)
+
+    def debug(self, msg: str, *args):
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        self._count += 1
+        if (self._count - 1) % self.every:
+            return
+        if self.every > 1:
+            msg += f'（每 {self.every} 条记录 1 条）'
+        self.logger.debug(msg, *args)
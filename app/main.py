@@ -1,46 +1,122 @@
-from fastapi import FastAPI, HTTPException, Request, Depends, Response
-from fastapi.responses import RedirectResponse, JSONResponse, HTMLResponse, StreamingResponse
+from fastapi import FastAPI, HTTPException, Request, Depends, Response, Query
+from fastapi.responses import RedirectResponse, JSONResponse, HTMLResponse, StreamingResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from app.models.database import SessionLocal, TranslationRecord
-from app.services.translation import process_translation
-from app.services.alipay import build_alipay_login_url, get_access_token, get_user_info
-from app.services.session import create_user_session, get_user_session, delete_user_session
+from starlette.requests import ClientDisconnect
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import config
+from app.models.database import AsyncSessionLocal, TranslationRecord, init_database, close_database
+from app.services.translation import (
+    process_translation, prompt_fingerprint, get_singleflight_stats, get_stream_stats, get_upstream_stats
+)
+from app.services.alipay import (
+    build_alipay_login_url, get_access_token, get_user_info, init_alipay_client, close_alipay_client
+)
+from app.services.session import (
+    create_user_session, get_cached_user_session, load_user_session, delete_user_session,
+    start_session_sweeper, stop_session_sweeper, get_session_stats
+)
+from app.services.deepseek_client import init_client, close_client, get_pool_stats
+from app.services.cache import init_cache, close_cache, get_cache
+from app.services.batch import run_batch, validate_sentences
+from app.services.sse import format_event
+from app.services.usage import start_usage_flusher, stop_usage_flusher, get_user_usage, get_usage_tracker_stats
+from app.services.lifecycle import mark_ready, is_ready, is_draining, start_draining, install_drain_handlers
+from app.services.metrics import (
+    Histogram, MetricsMiddleware, render_metrics, start_loop_lag_monitor, stop_loop_lag_monitor
+)
+from app.services.transfer import export_records, import_records, MEDIA_TYPES, FORMAT_JSONL
+from app.services.records import (
+    search_records, search_records_after, invalidate_count_cache, InvalidCursor, TOTAL_EXACT, TOTAL_NONE
+)
+from contextlib import asynccontextmanager
 from traceback import format_exc
 from functools import wraps
+import time
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+AUTH_SECONDS = Histogram(
+    'login_required_seconds', 'login_required 校验会话的耗时', ('result',),
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 导入本模块没有副作用：日志、建表迁移、连接池都在这里初始化
+    config.setup_logging()
+    await asyncio.to_thread(init_database)
+    await init_client()
+    await init_alipay_client()
+    init_cache(prompt_fingerprint())
+    start_session_sweeper()
+    start_usage_flusher()
+    start_loop_lag_monitor()
+    install_drain_handlers()
+    mark_ready()
+    try:
+        yield
+    finally:
+        start_draining()
+        await stop_loop_lag_monitor()
+        await stop_session_sweeper()
+        await stop_usage_flusher()
+        close_cache()
+        await close_alipay_client()
+        await close_client()
+        await close_database()
+
 app = FastAPI(
     title='日语造句能力提升应用',
     version='1.0.0',
-    description='一个帮助用户进行中日双向翻译、平假名注释和语法解析的应用。'
+    description='一个帮助用户进行中日双向翻译、平假名注释和语法解析的应用。',
+    lifespan=lifespan
 )
 
+app.add_middleware(MetricsMiddleware)
+
 app.mount('/static', StaticFiles(directory='static'), name='static')
 
-templates = Jinja2Templates(directory='static')
+_templates = None
 
-def get_db():
-    db = SessionLocal()
-    try:
+def get_templates():
+    """Jinja2 只有首页用到，第一次渲染时再导入"""
+    global _templates
+    if _templates is None:
+        from fastapi.templating import Jinja2Templates
+        _templates = Jinja2Templates(directory='static')
+    return _templates
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 def login_required(func):
     @wraps(func)
     async def wrapper(request: Request, *args, **kwargs):
+        started = time.perf_counter()
         session_id = request.cookies.get("session_id")
         if not session_id:
+            AUTH_SECONDS.observe(time.perf_counter() - started, 'anonymous')
             return RedirectResponse("/login-prompt")
 
-        db = kwargs.get('db') or next(get_db())
-        user_session = get_user_session(db, session_id)
+        # 缓存命中时不需要数据库会话
+        result = 'cache'
+        user_session = get_cached_user_session(session_id)
+        if user_session is None:
+            result = 'db'
+            db = kwargs.get('db')
+            if db is not None:
+                user_session = await load_user_session(db, session_id)
+            else:
+                async with AsyncSessionLocal() as db:
+                    user_session = await load_user_session(db, session_id)
         if not user_session:
+            AUTH_SECONDS.observe(time.perf_counter() - started, 'invalid')
             return RedirectResponse("/login-prompt")
+        AUTH_SECONDS.observe(time.perf_counter() - started, result)
         request.state.user_session = user_session
 
         return await func(request, *args, **kwargs)
@@ -57,79 +133,214 @@ async def global_exception_handler(request: Request, exc: Exception):
 @app.get('/', response_class=HTMLResponse)
 @login_required
 async def read_index(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return get_templates().TemplateResponse("index.html", {"request": request})
 
 @app.post('/records', response_model=dict)
 @login_required
-async def save_translation(request: Request, data: dict, db: Session = Depends(get_db)):
+async def save_translation(request: Request, data: dict, db: AsyncSession = Depends(get_db)):
     try:
         record = TranslationRecord(
             original_sentence=data['original'],
             translated_sentence=data['translated'],
             furigana=data['furigana'],
-            grammar=data['grammar']
+            grammar=data['grammar'],
+            open_id=request.state.user_session.open_id
         )
         db.add(record)
-        db.commit()
+        await db.commit()
+        invalidate_count_cache(record.open_id)
         return {'message': '保存成功！'}
     except Exception as e:
         logger.error(f'保存到数据库失败：{format_exc()}')
         raise HTTPException(status_code=500, detail='保存失败，请稍后重试。')
 
 @app.get("/process")
-async def process_sentence(request: Request, sentence: str):
+@login_required
+async def process_sentence(request: Request, sentence: str, protocol: int = Query(1, ge=1, le=2)):
     """
     处理翻译请求，返回流式数据。
     前端应使用 EventSource 监听返回的流数据。
+    protocol=1 每个事件都是完整结果，protocol=2 只发送增量并以 done 事件结束。
+    用量记到当前用户名下；超过每日额度或请求过于频繁时返回 error 事件，不会请求上游。
     """
     logger.debug('[process_sentence] 进入process_translation之前')
-    generator = await process_translation(sentence)
-    logger.debug(f'[process_sentence] 获取到generator, 类型为：{type(generator)}')
+    generator = await process_translation(sentence, protocol, request.state.user_session.open_id)
+    logger.debug('[process_sentence] 获取到generator, 类型为：%s', type(generator))
     return generator
 
+@app.post('/process/batch')
+@login_required
+async def process_batch(request: Request, data: dict):
+    """
+    批量翻译：请求体 {"sentences": [...], "save": false}。
+    以 SSE 格式按完成顺序返回每句的结果（带 index），最后一个事件为 {"type": "done", ...}；
+    save 为 true 时全部完成后在一个事务里写入当前用户的记录。
+    """
+    try:
+        sentences = validate_sentences(data.get('sentences'))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    open_id = request.state.user_session.open_id
+    logger.info(f'[process_batch] {open_id} 提交 {len(sentences)} 个句子，save={bool(data.get("save"))}')
+
+    async def stream_generator():
+        async for event in run_batch(sentences, open_id, bool(data.get('save'))):
+            yield format_event(event)
+
+    return StreamingResponse(stream_generator(), media_type="text/event-stream")
+
+@app.get('/stats/pool', response_model=dict)
+async def pool_stats():
+    """DeepSeek 连接池状态"""
+    return get_pool_stats()
+
+@app.get('/stats/cache', response_model=dict)
+async def cache_stats():
+    """翻译缓存命中统计"""
+    cache = get_cache()
+    return cache.stats() if cache else {'enabled': False}
+
+@app.get('/stats/singleflight', response_model=dict)
+async def singleflight_stats():
+    """合并请求统计"""
+    return get_singleflight_stats()
+
+@app.get('/stats/stream', response_model=dict)
+async def stream_stats():
+    """SSE 流的首字节时间与总耗时"""
+    return get_stream_stats()
+
+@app.get('/stats/upstream', response_model=dict)
+async def upstream_stats():
+    """上游重试、对冲与熔断状态"""
+    return get_upstream_stats()
+
+@app.get('/stats/usage', response_model=dict)
+async def usage_tracker_stats():
+    """用量计数的批量写入情况"""
+    return get_usage_tracker_stats()
+
+@app.get('/usage', response_model=dict)
+@login_required
+async def get_usage(request: Request, days: int = Query(1, ge=1, le=90)):
+    """当前用户今天的请求数与 token 用量、每日额度；days > 1 时附带最近 days 天的明细"""
+    return await get_user_usage(request.state.user_session.open_id, days)
+
+@app.get('/healthz', response_model=dict)
+async def healthz():
+    """存活检查：进程能处理请求即返回 200"""
+    return {'status': 'ok'}
+
+@app.get('/readyz', response_model=dict)
+async def readyz():
+    """就绪检查：启动完成、未在关闭且数据库可用时返回 200，否则 503（负载均衡据此摘除实例）"""
+    if not is_ready():
+        return JSONResponse(status_code=503, content={'status': 'draining' if is_draining() else 'starting'})
+    try:
+        async with AsyncSessionLocal() as db:
+            await db.execute(text('SELECT 1'))
+    except Exception as e:
+        logger.error(f'[readyz] 数据库不可用：{e}')
+        return JSONResponse(status_code=503, content={'status': 'database_unavailable'})
+    return {'status': 'ready'}
+
+@app.get('/metrics', response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus 文本格式的指标"""
+    return PlainTextResponse(render_metrics(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.get('/stats/session', response_model=dict)
+async def session_stats(db: AsyncSession = Depends(get_db)):
+    """会话缓存命中率与 user_sessions 表大小"""
+    return await get_session_stats(db)
+
 @app.get('/records', response_model=dict)
 @login_required
-async def get_records(request: Request, query: str = '', page: int = 1, limit: int = 5, db: Session = Depends(get_db)):
+async def get_records(request: Request, query: str = '', page: int = Query(1, ge=1),
+                      limit: int = Query(5, ge=1, le=100), cursor: str | None = None,
+                      total: str | None = Query(None, pattern='^(exact|cached|estimate|none)$'),
+                      db: AsyncSession = Depends(get_db)):
+    """
+    只返回当前用户的记录。两种分页方式：
+    - 页码（page）：返回 records / total / totalPages，默认精确计数，供现有前端使用；
+    - 游标（传入 cursor，第一页传空字符串）：按 id 倒序，返回 records / next_cursor，
+      默认不计算总数，可通过 total=exact|cached|estimate 获取。
+    """
     try:
-        query = f'%{query}%'
-        records_query = db.query(TranslationRecord).filter(
-            (TranslationRecord.original_sentence.like(query)) |
-            (TranslationRecord.translated_sentence.like(query))
-        )
-        
-        total_records = records_query.count()
-        total_pages = (total_records + limit - 1) // limit
-        
-        records = records_query.offset((page - 1) * limit).limit(limit).all()
-        
+        query = query.strip()
+        open_id = request.state.user_session.open_id
+        if cursor is not None:
+            records, next_cursor, total_records = await search_records_after(
+                db, open_id, query, cursor, limit, total or TOTAL_NONE
+            )
+            result = {'records': records, 'next_cursor': next_cursor}
+            if total_records is not None:
+                result['total'] = total_records
+            return result
+
+        records, total_records = await search_records(db, open_id, query, page, limit, total or TOTAL_EXACT)
+        total_pages = (total_records + limit - 1) // limit if total_records is not None else None
+
         return {
-            'records': [
-                {
-                    'id': record.id,
-                    'original_sentence': record.original_sentence,
-                    'translated_sentence': record.translated_sentence,
-                    'furigana': record.furigana,
-                    'grammar': record.grammar
-                }
-                for record in records
-            ],
+            'records': records,
+            'total': total_records,
             'totalPages': total_pages
         }
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f'查询记录失败：{format_exc()}')
         raise HTTPException(status_code=500, detail=f'查询记录失败：{str(e)}')
     
+@app.get('/records/export')
+@login_required
+async def export_user_records(request: Request, format: str = Query(FORMAT_JSONL, pattern='^(jsonl|csv)$')):
+    """以 JSONL 或 CSV 流式导出当前用户的全部记录，按 id 递增，内存占用与记录数无关"""
+    open_id = request.state.user_session.open_id
+    filename = f'records-{time.strftime("%Y%m%d")}.{format}'
+    return StreamingResponse(
+        export_records(open_id, format),
+        media_type=MEDIA_TYPES[format],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
+
+@app.post('/records/import', response_model=dict)
+@login_required
+async def import_user_records(request: Request, format: str = Query(FORMAT_JSONL, pattern='^(jsonl|csv)$')):
+    """
+    导入记录：请求体直接是 JSONL 或 CSV 文件内容（如 curl --data-binary @records.jsonl），边接收边解析，
+    分批写入当前用户名下，original_sentence 与已有记录相同的跳过。字段与导出一致，id 列忽略。
+    返回 {rows, imported, duplicates, invalid, errors}；内容无法继续解析时返回 400，已写入的批次保留。
+    """
+    open_id = request.state.user_session.open_id
+    try:
+        result = await import_records(open_id, request.stream(), format)
+    except ClientDisconnect:
+        logger.warning(f'[import_user_records] {open_id} 上传中断，已写入的批次保留')
+        raise HTTPException(status_code=400, detail='上传中断')
+    except Exception as e:
+        logger.error(f'导入记录失败：{format_exc()}')
+        raise HTTPException(status_code=500, detail=f'导入记录失败：{str(e)}')
+    if result.get('error'):
+        return JSONResponse(status_code=400, content=result)
+    return result
+
 @app.delete('/records/{id}')
 @login_required
-async def delete_record(request: Request, id: int, db: Session = Depends(get_db)):
+async def delete_record(request: Request, id: int, db: AsyncSession = Depends(get_db)):
     try:
-        record = db.query(TranslationRecord).filter(TranslationRecord.id == id).first()
-        if not record:
+        # 不属于当前用户的记录同样视为不存在
+        open_id = request.state.user_session.open_id
+        record = await db.get(TranslationRecord, id)
+        if not record or record.open_id != open_id:
             raise HTTPException(status_code=404, detail='记录不存在')
         
-        db.delete(record)
-        db.commit()
+        await db.delete(record)
+        await db.commit()
+        invalidate_count_cache(open_id)
         return {'message': '删除成功'}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f'删除记录失败：{format_exc()}')
         raise HTTPException(status_code=500, detail=f'删除记录失败：{str(e)}')
@@ -139,12 +350,12 @@ async def alipay_login():
     return build_alipay_login_url()
 
 @app.get('/alipay/callback')
-async def alipay_callback(auth_code: str, response: Response, db: Session = Depends(get_db)):
+async def alipay_callback(auth_code: str, response: Response, db: AsyncSession = Depends(get_db)):
     try:
-        access_token = get_access_token(auth_code)
-        user_info = get_user_info(access_token)
+        access_token = await get_access_token(auth_code)
+        user_info = await get_user_info(access_token)
 
-        session_id = create_user_session(
+        session_id = await create_user_session(
             db,
             open_id=user_info.get("open_id"),
             avatar=user_info.get("avatar"),
@@ -184,10 +395,10 @@ async def login_prompt():
 
 @app.get("/logout", response_class=RedirectResponse)
 @login_required
-async def logout(request: Request, response: Response, db: Session = Depends(get_db)):
+async def logout(request: Request, response: Response, db: AsyncSession = Depends(get_db)):
     session_id = request.cookies.get("session_id")
     if session_id:
-        delete_user_session(db, session_id)
+        await delete_user_session(db, session_id)
         response.delete_cookie("session_id")
     response.status_code = 303
     response.headers["Location"] = "/login-prompt"
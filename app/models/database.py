@@ -1,13 +1,95 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime
+from sqlalchemy import create_engine, event, Column, Index, Integer, String, Text, DateTime
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker
+import time
 from datetime import datetime
+from app.config import config
+from app.models.migrations import run_migrations, assign_legacy_records
+from app.services.metrics import Histogram, GaugeFunc
+from app.services.lifecycle import file_lock
 
-DATABASE_URL = 'sqlite:///./translations.db'
+# WAL 允许读写并发；synchronous=NORMAL 在 WAL 下仍能保证一致性且少一次 fsync
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -20000,       # 约 20MB 页缓存
+    'temp_store': 'MEMORY',
+    'mmap_size': 268435456,
+}
 
-engine = create_engine(DATABASE_URL, connect_args={'check_same_thread': False})
+def database_path() -> str:
+    return config.get('database.path', './translations.db')
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in {**DEFAULT_PRAGMAS, **(config.get('database.pragmas') or {})}.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+
+DB_QUERY_SECONDS = Histogram(
+    'db_query_duration_seconds', '单条 SQL 的执行耗时（异步引擎）', ('statement',),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    # 只按语句类型打标签，SQL 文本本身基数太高
+    DB_QUERY_SECONDS.observe(time.perf_counter() - started, statement.lstrip().split(None, 1)[0].upper())
+
+# 引擎在第一次使用时（通常是 lifespan 中的 init_database）才按配置创建，导入本模块不读取配置；
+# 会话工厂先不绑定引擎，创建异步引擎时再绑定
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+AsyncSessionLocal = async_sessionmaker(class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+_engine = None
+_async_engine = None
+
+def get_engine():
+    """同步引擎只用于建表和离线脚本，请求处理使用异步引擎"""
+    global _engine
+    if _engine is None:
+        _engine = create_engine(f'sqlite:///{database_path()}', connect_args={'check_same_thread': False})
+        event.listen(_engine, 'connect', _set_sqlite_pragmas)
+        SessionLocal.configure(bind=_engine)
+    return _engine
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            f'sqlite+aiosqlite:///{database_path()}',
+            pool_size=config.get('database.pool_size', 5),
+            max_overflow=config.get('database.max_overflow', 10),
+        )
+        sync_engine = _async_engine.sync_engine
+        event.listen(sync_engine, 'connect', _set_sqlite_pragmas)
+        event.listen(sync_engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(sync_engine, 'after_cursor_execute', _after_cursor_execute)
+        AsyncSessionLocal.configure(bind=_async_engine)
+    return _async_engine
+
+async def close_database():
+    """释放两个引擎的连接池，之后再次使用时重新创建"""
+    global _engine, _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
+
+def _pool_usage() -> dict:
+    if _async_engine is None:
+        return {}
+    pool = _async_engine.pool
+    return {('checked_out',): pool.checkedout(), ('idle',): pool.checkedin(), ('overflow',): max(pool.overflow(), 0)}
+
+GaugeFunc('db_pool_connections', '异步引擎连接池中的连接数', _pool_usage, ('state',))
 
 Base = declarative_base()
 
@@ -19,7 +101,12 @@ class TranslationRecord(Base):
     translated_sentence = Column(String, index=True, nullable=False)
     furigana = Column(String, index=True, nullable=False)
     grammar = Column(Text, nullable=False)
-    
+    # 记录所属用户；迁移前的旧记录可能为 NULL
+    open_id = Column(String(255), nullable=True)
+
+    # 按用户列出、翻页都走这个索引，不扫描其他用户的记录
+    __table_args__ = (Index('ix_translations_open_id_id', 'open_id', 'id'),)
+
 class UserSession(Base):
     __tablename__ = 'user_sessions'
 
@@ -27,10 +114,31 @@ class UserSession(Base):
     open_id = Column(String(255), nullable=False)
     avatar = Column(Text, nullable=True)
     nick_name = Column(String(255), nullable=True)
-    expires_at = Column(DateTime, nullable=False)
+    # 清理过期会话时按该列范围查询
+    expires_at = Column(DateTime, nullable=False, index=True)
 
     def is_valid(self) -> bool:
         """检查会话是否有效"""
         return self.expires_at > datetime.now()
 
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+class UserUsage(Base):
+    """每个用户每天的翻译请求数与 token 用量，由 app.services.usage 定期批量累加写入"""
+    __tablename__ = 'user_usage'
+
+    open_id = Column(String(255), primary_key=True)
+    day = Column(String(10), primary_key=True)  # YYYY-MM-DD，服务器本地日期
+    requests = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+
+def init_database():
+    """
+    建表并执行迁移。多个 worker 或实例同时启动时用文件锁串行执行，
+    后拿到锁的进程看到表和 user_version 已是最新，只做检查。
+    """
+    engine = get_engine()
+    get_async_engine()
+    with file_lock(f'{database_path()}.init.lock'):
+        Base.metadata.create_all(bind=engine)
+        run_migrations(engine)
+        assign_legacy_records(engine)
@@ -0,0 +1,106 @@
+import logging
+from sqlalchemy.engine import Engine, Connection
+from sqlalchemy.exc import OperationalError
+from app.config import config
+
+logger = logging.getLogger(__name__)
+
+def _create_translations_fts(conn: Connection):
+    """
+    为 translations 建立 FTS5 全文索引（外部内容表，由触发器保持同步）。
+    trigram 分词对中文、日文这类没有空格分词的文本同样有效，查询词至少 3 个字符。
+    """
+    conn.exec_driver_sql(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS translations_fts USING fts5("
+        "original_sentence, translated_sentence, grammar, "
+        "content='translations', content_rowid='id', tokenize='trigram')"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS translations_fts_ai AFTER INSERT ON translations BEGIN "
+        "INSERT INTO translations_fts(rowid, original_sentence, translated_sentence, grammar) "
+        "VALUES (new.id, new.original_sentence, new.translated_sentence, new.grammar); "
+        "END"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS translations_fts_ad AFTER DELETE ON translations BEGIN "
+        "INSERT INTO translations_fts(translations_fts, rowid, original_sentence, translated_sentence, grammar) "
+        "VALUES ('delete', old.id, old.original_sentence, old.translated_sentence, old.grammar); "
+        "END"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS translations_fts_au AFTER UPDATE ON translations BEGIN "
+        "INSERT INTO translations_fts(translations_fts, rowid, original_sentence, translated_sentence, grammar) "
+        "VALUES ('delete', old.id, old.original_sentence, old.translated_sentence, old.grammar); "
+        "INSERT INTO translations_fts(rowid, original_sentence, translated_sentence, grammar) "
+        "VALUES (new.id, new.original_sentence, new.translated_sentence, new.grammar); "
+        "END"
+    )
+    # 回填已有记录
+    conn.exec_driver_sql("INSERT INTO translations_fts(translations_fts) VALUES ('rebuild')")
+
+def _add_record_owner(conn: Connection):
+    """translations 增加 open_id 列与 (open_id, id) 复合索引，记录按用户隔离"""
+    columns = {row[1] for row in conn.exec_driver_sql('PRAGMA table_info(translations)')}
+    if 'open_id' not in columns:
+        conn.exec_driver_sql('ALTER TABLE translations ADD COLUMN open_id VARCHAR(255)')
+    conn.exec_driver_sql(
+        'CREATE INDEX IF NOT EXISTS ix_translations_open_id_id ON translations (open_id, id)'
+    )
+    # 旧记录的归属由 assign_legacy_records 在每次启动时处理
+
+def _index_session_expiry(conn: Connection):
+    """后台清理过期会话时按 expires_at 查找，避免每批都全表扫描"""
+    conn.exec_driver_sql(
+        'CREATE INDEX IF NOT EXISTS ix_user_sessions_expires_at ON user_sessions (expires_at)'
+    )
+
+# (版本号, 名称, 迁移函数)，版本号记录在 PRAGMA user_version 中，只能追加
+MIGRATIONS = [
+    (1, 'translations_fts', _create_translations_fts),
+    (2, 'record_owner', _add_record_owner),
+    (3, 'session_expiry_index', _index_session_expiry),
+]
+
+def assign_legacy_records(engine: Engine):
+    """
+    迁移 2 之前的记录没有归属（open_id 为 NULL），任何用户都看不到。
+    配置了 records.legacy_owner 时把它们归给该用户；不放在版本化迁移里，升级之后再配置也能生效，重复执行没有影响。
+    未配置时只在启动日志中提示还有多少条无主记录。
+    """
+    with engine.begin() as conn:
+        columns = {row[1] for row in conn.exec_driver_sql('PRAGMA table_info(translations)')}
+        if 'open_id' not in columns:
+            return
+        legacy_owner = config.get('records.legacy_owner')
+        if legacy_owner:
+            updated = conn.exec_driver_sql(
+                'UPDATE translations SET open_id = ? WHERE open_id IS NULL', (legacy_owner,)
+            ).rowcount
+            if updated:
+                logger.info(f'[assign_legacy_records] {updated} 条旧记录归属到 {legacy_owner}')
+            return
+        orphaned = conn.exec_driver_sql('SELECT count(*) FROM translations WHERE open_id IS NULL').scalar()
+    if orphaned:
+        logger.warning(
+            f'[assign_legacy_records] 有 {orphaned} 条没有归属的旧记录，任何用户都看不到；'
+            f'在 config.yaml 中设置 records.legacy_owner 后重启即可归给该用户'
+        )
+
+def run_migrations(engine: Engine):
+    """依次执行尚未应用的迁移"""
+    with engine.connect() as conn:
+        version = conn.exec_driver_sql('PRAGMA user_version').scalar()
+
+    for target, name, migrate in MIGRATIONS:
+        if target <= version:
+            continue
+        try:
+            with engine.begin() as conn:
+                logger.info(f'[run_migrations] 执行迁移 {target}: {name}')
+                migrate(conn)
+                conn.exec_driver_sql(f'PRAGMA user_version = {target}')
+        except OperationalError as e:
+            # 例如 SQLite 未编译 FTS5，保持当前版本，下次启动重试
+            logger.error(f'[run_migrations] 迁移 {target}: {name} 失败：{e}')
+            break
+        version = target
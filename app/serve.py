@@ -0,0 +1,62 @@
+"""
+生产环境启动入口：
+
+    python -m app.serve                       # 按 config.yaml 的 server 段启动
+    python -m app.serve --workers 4 --port 8000
+
+与直接运行 uvicorn 的区别：
+- 在主进程中加锁完成建表与迁移，worker 启动时只做检查；
+- 多个 worker 进程共享同一个监听端口，优先使用 uvloop 与 httptools；
+- 收到 SIGTERM 后 /readyz 立即返回 503，进行中的 SSE 流最多再等待 graceful_timeout 秒。
+"""
+import os
+import argparse
+import uvicorn
+from app.services.lifecycle import WORKERS_ENV
+
+def _available(module: str) -> bool:
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+def main():
+    # worker 通过环境变量读取同一个配置文件；用绝对路径，避免 worker 的工作目录不同
+    config_file = os.path.abspath(os.environ.get('HELLO_NIHONGO_CONFIG', 'config.yaml'))
+    os.environ['HELLO_NIHONGO_CONFIG'] = config_file
+
+    from app.config import config
+
+    parser = argparse.ArgumentParser(description='hello_nihongo 生产环境启动入口')
+    parser.add_argument('--host', default=config.get('server.host', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=config.get('server.port', 8000))
+    parser.add_argument('--workers', type=int, default=config.get('server.workers', 0),
+                        help='worker 进程数，0 表示 CPU 核数')
+    parser.add_argument('--graceful-timeout', type=int, default=config.get('server.graceful_timeout', 30),
+                        help='关闭时等待进行中请求的最长秒数')
+    args = parser.parse_args()
+
+    workers = args.workers or os.cpu_count() or 1
+    # 在 fork 出 worker 之前设置，worker 据此分摊限额、选择日志写法
+    os.environ[WORKERS_ENV] = str(workers)
+
+    from app.models.database import init_database
+    config.setup_logging()
+    init_database()
+
+    uvicorn.run(
+        'app.main:app',
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        loop='uvloop' if _available('uvloop') else 'asyncio',
+        http='httptools' if _available('httptools') else 'h11',
+        timeout_graceful_shutdown=args.graceful_timeout,
+        access_log=config.get('server.access_log', False),
+        proxy_headers=True,
+        forwarded_allow_ips=config.get('server.forwarded_allow_ips', '127.0.0.1'),
+    )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from sqlalchemy import insert
+from app.config import config
+from app.models.database import AsyncSessionLocal, TranslationRecord
+from app.services.ratelimit import TokenBucket
+from app.services.lifecycle import worker_count
+from app.services.records import invalidate_count_cache
+from app.services.translation import translate, cached_result, TranslationError
+from app.services.usage import record_request
+
+logger = logging.getLogger(__name__)
+
+# 所有批量请求共用的上游并发与速率限制，避免一份大作业占满 DeepSeek 配额。
+# 限额是整个服务的总量，多 worker 部署时每个进程分得 1/N
+_semaphore: asyncio.Semaphore | None = None
+_rate_limiter: TokenBucket | None = None
+
+def _limits() -> tuple[asyncio.Semaphore, TokenBucket | None]:
+    global _semaphore, _rate_limiter
+    if _semaphore is None:
+        workers = worker_count()
+        _semaphore = asyncio.Semaphore(max(config.get('batch.concurrency', 4) // workers, 1))
+        rate = config.get('batch.requests_per_second', 5)
+        if rate and rate > 0:
+            burst = config.get('batch.burst', rate)
+            _rate_limiter = TokenBucket(rate / workers, max(burst / workers, 1))
+    return _semaphore, _rate_limiter
+
+def validate_sentences(sentences) -> list[str]:
+    """校验请求中的句子列表，不合法时抛出 ValueError"""
+    max_sentences = config.get('batch.max_sentences', 500)
+    if not isinstance(sentences, list) or not sentences:
+        raise ValueError('sentences 必须是非空列表')
+    if len(sentences) > max_sentences:
+        raise ValueError(f'一次最多提交 {max_sentences} 个句子')
+    cleaned = []
+    for index, sentence in enumerate(sentences):
+        if not isinstance(sentence, str) or not sentence.strip():
+            raise ValueError(f'第 {index} 个句子为空或不是字符串')
+        cleaned.append(sentence.strip())
+    return cleaned
+
+async def _translate_one(index: int, sentence: str, open_id: str) -> dict:
+    cached = await cached_result(sentence)
+    if cached is not None:
+        record_request(open_id)
+        # 命中缓存（含熔断期间的过期缓存）不占用上游并发与速率
+        return {'type': 'result', 'index': index, 'cached': True, 'result': {'original': sentence, **cached}}
+
+    semaphore, rate_limiter = _limits()
+    async with semaphore:
+        if rate_limiter is not None:
+            await rate_limiter.acquire()
+        try:
+            # 每日额度在 translate 中检查，超出时该句返回错误
+            result = await translate(sentence, use_cache=False, open_id=open_id)
+        except TranslationError as e:
+            return {'type': 'error', 'index': index, 'error': str(e)}
+        except Exception as e:
+            logger.error(f'[_translate_one] 第 {index} 句翻译失败：{e}')
+            return {'type': 'error', 'index': index, 'error': '未知错误'}
+    return {'type': 'result', 'index': index, 'cached': False, 'result': {'original': sentence, **result}}
+
+async def _save_results(open_id: str, results: list[dict]) -> int:
+    """在一个事务里批量写入翻译结果"""
+    rows = [
+        {
+            'original_sentence': result['original'],
+            'translated_sentence': result['translated'],
+            'furigana': result['furigana'],
+            'grammar': result['grammar'],
+            'open_id': open_id,
+        }
+        for result in results
+    ]
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(TranslationRecord), rows)
+        await db.commit()
+    invalidate_count_cache(open_id)
+    return len(rows)
+
+async def run_batch(sentences: list[str], open_id: str, save: bool = False):
+    """
+    并发翻译一组句子，按完成顺序产出事件：
+        {"type": "result", "index": 0, "cached": false, "result": {...}}
+        {"type": "error", "index": 3, "error": "..."}
+        {"type": "done", "total": 50, "succeeded": 49, "failed": 1, "saved": 49}
+    save=True 时在全部完成后把成功的结果一次性写入 translations；客户端中途断开则不保存。
+    """
+    tasks = [asyncio.create_task(_translate_one(index, sentence, open_id)) for index, sentence in enumerate(sentences)]
+    succeeded = []
+    failed = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            event = await next_done
+            if event['type'] == 'result':
+                succeeded.append((event['index'], event['result']))
+            else:
+                failed += 1
+            yield event
+    finally:
+        # 客户端断开时停止尚未完成的翻译
+        for task in tasks:
+            task.cancel()
+
+    saved = 0
+    if save and succeeded:
+        succeeded.sort(key=lambda item: item[0])
+        try:
+            saved = await _save_results(open_id, [result for _, result in succeeded])
+        except Exception as e:
+            logger.error(f'[run_batch] 批量保存失败：{e}')
+            yield {'type': 'error', 'index': None, 'error': '保存失败，请稍后重试。'}
+    yield {'type': 'done', 'total': len(sentences), 'succeeded': len(succeeded), 'failed': failed, 'saved': saved}
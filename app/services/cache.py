@@ -0,0 +1,234 @@
+import re
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from app.config import config
+from app.services.metrics import GaugeFunc
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+def normalize_sentence(sentence: str) -> str:
+    """归一化句子：NFKC（统一全角/半角）、去掉首尾空白并合并连续空白"""
+    return _WHITESPACE_RE.sub(' ', unicodedata.normalize('NFKC', sentence)).strip()
+
+def cache_key(sentence: str, fingerprint: str) -> str:
+    """缓存与合并请求共用的 key"""
+    raw = f'{fingerprint}\n{normalize_sentence(sentence)}'
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+class TranslationCache:
+    """
+    翻译结果缓存，key 为归一化句子 + 模型/提示词指纹的 sha256。
+    第一层是进程内 LRU（TTL + 条数 + 字节数淘汰），第二层是可选的 SQLite。
+    """
+
+    def __init__(self, fingerprint: str, ttl: float = 86400, max_entries: int = 10000,
+                 max_bytes: int = 64 * 1024 * 1024, sqlite_path: str | None = None,
+                 sqlite_ttl: float = 30 * 86400):
+        self.fingerprint = fingerprint
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sqlite_ttl = sqlite_ttl
+        # key -> (expires_at, size, value)
+        self._entries: OrderedDict[str, tuple[float, int, dict]] = OrderedDict()
+        self._bytes = 0
+        self._stats = {'hits': 0, 'sqlite_hits': 0, 'stale_hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0}
+
+        self._db = None
+        self._db_lock = threading.Lock()
+        if sqlite_path:
+            self._open_sqlite(sqlite_path)
+
+    def _open_sqlite(self, path: str):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS translation_cache ('
+            'key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, '
+            'value TEXT NOT NULL, created_at REAL NOT NULL)'
+        )
+        # 提示词或模型变化后，旧指纹的结果全部作废
+        deleted = self._db.execute(
+            'DELETE FROM translation_cache WHERE fingerprint != ?', (self.fingerprint,)
+        ).rowcount
+        self._db.commit()
+        if deleted:
+            logger.info(f'[TranslationCache] 提示词已变化，清理 {deleted} 条旧缓存')
+
+    def make_key(self, sentence: str) -> str:
+        return cache_key(sentence, self.fingerprint)
+
+    async def get(self, sentence: str, allow_stale: bool = False) -> dict | None:
+        """
+        查询缓存，命中返回 {translated, furigana, grammar}。
+        allow_stale=True 时也返回已过期的条目（上游不可用时兜底）。
+        """
+        value, _ = await self.lookup(sentence, allow_stale)
+        return value
+
+    async def lookup(self, sentence: str, allow_stale: bool = False) -> tuple[dict | None, bool]:
+        """
+        与 get() 相同，另外返回结果是否未过期。一次查询只计一次命中或未命中：
+        allow_stale=True 时先找未过期的（内存、SQLite），都没有再返回过期的条目。
+        """
+        key = self.make_key(sentence)
+        stale = None
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, size, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return value, True
+            # 过期条目暂不删除，由 LRU 淘汰，熔断期间还可以作为兜底
+            if allow_stale:
+                stale = value
+
+        if self._db is not None:
+            row = await asyncio.to_thread(self._sqlite_get, key, allow_stale)
+            if row is not None:
+                value, remaining = row
+                if remaining >= 0:
+                    self._stats['sqlite_hits'] += 1
+                    # 在内存中也不能活得比 SQLite 中的这一行更久
+                    self._put(key, value, min(self.ttl, remaining))
+                    return value, True
+                # 过期的行只用于这次兜底，不放进内存，否则会带着新的 TTL 被当作新鲜结果返回
+                if stale is None:
+                    stale = value
+
+        if stale is not None:
+            self._stats['stale_hits'] += 1
+            return stale, False
+        self._stats['misses'] += 1
+        return None, False
+
+    async def set(self, sentence: str, value: dict):
+        """写入缓存"""
+        value = {
+            'translated': value.get('translated', ''),
+            'furigana': value.get('furigana', ''),
+            'grammar': value.get('grammar', ''),
+        }
+        key = self.make_key(sentence)
+        self._put(key, value)
+        self._stats['sets'] += 1
+        if self._db is not None:
+            await asyncio.to_thread(self._sqlite_set, key, value)
+
+    def invalidate(self):
+        """清空所有缓存（内存与 SQLite）"""
+        self._entries.clear()
+        self._bytes = 0
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute('DELETE FROM translation_cache')
+                self._db.commit()
+        logger.info('[TranslationCache] 缓存已清空')
+
+    def stats(self) -> dict:
+        lookups = self._stats['hits'] + self._stats['sqlite_hits'] + self._stats['misses']
+        hit_ratio = (self._stats['hits'] + self._stats['sqlite_hits']) / lookups if lookups else 0.0
+        return {
+            **self._stats,
+            'hit_ratio': round(hit_ratio, 4),
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'sqlite': self._db is not None,
+            'fingerprint': self.fingerprint,
+        }
+
+    def close(self):
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+    def _put(self, key: str, value: dict, ttl: float | None = None):
+        size = len(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), size, value)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._stats['evictions'] += 1
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _sqlite_get(self, key: str, allow_stale: bool = False) -> tuple[dict, float] | None:
+        """返回 (value, 距离过期的秒数)，已过期时为负数"""
+        with self._db_lock:
+            row = self._db.execute(
+                'SELECT value, created_at FROM translation_cache WHERE key = ?', (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        remaining = row[1] + self.sqlite_ttl - time.time()
+        if remaining < 0 and not allow_stale:
+            return None
+        return json.loads(row[0]), remaining
+
+    def _sqlite_set(self, key: str, value: dict):
+        with self._db_lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO translation_cache (key, fingerprint, value, created_at) '
+                'VALUES (?, ?, ?, ?)',
+                (key, self.fingerprint, json.dumps(value, ensure_ascii=False), time.time())
+            )
+            self._db.commit()
+
+_cache: TranslationCache | None = None
+
+def init_cache(fingerprint: str) -> TranslationCache | None:
+    """按配置创建翻译缓存，未启用时返回 None"""
+    global _cache
+    if not config.get('cache.enabled', True):
+        logger.info('[init_cache] 翻译缓存未启用')
+        return None
+
+    sqlite_path = None
+    if config.get('cache.sqlite.enabled', False):
+        sqlite_path = config.get('cache.sqlite.path', './translation_cache.db')
+
+    _cache = TranslationCache(
+        fingerprint,
+        ttl=config.get('cache.ttl', 86400),
+        max_entries=config.get('cache.max_entries', 10000),
+        max_bytes=config.get('cache.max_bytes', 64 * 1024 * 1024),
+        sqlite_path=sqlite_path,
+        sqlite_ttl=config.get('cache.sqlite.ttl', 30 * 86400),
+    )
+    logger.info(f'[init_cache] 翻译缓存已创建，指纹={fingerprint}，sqlite={sqlite_path}')
+    return _cache
+
+def close_cache():
+    global _cache
+    if _cache is not None:
+        _cache.close()
+        _cache = None
+
+def get_cache() -> TranslationCache | None:
+    return _cache
+
+def _cache_usage() -> dict:
+    if _cache is None:
+        return {}
+    stats = _cache.stats()
+    return {('entries',): stats['entries'], ('bytes',): stats['bytes']}
+
+GaugeFunc('translation_cache_size', '内存翻译缓存的条目数与字节数', _cache_usage, ('unit',))
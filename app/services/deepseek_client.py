@@ -0,0 +1,119 @@
+import time
+import logging
+import httpx
+from app.config import config
+from app.services.metrics import GaugeFunc
+
+logger = logging.getLogger(__name__)
+
+_client: httpx.AsyncClient | None = None
+
+# 连接池等待时间统计（秒）
+_wait_stats = {
+    'requests': 0,
+    'wait_total': 0.0,
+    'wait_max': 0.0,
+}
+
+def _build_limits() -> httpx.Limits:
+    """根据配置构造连接池限制"""
+    return httpx.Limits(
+        max_connections=config.get('deepseek.pool.max_connections', 100),
+        max_keepalive_connections=config.get('deepseek.pool.max_keepalive_connections', 20),
+        keepalive_expiry=config.get('deepseek.pool.keepalive_expiry', 30),
+    )
+
+async def init_client() -> httpx.AsyncClient:
+    """创建应用生命周期内共享的 DeepSeek HTTP 客户端"""
+    global _client
+    if _client is not None:
+        return _client
+
+    http2 = config.get('deepseek.pool.http2', True)
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning('[init_client] 未安装 h2，DeepSeek 客户端回退到 HTTP/1.1')
+            http2 = False
+
+    _client = httpx.AsyncClient(
+        http2=http2,
+        limits=_build_limits(),
+        timeout=config.get('deepseek.timeout', 10),
+    )
+    logger.info(f'[init_client] DeepSeek 客户端已创建，http2={http2}')
+    return _client
+
+async def close_client():
+    """关闭共享客户端，释放连接池中的所有连接"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logger.info('[close_client] DeepSeek 客户端已关闭')
+
+async def get_client() -> httpx.AsyncClient:
+    """获取共享客户端，未初始化时（如脚本直接调用）按需创建"""
+    if _client is None:
+        return await init_client()
+    return _client
+
+def make_wait_tracer():
+    """
+    生成 httpcore trace 回调，用于统计请求在连接池中的等待时间。
+    第一个连接级事件（建立连接或发送请求头）出现时即视为拿到了连接。
+    """
+    started = time.perf_counter()
+    acquired = False
+
+    async def trace(event_name: str, info: dict):
+        nonlocal acquired
+        if acquired:
+            return
+        if event_name.startswith('connection.') or event_name.endswith('send_request_headers.started'):
+            acquired = True
+            wait = time.perf_counter() - started
+            _wait_stats['requests'] += 1
+            _wait_stats['wait_total'] += wait
+            _wait_stats['wait_max'] = max(_wait_stats['wait_max'], wait)
+
+    return trace
+
+def get_pool_stats() -> dict:
+    """返回连接池当前状态：使用中/空闲连接数、排队请求数以及等待时间"""
+    stats = {
+        'http2': False,
+        'connections': 0,
+        'in_use': 0,
+        'idle': 0,
+        'queued_requests': 0,
+        'wait_requests': _wait_stats['requests'],
+        'wait_avg_ms': 0.0,
+        'wait_max_ms': round(_wait_stats['wait_max'] * 1000, 3),
+    }
+    if _wait_stats['requests']:
+        stats['wait_avg_ms'] = round(_wait_stats['wait_total'] / _wait_stats['requests'] * 1000, 3)
+
+    if _client is None:
+        return stats
+
+    # httpx 没有公开连接池状态，这里读取底层 httpcore 连接池
+    pool = getattr(_client._transport, '_pool', None)
+    if pool is None:
+        return stats
+
+    connections = list(pool.connections)
+    idle = sum(1 for conn in connections if conn.is_idle())
+    stats['http2'] = getattr(pool, '_http2', False)
+    stats['connections'] = len(connections)
+    stats['idle'] = idle
+    stats['in_use'] = len(connections) - idle
+    stats['queued_requests'] = sum(1 for req in getattr(pool, '_requests', []) if req.is_queued())
+    return stats
+
+def _pool_usage() -> dict:
+    stats = get_pool_stats()
+    return {('in_use',): stats['in_use'], ('idle',): stats['idle'], ('queued',): stats['queued_requests']}
+
+GaugeFunc('upstream_pool_connections', 'DeepSeek 连接池中的连接与排队请求数', _pool_usage, ('state',))
@@ -0,0 +1,91 @@
+import os
+import signal
+import logging
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，只支持单进程运行
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# app.serve 启动多个 worker 时设置，worker 据此把进程内的限额按比例分摊
+WORKERS_ENV = 'HELLO_NIHONGO_WORKERS'
+
+def worker_count() -> int:
+    try:
+        return max(int(os.environ.get(WORKERS_ENV, '1')), 1)
+    except ValueError:
+        return 1
+
+@contextmanager
+def file_lock(path: str):
+    """跨进程互斥：同一时间只有一个进程能进入，其余进程阻塞等待"""
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+_held_locks = {}
+
+def hold_lock(path: str) -> bool:
+    """
+    尝试以非阻塞方式拿到文件锁并一直持有到进程退出，用于在多个 worker 中选出唯一执行后台任务的进程。
+    进程退出（包括崩溃）时锁由操作系统释放，其他进程重启后可以接手。
+    """
+    if fcntl is None:
+        return True
+    if path in _held_locks:
+        return True
+    f = open(path, 'a')
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    _held_locks[path] = f
+    return True
+
+# ready：启动完成且未开始关闭；draining：收到退出信号，正在等待进行中的流结束
+_state = {'ready': False, 'draining': False}
+
+def mark_ready():
+    _state['ready'] = True
+
+def is_ready() -> bool:
+    return _state['ready'] and not _state['draining']
+
+def is_draining() -> bool:
+    return _state['draining']
+
+def start_draining(reason: str = ''):
+    if not _state['draining']:
+        _state['draining'] = True
+        logger.info(f'[start_draining] 开始关闭{f"（{reason}）" if reason else ""}，/readyz 返回 503，等待进行中的请求结束')
+
+def install_drain_handlers():
+    """
+    在 uvicorn 的 SIGTERM/SIGINT 处理函数前加一层：先标记为 draining，让负载均衡尽快摘除本实例，
+    再交给 uvicorn 停止接受新连接、等待进行中的 SSE 流在 timeout_graceful_shutdown 内结束。
+    需要在 lifespan 启动阶段调用（此时 uvicorn 已经安装了自己的处理函数）。
+    """
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        previous = signal.getsignal(sig)
+        if not callable(previous):
+            continue
+
+        def handler(signum, frame, previous=previous):
+            start_draining(signal.Signals(signum).name)
+            previous(signum, frame)
+
+        try:
+            signal.signal(sig, handler)
+        except ValueError:
+            # 不在主线程（如测试客户端）时无法设置信号处理函数
+            return
@@ -0,0 +1,270 @@
+import json
+import random
+import asyncio
+import hashlib
+import logging
+from urllib.parse import urljoin
+import httpx
+from app.config import config
+from app.logs import SampledLogger
+from app.services.deepseek_client import get_client, make_wait_tracer
+
+logger = logging.getLogger(__name__)
+# 每个 token 一条的调试日志只采样输出
+_delta_log = SampledLogger(logger, lambda: config.get('logging.sample.token_debug_every', 100))
+
+class Usage:
+    """一次上游请求消耗的 token 数，由 provider 在流结束时填写"""
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def to_dict(self) -> dict:
+        return {
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'total_tokens': self.total_tokens,
+        }
+
+class LLMProvider:
+    """
+    大模型后端接口。stream() 返回 content 增量的异步生成器，流结束时把 token 用量写入 usage。
+    首 token / token 间隔超时、重试、对冲与熔断由调用方（app.services.translation）统一处理。
+    """
+    name = ''
+    model = ''
+
+    def config_error(self) -> str | None:
+        """配置不完整时返回可以展示给用户的错误信息"""
+        return None
+
+    def stream(self, messages: list, usage: Usage):
+        raise NotImplementedError
+
+class DeepSeekProvider(LLMProvider):
+    name = 'deepseek'
+
+    def __init__(self, base_url: str, chat_api: str, api_key: str, model: str = 'deepseek-chat',
+                 connect_timeout: float = 3, read_timeout: float = 30):
+        self.api_url = urljoin(base_url, chat_api)
+        self.api_key = api_key
+        self.model = model
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+    def config_error(self) -> str | None:
+        if not self.api_key:
+            return 'DeepSeek API Key未配置'
+        return None
+
+    async def stream(self, messages: list, usage: Usage):
+        payload = {
+            'model': self.model,
+            'messages': messages,
+            'stream': True,  # 开启流式模式
+            'stream_options': {'include_usage': True},  # 最后一个数据块携带 token 用量
+        }
+        logger.debug('DeepSeek API请求payload：%s', payload)
+        client = await get_client()
+        async with client.stream(
+            'POST',
+            self.api_url,
+            json=payload,
+            headers={
+                'Authorization': f'Bearer {self.api_key}',
+                'Content-Type': 'application/json',
+                'Accept': 'application/json'
+            },
+            # 读超时只作兜底，首 token 与 token 间隔由调用方控制
+            timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            extensions={'trace': make_wait_tracer()}
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                line = line.strip()
+                if not line:
+                    continue
+
+                if line == "data: [DONE]":
+                    logger.debug("[DeepSeekProvider.stream] 流式数据接收完毕")
+                    # 读到流末尾再退出，连接才能归还连接池复用
+                    continue
+
+                try:
+                    json_data = json.loads(line[5:].strip())
+                except json.JSONDecodeError as e:
+                    logger.error(f"JSON解析失败: {e}, line: {line}")
+                    continue
+
+                if json_data.get('usage'):
+                    usage.prompt_tokens = json_data['usage'].get('prompt_tokens', 0)
+                    usage.completion_tokens = json_data['usage'].get('completion_tokens', 0)
+                choices = json_data.get('choices') or [{}]
+                delta_content = choices[0].get('delta', {}).get('content')
+                if not delta_content:
+                    continue
+
+                _delta_log.debug('接收到的内容: %s', delta_content)
+                yield delta_content
+
+SAMPLE_ANSWER = (
+    '1. 翻译结果: 今日はいい天気ですね。\n'
+    '2. 平假名注释: きょうはいいてんきですね。\n'
+    '3. 语法解析: \n'
+    '- 「は」是提示主题的助词，「が」表示主语；「ですね」表示向对方确认或寻求共鸣。\n'
+    '- 「いい」是形容词「良い」的口语形式，修饰名词「天気」。\n'
+)
+
+def split_deltas(text: str) -> list[str]:
+    """按 2~3 个字符切分，接近 DeepSeek 中日文输出的 delta 粒度"""
+    deltas = []
+    pos = 0
+    while pos < len(text):
+        size = 2 + (len(deltas) % 2)
+        deltas.append(text[pos:pos + size])
+        pos += size
+    return deltas
+
+class ReplayProvider(LLMProvider):
+    """
+    回放录制好的流，不访问网络，用于离线压测与基准测试。
+    录制文件为 JSONL，每行 {"sentence": "...", "deltas": ["...", ...], "usage": {...}}；
+    句子完全相同的录制优先，否则按句子哈希挑一条，没有录制时回放内置的示例回答。
+    输出节奏由 tokens_per_second、first_token_delay 与 jitter 决定，随机数以 seed 和句子为种子，
+    同一句子每次回放的内容与时间间隔都相同。
+    """
+    name = 'replay'
+
+    def __init__(self, path: str = '', tokens_per_second: float = 50, first_token_delay: float = 0.3,
+                 jitter: float = 0.2, seed: int = 0, model: str = 'replay'):
+        self.model = model
+        self.tokens_per_second = tokens_per_second
+        self.first_token_delay = first_token_delay
+        self.jitter = jitter
+        self.seed = seed
+        self.recordings = self._load(path) if path else []
+        self.by_sentence = {item['sentence']: item for item in self.recordings if item.get('sentence')}
+        self.default = {'deltas': split_deltas(SAMPLE_ANSWER)}
+
+    @staticmethod
+    def _load(path: str) -> list[dict]:
+        recordings = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    recordings.append(json.loads(line))
+        logger.info(f'[ReplayProvider] 读取 {len(recordings)} 条录制：{path}')
+        return recordings
+
+    def _pick(self, sentence: str) -> dict:
+        if sentence in self.by_sentence:
+            return self.by_sentence[sentence]
+        if not self.recordings:
+            return self.default
+        digest = hashlib.sha256(sentence.encode('utf-8')).digest()
+        return self.recordings[int.from_bytes(digest[:4], 'big') % len(self.recordings)]
+
+    def _delay(self, rng: random.Random, base: float) -> float:
+        if base <= 0:
+            return 0.0
+        return base * rng.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def stream(self, messages: list, usage: Usage):
+        sentence = messages[-1]['content']
+        recording = self._pick(sentence)
+        rng = random.Random(f'{self.seed}:{sentence}')
+        interval = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0
+
+        await asyncio.sleep(self._delay(rng, self.first_token_delay))
+        for index, delta in enumerate(recording['deltas']):
+            if index:
+                await asyncio.sleep(self._delay(rng, interval))
+            yield delta
+
+        recorded = recording.get('usage') or {}
+        # 没有录制用量时粗略估算：中日文大约一个字符一个 token
+        usage.prompt_tokens = recorded.get('prompt_tokens', sum(len(m['content']) for m in messages))
+        usage.completion_tokens = recorded.get('completion_tokens', len(recording['deltas']))
+
+def create_provider() -> LLMProvider:
+    """根据 llm.provider 创建后端"""
+    name = config.get('llm.provider', 'deepseek')
+    if name == 'replay':
+        return ReplayProvider(
+            path=config.get('llm.replay.path', ''),
+            tokens_per_second=config.get('llm.replay.tokens_per_second', 50),
+            first_token_delay=config.get('llm.replay.first_token_delay', 0.3),
+            jitter=config.get('llm.replay.jitter', 0.2),
+            seed=config.get('llm.replay.seed', 0),
+        )
+    if name != 'deepseek':
+        raise ValueError(f'未知的 llm.provider：{name}')
+    timeout = config.get('deepseek.timeout', 10)
+    return DeepSeekProvider(
+        base_url=config.get('deepseek.base_url', 'https://api.deepseek.com'),
+        chat_api=config.get('deepseek.chat_api', '/chat/completions'),
+        api_key=config.get('deepseek.api_key', ''),
+        model=config.get('deepseek.model', 'deepseek-chat'),
+        connect_timeout=config.get('deepseek.timeouts.connect', 3),
+        read_timeout=max(config.get('deepseek.timeouts.first_token', timeout),
+                         config.get('deepseek.timeouts.idle', timeout)),
+    )
+
+_provider: LLMProvider | None = None
+
+def get_provider() -> LLMProvider:
+    global _provider
+    if _provider is None:
+        _provider = create_provider()
+        logger.info(f'[get_provider] 使用 {_provider.name} 后端，model={_provider.model}')
+    return _provider
+
+class StreamRecorder:
+    """把完整的上游流追加写入 JSONL，供 ReplayProvider 回放（llm.record.path 非空时开启）"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _append(self, line: str):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+    async def record(self, sentence: str, deltas: list[str], usage: Usage):
+        line = json.dumps({'sentence': sentence, 'deltas': deltas, 'usage': usage.to_dict()}, ensure_ascii=False)
+        try:
+            await asyncio.to_thread(self._append, line + '\n')
+        except OSError as e:
+            logger.error(f'[StreamRecorder] 写入录制失败：{e}')
+
+_recorder: StreamRecorder | None = None
+
+def get_recorder() -> StreamRecorder | None:
+    global _recorder
+    path = config.get('llm.record.path', '')
+    if not path:
+        return None
+    if _recorder is None:
+        _recorder = StreamRecorder(path)
+    return _recorder
+
+# 累计 token 用量：正常结束、中途失败、被取消的流以及对冲中落败的请求都计入，
+# 上游没有报告用量的按估算值计入（见 app.services.translation._charge_usage）
+usage_stats = {
+    'requests': 0,
+    'prompt_tokens': 0,
+    'completion_tokens': 0,
+}
+
+def record_usage(usage: Usage):
+    usage_stats['requests'] += 1
+    usage_stats['prompt_tokens'] += usage.prompt_tokens
+    usage_stats['completion_tokens'] += usage.completion_tokens
+
+def get_usage_stats() -> dict:
+    provider = get_provider()
+    return {'provider': provider.name, 'model': provider.model, **usage_stats}
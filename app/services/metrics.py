@@ -0,0 +1,230 @@
+import time
+import asyncio
+import logging
+from bisect import bisect_left
+from app.config import config
+
+logger = logging.getLogger(__name__)
+
+# 默认的延迟分桶（秒），覆盖从毫秒级接口到一分钟的流式响应
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry: list['Metric'] = []
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """
+    Prometheus 文本格式的指标，标签值按 labelnames 的顺序以位置参数传入。
+    只在事件循环线程里更新，不加锁。
+    """
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _registry.append(self)
+
+    def _check(self, labels: tuple):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f'{self.name} 需要标签 {self.labelnames}，实际传入 {labels}')
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}', *self.samples()]
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._check(labels)
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> list[str]:
+        return [f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+                for labels, value in self._values.items()]
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def set(self, value: float, *labels):
+        self._check(labels)
+        self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        self._check(labels)
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def samples(self) -> list[str]:
+        return [f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+                for labels, value in self._values.items()]
+
+class GaugeFunc(Metric):
+    """抓取时才调用 func 取值，适合连接池、缓存条目数这类已有的状态；func 返回数值或 {标签元组: 数值}"""
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, func, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self.func = func
+
+    def samples(self) -> list[str]:
+        try:
+            values = self.func()
+        except Exception as e:
+            logger.error(f'[GaugeFunc] 读取 {self.name} 失败：{e}')
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+                for labels, value in values.items()]
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签 -> [各分桶计数（非累计，最后一个是 +Inf）, 总和, 次数]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        self._check(labels)
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def time(self, *labels):
+        """用法：with histogram.time('label'): ..."""
+        return _Timer(self, labels)
+
+    def samples(self) -> list[str]:
+        lines = []
+        for labels, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float('inf')), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {count}')
+        return lines
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', '从收到请求到响应体发送完毕的耗时（SSE 为整个流的时长）',
+    ('method', 'route', 'status'),
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge('http_requests_in_flight', '正在处理的请求数')
+
+class MetricsMiddleware:
+    """
+    纯 ASGI 中间件，按路由模板（而不是实际路径）统计请求耗时，避免 /records/123 这类路径撑爆标签。
+    不用 BaseHTTPMiddleware：它会把流式响应整个包一层，增加每个事件的开销。
+    Starlette 在第一次收到 ASGI 调用（lifespan 启动）时才构建中间件，这时再读取 metrics.enabled。
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.enabled = config.get('metrics.enabled', True)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            # 路由匹配后 Starlette 会把 route 写回 scope；未匹配（404）的请求统一归到一个标签
+            route = scope.get('route')
+            path = getattr(route, 'path', None) or 'unmatched'
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, scope['method'], path, str(status))
+
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    'event_loop_lag_seconds', '事件循环延迟：定时器实际唤醒时间比预期晚多少',
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+
+async def _monitor_loop_lag(interval: float):
+    while True:
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG_SECONDS.observe(max(time.perf_counter() - expected, 0.0))
+
+_loop_lag_task: asyncio.Task | None = None
+
+def start_loop_lag_monitor():
+    """metrics.loop_lag.enabled 为 true 时启动事件循环延迟采样"""
+    global _loop_lag_task
+    if not config.get('metrics.loop_lag.enabled', False):
+        return
+    interval = config.get('metrics.loop_lag.interval', 0.5)
+    _loop_lag_task = asyncio.create_task(_monitor_loop_lag(interval))
+    logger.info(f'[start_loop_lag_monitor] 事件循环延迟采样已启动，间隔 {interval}s')
+
+async def stop_loop_lag_monitor():
+    global _loop_lag_task
+    if _loop_lag_task is not None:
+        _loop_lag_task.cancel()
+        try:
+            await _loop_lag_task
+        except asyncio.CancelledError:
+            pass
+        _loop_lag_task = None
@@ -0,0 +1,44 @@
+import time
+import asyncio
+
+class TokenBucket:
+    """
+    令牌桶限流：每秒补充 rate 个令牌，最多积累 burst 个。
+    acquire 在令牌不足时等待，等待者按到达顺序获得令牌。
+    """
+
+    def __init__(self, rate: float, burst: float | None = None):
+        if rate <= 0:
+            raise ValueError(f'rate 必须大于 0：{rate}')
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def is_full(self) -> bool:
+        """令牌已补满，说明最近没有请求，可以回收"""
+        self._refill()
+        return self.tokens >= self.burst
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """不等待，令牌足够时扣除并返回 True"""
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens: float = 1):
+        # 持锁等待，保证先到先得
+        async with self._lock:
+            self._refill()
+            if self.tokens < tokens:
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= tokens
@@ -0,0 +1,312 @@
+import html
+import json
+import time
+import base64
+import string
+import logging
+from collections import OrderedDict
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import config
+
+logger = logging.getLogger(__name__)
+
+# trigram 分词要求查询词至少 3 个字符，更短的查询退回 LIKE
+FTS_MIN_QUERY_LENGTH = 3
+# 全部用户的匹配数不超过该值时从倒排列表出发并按 BM25 排序，否则从该用户的记录出发逐条检查是否匹配
+FTS_RANK_MAX_MATCHES = 5000
+
+# 与 SQLite 的 LIKE 一致，只忽略 ASCII 字母的大小写；逐字符替换，位置与原文一一对应
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+# snippet() 先用控制字符标出匹配位置，转义记录文本之后再换成 <mark>
+MARK_OPEN, MARK_CLOSE = '\x02', '\x03'
+
+RECORD_COLUMNS = 't.id, t.original_sentence, t.translated_sentence, t.furigana, t.grammar'
+
+# total 参数：exact 精确计数；cached 使用短时缓存的计数；estimate 尽量用廉价的估算；none 不返回总数
+TOTAL_EXACT = 'exact'
+TOTAL_CACHED = 'cached'
+TOTAL_ESTIMATE = 'estimate'
+TOTAL_NONE = 'none'
+TOTAL_MODES = (TOTAL_EXACT, TOTAL_CACHED, TOTAL_ESTIMATE, TOTAL_NONE)
+
+# CROSS JOIN 固定连接顺序，左边的表在外层循环
+FTS_FROM_MATCHES = 'translations_fts CROSS JOIN translations t ON t.id = translations_fts.rowid'
+FTS_FROM_OWNER = 'translations t CROSS JOIN translations_fts ON translations_fts.rowid = t.id'
+FTS_CONDITION = 'translations_fts MATCH :match AND t.open_id = :owner'
+
+# 常见词计数：先把倒排列表物化成临时索引，再沿 (open_id, id) 索引逐条查找，
+# 避免 FTS_FROM_OWNER 那样对每条记录单独执行一次 MATCH（每次都要重新读取整个倒排列表）
+FTS_OWNER_COUNT = (
+    'SELECT count(*) FROM translations t WHERE t.open_id = :owner '
+    'AND t.id IN (SELECT rowid FROM translations_fts WHERE translations_fts MATCH :match)'
+)
+
+LIKE_CONDITION = 't.original_sentence LIKE :like OR t.translated_sentence LIKE :like OR t.grammar LIKE :like'
+
+class InvalidCursor(ValueError):
+    pass
+
+_fts_available: bool | None = None
+
+async def fts_available(db: AsyncSession) -> bool:
+    """全文索引是否已建立（迁移失败时退回 LIKE 查询）"""
+    global _fts_available
+    if _fts_available is None:
+        row = await db.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'translations_fts'"))
+        _fts_available = row.first() is not None
+        if not _fts_available:
+            logger.warning('[fts_available] 未找到 translations_fts，搜索将使用 LIKE')
+    return _fts_available
+
+def fts_phrase(query: str) -> str:
+    """把用户输入转成 FTS5 短语，避免其中的引号、运算符被当作查询语法"""
+    return '"' + query.replace('"', '""') + '"'
+
+def _row_to_dict(row) -> dict:
+    return {
+        'id': row.id,
+        'original_sentence': row.original_sentence,
+        'translated_sentence': row.translated_sentence,
+        'furigana': row.furigana,
+        'grammar': row.grammar,
+    }
+
+def _like_snippet(record: dict, query: str, context: int = 16) -> str | None:
+    """
+    LIKE 查询没有 snippet()，在 Python 里截取第一处匹配并高亮。
+    返回的是 HTML：记录文本经过转义，只有 <mark> 标签原样保留，高亮部分保持原文的大小写。
+    """
+    needle = query.translate(ASCII_LOWER)
+    for column in ('original_sentence', 'translated_sentence', 'grammar'):
+        value = record[column]
+        pos = value.translate(ASCII_LOWER).find(needle)
+        if pos == -1:
+            continue
+        start = max(pos - context, 0)
+        end = min(pos + len(query) + context, len(value))
+        return (
+            ('…' if start > 0 else '') + html.escape(value[start:pos])
+            + '<mark>' + html.escape(value[pos:pos + len(query)]) + '</mark>'
+            + html.escape(value[pos + len(query):end]) + ('…' if end < len(value) else '')
+        )
+    return None
+
+def _escape_snippet(snippet: str | None) -> str | None:
+    if snippet is None:
+        return None
+    return html.escape(snippet).replace(MARK_OPEN, '<mark>').replace(MARK_CLOSE, '</mark>')
+
+async def _fts_snippets(db: AsyncSession, match: str, ids: list[int]) -> dict[int, str]:
+    """为当前页的记录生成带 <mark> 高亮的匹配片段（HTML，记录文本已转义）"""
+    placeholders = ', '.join(f':id{i}' for i in range(len(ids)))
+    params = {'match': match, **{f'id{i}': record_id for i, record_id in enumerate(ids)}}
+    rows = await db.execute(text(
+        "SELECT rowid, snippet(translations_fts, -1, :mark_open, :mark_close, '…', 16) "
+        f"FROM translations_fts WHERE translations_fts MATCH :match AND rowid IN ({placeholders})"
+    ), {**params, 'mark_open': MARK_OPEN, 'mark_close': MARK_CLOSE})
+    return {row[0]: _escape_snippet(row[1]) for row in rows}
+
+def encode_cursor(last_id: int) -> str:
+    """游标对客户端不透明，目前只包含上一页最后一条记录的 id"""
+    raw = json.dumps({'id': last_id}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> int | None:
+    """空字符串表示第一页"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        last_id = json.loads(raw)['id']
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(f'无效的游标：{cursor}') from e
+    if not isinstance(last_id, int):
+        raise InvalidCursor(f'无效的游标：{cursor}')
+    return last_id
+
+# (open_id, query) -> (expires_at, total)
+_count_cache: OrderedDict[tuple[str, str], tuple[float, int]] = OrderedDict()
+COUNT_CACHE_SIZE = 1024
+
+def invalidate_count_cache(open_id: str | None = None):
+    """记录增删后调用，让缓存的总数尽快反映变化；传入 open_id 时只清理该用户的计数"""
+    if open_id is None:
+        _count_cache.clear()
+        return
+    for key in [key for key in _count_cache if key[0] == open_id]:
+        del _count_cache[key]
+
+async def _filter(db: AsyncSession, open_id: str, query: str) -> tuple[str, dict]:
+    """根据查询词选择过滤方式：all / fts / like，参数中总是带上 owner"""
+    params = {'owner': open_id}
+    if not query:
+        return 'all', params
+    if len(query) >= FTS_MIN_QUERY_LENGTH and await fts_available(db):
+        params['match'] = fts_phrase(query)
+        return 'fts', params
+    params['like'] = f'%{query}%'
+    return 'like', params
+
+async def _fts_source(db: AsyncSession, params: dict) -> tuple[str, str, bool]:
+    """
+    全文索引不含 open_id，按全部用户的匹配数选择连接顺序，返回 (FROM 子句, 排序用的 id 列, 是否按 BM25 排序)：
+    - 匹配少：遍历倒排列表再按 open_id 过滤，开销与匹配数成正比，可以顺便按 BM25 排序；
+    - 匹配多（常见词）：沿 (open_id, id) 索引遍历该用户的记录，逐条用 rowid 检查是否匹配，
+      开销与该用户的记录数成正比，只按 id 排序（每条单独计算 BM25 代价太高）。
+    """
+    # 只遍历倒排列表，数到阈值即停止，常见词也不会扫完整个倒排列表
+    matches = await db.scalar(text(
+        'SELECT count(*) FROM (SELECT rowid FROM translations_fts WHERE translations_fts MATCH :match '
+        f'LIMIT {FTS_RANK_MAX_MATCHES + 1})'
+    ), params)
+    if matches <= FTS_RANK_MAX_MATCHES:
+        return FTS_FROM_MATCHES, 'translations_fts.rowid', True
+    return FTS_FROM_OWNER, 't.id', False
+
+async def _fts_count(db: AsyncSession, source: str, params: dict) -> int:
+    if source == FTS_FROM_OWNER:
+        return await db.scalar(text(FTS_OWNER_COUNT), params)
+    return await db.scalar(text(f'SELECT count(*) FROM {source} WHERE {FTS_CONDITION}'), params)
+
+async def _exact_count(db: AsyncSession, kind: str, params: dict) -> int:
+    if kind == 'all':
+        # 只扫描 (open_id, id) 索引中该用户的一段
+        return await db.scalar(text('SELECT count(*) FROM translations WHERE open_id = :owner'), params)
+    if kind == 'fts':
+        source, _, _ = await _fts_source(db, params)
+        return await _fts_count(db, source, params)
+    return await db.scalar(
+        text(f'SELECT count(*) FROM translations t WHERE t.open_id = :owner AND ({LIKE_CONDITION})'), params
+    )
+
+async def count_records(db: AsyncSession, open_id: str, query: str, mode: str = TOTAL_EXACT) -> int | None:
+    """按 mode 统计 open_id 名下匹配 query 的记录数"""
+    if mode == TOTAL_NONE:
+        return None
+    kind, params = await _filter(db, open_id, query)
+
+    if mode == TOTAL_ESTIMATE:
+        # 单个用户的记录数有限，按 (open_id, id) 索引精确统计已经足够便宜；搜索需要检查正文，改用缓存
+        if kind == 'all':
+            return await _exact_count(db, kind, params)
+        mode = TOTAL_CACHED
+
+    if mode == TOTAL_CACHED:
+        key = (open_id, query)
+        entry = _count_cache.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            _count_cache.move_to_end(key)
+            return entry[1]
+        total = await _exact_count(db, kind, params)
+        _count_cache[key] = (time.monotonic() + config.get('records.count_cache_ttl', 30), total)
+        while len(_count_cache) > COUNT_CACHE_SIZE:
+            _count_cache.popitem(last=False)
+        return total
+
+    return await _exact_count(db, kind, params)
+
+async def _attach_snippets(db: AsyncSession, kind: str, params: dict, query: str, records: list[dict]):
+    if not records:
+        return
+    if kind == 'fts':
+        snippets = await _fts_snippets(db, params['match'], [record['id'] for record in records])
+        for record in records:
+            record['snippet'] = snippets.get(record['id'])
+    elif kind == 'like':
+        for record in records:
+            record['snippet'] = _like_snippet(record, query)
+
+async def search_records(db: AsyncSession, open_id: str, query: str, page: int, limit: int,
+                         total_mode: str = TOTAL_EXACT) -> tuple[list[dict], int | None]:
+    """
+    按页码分页查询 open_id 名下的记录，返回 (records, total)。
+    - 无查询词：按 id 升序分页。
+    - 查询词足够长：走 FTS5，按 BM25（rank）排序并返回带 <mark> 高亮的 snippet；
+      全部用户的匹配数超过 FTS_RANK_MAX_MATCHES 时改为按 id 倒序，见 _fts_source。
+    - 其余情况退回 LIKE（同时搜索 grammar）；需要精确总数时用 count(*) OVER () 与分页结果一起取出，只扫描一次。
+    OFFSET 越大越慢，深翻页请使用 search_records_after。
+    """
+    offset = (page - 1) * limit
+    kind, params = await _filter(db, open_id, query)
+    params.update({'limit': limit, 'offset': offset})
+
+    if kind == 'all':
+        total = await count_records(db, open_id, query, total_mode)
+        rows = await db.execute(text(
+            f'SELECT {RECORD_COLUMNS} FROM translations t WHERE t.open_id = :owner '
+            f'ORDER BY t.id LIMIT :limit OFFSET :offset'
+        ), params)
+        return [_row_to_dict(row) for row in rows], total
+
+    if kind == 'fts':
+        source, key, ranked = await _fts_source(db, params)
+        if total_mode == TOTAL_EXACT:
+            total = await _fts_count(db, source, params)
+        else:
+            total = await count_records(db, open_id, query, total_mode)
+        order = 'rank' if ranked else f'{key} DESC'
+        rows = await db.execute(text(
+            f'SELECT {RECORD_COLUMNS} FROM {source} WHERE {FTS_CONDITION} '
+            f'ORDER BY {order} LIMIT :limit OFFSET :offset'
+        ), params)
+        records = [_row_to_dict(row) for row in rows]
+        await _attach_snippets(db, kind, params, query, records)
+        return records, total
+
+    if total_mode == TOTAL_EXACT:
+        rows = (await db.execute(text(
+            f'SELECT {RECORD_COLUMNS}, count(*) OVER () AS total FROM translations t '
+            f'WHERE t.open_id = :owner AND ({LIKE_CONDITION}) ORDER BY t.id LIMIT :limit OFFSET :offset'
+        ), params)).all()
+        if rows:
+            total = rows[0].total
+        elif page > 1:
+            # 页码超出范围时窗口函数拿不到总数，单独统计一次
+            total = await _exact_count(db, kind, params)
+        else:
+            total = 0
+    else:
+        total = await count_records(db, open_id, query, total_mode)
+        rows = await db.execute(text(
+            f'SELECT {RECORD_COLUMNS} FROM translations t '
+            f'WHERE t.open_id = :owner AND ({LIKE_CONDITION}) ORDER BY t.id LIMIT :limit OFFSET :offset'
+        ), params)
+    records = [_row_to_dict(row) for row in rows]
+    await _attach_snippets(db, kind, params, query, records)
+    return records, total
+
+async def search_records_after(db: AsyncSession, open_id: str, query: str, cursor: str, limit: int,
+                               total_mode: str = TOTAL_NONE) -> tuple[list[dict], str | None, int | None]:
+    """
+    游标（keyset）分页：按 id 倒序（最新在前），从游标之后继续取 limit 条，
+    返回 (records, next_cursor, total)。耗时与翻到第几页无关；没有更多记录时 next_cursor 为 None。
+    """
+    after = decode_cursor(cursor)
+    kind, params = await _filter(db, open_id, query)
+    params['limit'] = limit
+    if after is not None:
+        params['after'] = after
+
+    if kind == 'fts':
+        # 两种连接顺序都能按 id 倒序遍历并用游标跳过已返回的部分（FTS5 支持 rowid 范围过滤）
+        source, key, _ = await _fts_source(db, params)
+        where = FTS_CONDITION + (f' AND {key} < :after' if after is not None else '')
+        sql = f'SELECT {RECORD_COLUMNS} FROM {source} WHERE {where} ORDER BY {key} DESC LIMIT :limit'
+    else:
+        conditions = ['t.open_id = :owner']
+        if after is not None:
+            conditions.append('t.id < :after')
+        if kind == 'like':
+            conditions.append(f'({LIKE_CONDITION})')
+        # (open_id, id) 索引可以直接倒序遍历该用户的记录
+        where = ' AND '.join(conditions)
+        sql = f'SELECT {RECORD_COLUMNS} FROM translations t WHERE {where} ORDER BY t.id DESC LIMIT :limit'
+
+    rows = await db.execute(text(sql), params)
+    records = [_row_to_dict(row) for row in rows]
+    await _attach_snippets(db, kind, params, query, records)
+    next_cursor = encode_cursor(records[-1]['id']) if records and len(records) == limit else None
+    total = await count_records(db, open_id, query, total_mode)
+    return records, next_cursor, total
@@ -0,0 +1,186 @@
+import time
+import random
+import asyncio
+import logging
+from app.config import config
+from app.services.metrics import GaugeFunc
+
+logger = logging.getLogger(__name__)
+
+class UpstreamError(Exception):
+    """上游（DeepSeek）请求失败，message 可以直接展示给用户"""
+
+class UpstreamTimeout(UpstreamError):
+    pass
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitBreaker:
+    """
+    连续失败 failure_threshold 次后熔断（open），期间直接拒绝请求；
+    recovery_timeout 秒后放行一个探测请求（half_open），成功则恢复，失败则继续熔断；
+    探测请求被取消时调用 release_probe()，超过 recovery_timeout 仍没有结果的探测也视为已放弃。
+    """
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self.stats = {'opened': 0, 'rejected': 0}
+
+    def is_open(self) -> bool:
+        """是否处于熔断期（不改变状态，用于决定是否直接走缓存）"""
+        return self.state == OPEN and time.monotonic() < self.opened_at + self.recovery_timeout
+
+    def allow(self) -> bool:
+        """是否允许发起上游请求；half_open 状态下只放行一个探测请求"""
+        if self.state == OPEN and time.monotonic() >= self.opened_at + self.recovery_timeout:
+            self.state = HALF_OPEN
+            self._probing = False
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and self._probing and time.monotonic() >= self._probe_started + self.recovery_timeout:
+            logger.warning(f'[CircuitBreaker] 探测请求 {self.recovery_timeout}s 内没有结果，重新探测')
+            self._probing = False
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            self._probe_started = time.monotonic()
+            return True
+        self.stats['rejected'] += 1
+        return False
+
+    def record_success(self):
+        if self.state != CLOSED:
+            logger.info('[CircuitBreaker] 上游已恢复')
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def release_probe(self):
+        """探测请求被取消（客户端断开等），既不算成功也不算失败，下一个请求重新探测"""
+        if self.state == HALF_OPEN:
+            self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self._probing = False
+            self.stats['opened'] += 1
+            logger.warning(f'[CircuitBreaker] 连续失败 {self.failures} 次，熔断 {self.recovery_timeout}s')
+
+    def to_dict(self) -> dict:
+        return {
+            'state': HALF_OPEN if self.state == OPEN and not self.is_open() else self.state,
+            'failures': self.failures,
+            **self.stats,
+        }
+
+def backoff_delay(attempt: int, base: float, maximum: float) -> float:
+    """第 attempt 次重试前的等待：指数退避 + 完全抖动（full jitter）"""
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
+
+_breaker: CircuitBreaker | None = None
+
+def get_circuit_breaker() -> CircuitBreaker:
+    global _breaker
+    if _breaker is None:
+        _breaker = CircuitBreaker(
+            failure_threshold=config.get('deepseek.circuit_breaker.failure_threshold', 5),
+            recovery_timeout=config.get('deepseek.circuit_breaker.recovery_timeout', 30),
+        )
+    return _breaker
+
+GaugeFunc('upstream_circuit_open', '上游熔断是否打开（1 为打开）',
+          lambda: 1 if _breaker is not None and _breaker.is_open() else 0)
+
+# 上游请求统计
+upstream_stats = {
+    'requests': 0,          # 上游请求（含重试与对冲）
+    'retries': 0,
+    'hedged': 0,            # 因首 token 迟到而发起的对冲请求
+    'hedge_wins': 0,        # 对冲请求先拿到首 token 的次数
+    'failures': 0,
+    'stale_served': 0,      # 熔断期间用过期缓存应答的次数
+    'fast_failed': 0,       # 熔断期间直接返回错误的次数
+}
+
+async def with_deadlines(stream, first_token_timeout: float, idle_timeout: float):
+    """
+    给增量流加上超时：从开始到第一个增量最多 first_token_timeout 秒，
+    之后相邻两个增量之间最多 idle_timeout 秒，超时抛出 UpstreamTimeout。
+    """
+    deadline = time.monotonic() + first_token_timeout
+    received = False
+    try:
+        while True:
+            timeout = idle_timeout if received else max(deadline - time.monotonic(), 0)
+            try:
+                delta = await asyncio.wait_for(stream.__anext__(), timeout)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                if received:
+                    raise UpstreamTimeout(f'翻译服务超过 {idle_timeout}s 没有输出，已中断')
+                raise UpstreamTimeout(f'翻译服务 {first_token_timeout}s 内没有响应')
+            received = True
+            yield delta
+    finally:
+        await stream.aclose()
+
+async def open_hedged(make_attempt, hedge_delay: float | None):
+    """
+    调用 make_attempt() 得到上游增量的异步生成器，等到第一个增量后返回 (first, stream)。
+    hedge_delay 秒内还没有拿到第一个增量时再发起一个相同的请求，谁先拿到用谁，另一个被取消。
+    所有请求都失败时抛出最后一个异常。
+    """
+    # future -> (序号, 生成器)，序号大于 0 的是对冲请求
+    attempts: dict[asyncio.Future, tuple[int, object]] = {}
+
+    def launch():
+        stream = make_attempt()
+        attempts[asyncio.ensure_future(stream.__anext__())] = (len(attempts), stream)
+        upstream_stats['requests'] += 1
+
+    launch()
+    hedged = False
+    error: BaseException | None = None
+    try:
+        while attempts:
+            timeout = hedge_delay if hedge_delay and not hedged else None
+            done, _ = await asyncio.wait(attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                upstream_stats['hedged'] += 1
+                logger.info(f'[open_hedged] 首 token 超过 {hedge_delay}s 未到达，发起对冲请求')
+                launch()
+                continue
+            for future in done:
+                index, stream = attempts.pop(future)
+                try:
+                    first = future.result()
+                except StopAsyncIteration:
+                    error = UpstreamError('上游返回了空响应')
+                except Exception as e:
+                    error = e
+                else:
+                    if index > 0:
+                        upstream_stats['hedge_wins'] += 1
+                    return first, stream
+                await stream.aclose()
+        raise error
+    finally:
+        # 取消仍在等待首 token 的请求并关闭对应的连接
+        for future in attempts:
+            future.cancel()
+        if attempts:
+            await asyncio.gather(*attempts, return_exceptions=True)
+            for _, stream in attempts.values():
+                await stream.aclose()
@@ -0,0 +1,89 @@
+TRANSLATED = 'translated'
+FURIGANA = 'furigana'
+GRAMMAR = 'grammar'
+
+SECTIONS = (TRANSLATED, FURIGANA, GRAMMAR)
+
+# 各段落的起始标记，模型有时会输出全角冒号，两种都接受
+SECTION_MARKERS = (
+    (TRANSLATED, ('1. 翻译结果:', '1. 翻译结果：')),
+    (FURIGANA, ('\n2. 平假名注释:', '\n2. 平假名注释：')),
+    (GRAMMAR, ('\n3. 语法解析:', '\n3. 语法解析：')),
+)
+
+class SectionParser:
+    """
+    增量解析 DeepSeek 的流式输出。
+    每个 delta 只处理一次：识别跨 chunk 的段落标记，并只把新文本追加到当前段落，
+    整个响应的解析开销与长度成线性关系。
+    """
+
+    def __init__(self):
+        self.section: str | None = None
+        # 末尾可能是某个标记前缀的文本，等下一个 delta 到达后再判断
+        self._pending = ''
+        # 段落刚开始时去掉标记后的空白
+        self._at_section_start = False
+        self._update_markers()
+
+    def _update_markers(self):
+        """切换段落时预先算好之后可能出现的标记及其包含的字符"""
+        index = SECTIONS.index(self.section) + 1 if self.section else 0
+        self._markers = [
+            (section, marker)
+            for section, markers in SECTION_MARKERS[index:]
+            for marker in markers
+        ]
+        self._marker_chars = {char for _, marker in self._markers for char in marker}
+
+    def _emit(self, text: str, out: list):
+        if self.section is None or not text:
+            return
+        if self._at_section_start:
+            text = text.lstrip()
+            if not text:
+                return
+            self._at_section_start = False
+        out.append((self.section, text))
+
+    def feed(self, delta: str) -> list[tuple[str, str]]:
+        """输入一个 delta，返回 (section, 追加文本) 列表"""
+        out = []
+        text = self._pending + delta
+        self._pending = ''
+
+        while self._markers:
+            found = None
+            for section, marker in self._markers:
+                pos = text.find(marker)
+                if pos != -1 and (found is None or pos < found[0]):
+                    found = (pos, section, marker)
+            if found is None:
+                break
+            pos, section, marker = found
+            self._emit(text[:pos], out)
+            self.section = section
+            self._at_section_start = True
+            self._update_markers()
+            text = text[pos + len(marker):]
+
+        # 保留可能是下一个标记开头的尾部文本，末字符不在任何标记中时可以直接跳过
+        hold = 0
+        if text and text[-1] in self._marker_chars:
+            for _, marker in self._markers:
+                for size in range(min(len(marker) - 1, len(text)), hold, -1):
+                    if text.endswith(marker[:size]):
+                        hold = size
+                        break
+        if hold:
+            self._pending = text[-hold:]
+            text = text[:-hold]
+        self._emit(text, out)
+        return out
+
+    def finish(self) -> list[tuple[str, str]]:
+        """流结束时输出剩余的文本"""
+        out = []
+        text, self._pending = self._pending, ''
+        self._emit(text, out)
+        return out
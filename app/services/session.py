@@ -1,16 +1,90 @@
 import uuid
+import time
+import asyncio
+import logging
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from app.models.database import UserSession
+from sqlalchemy import select, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.database import UserSession, AsyncSessionLocal, database_path
 from app.config import config
+from app.services.metrics import Counter, Histogram
+from app.services.lifecycle import hold_lock
 
-SESSION_EXPIRATION_DAYS = config.get('session.expiration_days', 7)
+logger = logging.getLogger(__name__)
 
-def create_user_session(db: Session, open_id: str, avatar: str, nick_name: str) -> str:
+SESSION_CACHE_LOOKUPS = Counter('session_cache_lookups_total', '会话缓存查询次数', ('result',))
+SESSION_LOAD_SECONDS = Histogram(
+    'session_load_seconds', '缓存未命中时从数据库读取会话的耗时',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+SESSIONS_SWEPT = Counter('sessions_swept_total', '后台清理删除的过期会话数')
+
+class SessionCache:
+    """
+    已验证会话的进程内缓存，避免每个受保护的请求都查询 user_sessions。
+    条目在 ttl 秒后或会话本身过期时失效，超过 max_entries 按 LRU 淘汰。
+    注意：多进程部署时，登出只会清除当前进程的缓存，其他进程最多在 ttl 秒后失效。
+    """
+
+    def __init__(self, ttl: float = 60, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # session_id -> (cached_until, UserSession)
+        self._entries: OrderedDict[str, tuple[float, UserSession]] = OrderedDict()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def get(self, session_id: str) -> UserSession | None:
+        entry = self._entries.get(session_id)
+        if entry is not None:
+            cached_until, user_session = entry
+            if cached_until > time.monotonic() and user_session.expires_at > datetime.utcnow():
+                self._entries.move_to_end(session_id)
+                self._stats['hits'] += 1
+                SESSION_CACHE_LOOKUPS.inc('hit')
+                return user_session
+            del self._entries[session_id]
+        self._stats['misses'] += 1
+        SESSION_CACHE_LOOKUPS.inc('miss')
+        return None
+
+    def put(self, user_session: UserSession):
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        self._entries[user_session.session_id] = (time.monotonic() + self.ttl, user_session)
+        self._entries.move_to_end(user_session.session_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def invalidate(self, session_id: str):
+        if self._entries.pop(session_id, None) is not None:
+            self._stats['invalidations'] += 1
+
+    def stats(self) -> dict:
+        lookups = self._stats['hits'] + self._stats['misses']
+        return {
+            **self._stats,
+            'hit_ratio': round(self._stats['hits'] / lookups, 4) if lookups else 0.0,
+            'entries': len(self._entries),
+        }
+
+_session_cache: SessionCache | None = None
+
+def get_session_cache() -> SessionCache:
+    global _session_cache
+    if _session_cache is None:
+        _session_cache = SessionCache(
+            ttl=config.get('session.cache.ttl', 60),
+            max_entries=config.get('session.cache.max_entries', 10000),
+        )
+    return _session_cache
+
+async def create_user_session(db: AsyncSession, open_id: str, avatar: str, nick_name: str) -> str:
     """创建新的用户会话并存储到数据库，返回 session_id"""
     session_id = str(uuid.uuid4())
-    expires_at = datetime.utcnow() + timedelta(days=SESSION_EXPIRATION_DAYS)
-    
+    expires_at = datetime.utcnow() + timedelta(days=config.get('session.expiration_days', 7))
+
     user_session = UserSession(
         session_id=session_id,
         open_id=open_id,
@@ -19,18 +93,108 @@ def create_user_session(db: Session, open_id: str, avatar: str, nick_name: str)
         expires_at=expires_at
     )
     db.add(user_session)
-    db.commit()
-    
+    await db.commit()
+
     return session_id
 
-def get_user_session(db: Session, session_id: str) -> UserSession:
-    """根据 session_id 获取有效的用户会话"""
-    user_session = db.query(UserSession).filter_by(session_id=session_id).first()
+def get_cached_user_session(session_id: str) -> UserSession | None:
+    """只查缓存，命中时调用方无需打开数据库会话"""
+    return get_session_cache().get(session_id)
+
+async def get_user_session(db: AsyncSession, session_id: str) -> UserSession:
+    """根据 session_id 获取有效的用户会话，先查缓存"""
+    user_session = get_session_cache().get(session_id)
+    if user_session is not None:
+        return user_session
+    return await load_user_session(db, session_id)
+
+async def load_user_session(db: AsyncSession, session_id: str) -> UserSession:
+    """从数据库读取有效的用户会话并放入缓存"""
+    with SESSION_LOAD_SECONDS.time():
+        result = await db.execute(select(UserSession).filter_by(session_id=session_id))
+        user_session = result.scalars().first()
     if user_session and user_session.expires_at > datetime.utcnow():
+        get_session_cache().put(user_session)
         return user_session
     return None
 
-def delete_user_session(db: Session, session_id: str):
+async def delete_user_session(db: AsyncSession, session_id: str):
     """删除用户会话"""
-    db.query(UserSession).filter_by(session_id=session_id).delete()
-    db.commit()
\ No newline at end of file
+    get_session_cache().invalidate(session_id)
+    await db.execute(delete(UserSession).filter_by(session_id=session_id))
+    await db.commit()
+
+_sweep_stats = {'runs': 0, 'deleted': 0, 'last_run': None}
+
+async def sweep_expired_sessions(batch_size: int = 1000) -> int:
+    """分批删除已过期的会话，每批一个短事务，避免长时间持有写锁；返回删除的行数"""
+    total = 0
+    while True:
+        expired = (
+            select(UserSession.session_id)
+            .where(UserSession.expires_at < datetime.utcnow())
+            .limit(batch_size)
+        )
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(delete(UserSession).where(UserSession.session_id.in_(expired)))
+            await db.commit()
+        total += result.rowcount
+        if result.rowcount < batch_size:
+            break
+        # 批次之间让出事件循环和写锁
+        await asyncio.sleep(0)
+
+    _sweep_stats['runs'] += 1
+    _sweep_stats['deleted'] += total
+    SESSIONS_SWEPT.inc(amount=total)
+    _sweep_stats['last_run'] = datetime.utcnow().isoformat()
+    if total:
+        logger.info(f'[sweep_expired_sessions] 删除 {total} 条过期会话')
+    return total
+
+async def _sweep_loop(interval: float, batch_size: int):
+    while True:
+        try:
+            await sweep_expired_sessions(batch_size)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f'[_sweep_loop] 清理过期会话失败：{e}')
+        await asyncio.sleep(interval)
+
+_sweeper: asyncio.Task | None = None
+
+def start_session_sweeper():
+    """启动后台清理任务，session.sweep.interval <= 0 时不启动；多个 worker 中只有拿到文件锁的一个会启动"""
+    global _sweeper
+    interval = config.get('session.sweep.interval', 3600)
+    if interval <= 0:
+        logger.info('[start_session_sweeper] 过期会话清理未启用')
+        return
+    if not hold_lock(f'{database_path()}.sweeper.lock'):
+        logger.info('[start_session_sweeper] 其他 worker 正在负责清理过期会话')
+        return
+    _sweeper = asyncio.create_task(_sweep_loop(interval, config.get('session.sweep.batch_size', 1000)))
+
+async def stop_session_sweeper():
+    global _sweeper
+    if _sweeper is not None:
+        _sweeper.cancel()
+        try:
+            await _sweeper
+        except asyncio.CancelledError:
+            pass
+        _sweeper = None
+
+async def get_session_stats(db: AsyncSession) -> dict:
+    """会话缓存命中率、user_sessions 表大小与清理情况"""
+    table_size = await db.scalar(select(func.count()).select_from(UserSession))
+    expired = await db.scalar(
+        select(func.count()).select_from(UserSession).where(UserSession.expires_at < datetime.utcnow())
+    )
+    return {
+        'cache': get_session_cache().stats(),
+        'table_size': table_size,
+        'expired': expired,
+        'sweeper': dict(_sweep_stats),
+    }
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Callable
+from app.services.sse import ResultState, DELTA, SYNC, DONE, ERROR
+from app.services.resilience import UpstreamError
+
+logger = logging.getLogger(__name__)
+
+class Subscriber:
+    """
+    单个 SSE 连接的订阅者，拥有独立的有界队列。
+    迭代结束时自动退订；迭代可能根本不会开始（客户端在响应体开始前断开），
+    持有者还要在结束时调用 close()，或者用 async with / contextlib.aclosing 管理。
+    """
+
+    def __init__(self, flight: 'Flight', queue_size: int):
+        self.flight = flight
+        # 至少能放下一次完整状态和结束事件
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(queue_size, 2))
+        self.lagged = 0
+        self.closed = False
+
+    def push(self, event: tuple):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # 客户端消费太慢：丢弃积压的事件，改为推送一次完整状态，不阻塞其他订阅者
+            self.lagged += 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait((SYNC, self.flight.state.snapshot()))
+            if event[0] in (DONE, ERROR):
+                self.queue.put_nowait(event)
+
+    def close(self):
+        """退订，可以重复调用；最后一个订阅者退订时取消上游请求"""
+        if not self.closed:
+            self.closed = True
+            self.flight.unsubscribe(self)
+
+    async def aclose(self):
+        self.close()
+
+    async def __aenter__(self) -> 'Subscriber':
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    async def __aiter__(self) -> AsyncIterator[tuple]:
+        try:
+            while True:
+                event = await self.queue.get()
+                yield event
+                if event[0] in (DONE, ERROR):
+                    return
+        finally:
+            self.close()
+
+class Flight:
+    """一次上游请求，其结果广播给所有订阅者"""
+
+    def __init__(self, registry: 'InFlightRegistry', key: str):
+        self.registry = registry
+        self.key = key
+        self.state = ResultState()
+        self.subscribers: set[Subscriber] = set()
+        self.finished = False
+        self.task: asyncio.Task | None = None
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self, self.registry.queue_size)
+        # 中途加入的订阅者先拿到已累计的状态，再接收后续增量
+        if self.state:
+            subscriber.push((SYNC, self.state.snapshot()))
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+        if not self.subscribers and not self.finished and self.task is not None:
+            # 所有客户端都已断开，停止上游请求以节省 token
+            logger.debug(f'[Flight] 无订阅者，取消上游请求：{self.key}')
+            self.task.cancel()
+
+    def publish(self, event: tuple):
+        for subscriber in list(self.subscribers):
+            subscriber.push(event)
+
+    async def run(self, producer: Callable[[], AsyncIterator[list]]):
+        try:
+            async for deltas in producer():
+                self.state.apply(deltas)
+                self.publish((DELTA, deltas))
+            self.finished = True
+            self.publish((DONE, self.state.snapshot()))
+        except asyncio.CancelledError:
+            self.finished = True
+            raise
+        except Exception as e:
+            self.finished = True
+            logger.error(f'[Flight] 上游请求失败：{e}')
+            self.publish((ERROR, str(e) if isinstance(e, UpstreamError) else '未知错误'))
+        finally:
+            self.registry.flights.pop(self.key, None)
+
+class InFlightRegistry:
+    """
+    相同 key（句子 + 模型 + 提示词）的并发请求只发起一次上游流式请求，
+    解析出的增量扇出给每个订阅者。
+    """
+
+    def __init__(self, queue_size: int = 64):
+        self.queue_size = queue_size
+        self.flights: dict[str, Flight] = {}
+        self.stats = {'leaders': 0, 'followers': 0}
+
+    def join(self, key: str, producer: Callable[[], AsyncIterator[list]]) -> Subscriber:
+        """订阅 key 对应的流，不存在时用 producer 发起新的上游请求"""
+        flight = self.flights.get(key)
+        if flight is not None:
+            self.stats['followers'] += 1
+            return flight.subscribe()
+
+        self.stats['leaders'] += 1
+        flight = Flight(self, key)
+        self.flights[key] = flight
+        subscriber = flight.subscribe()
+        flight.task = asyncio.create_task(flight.run(producer))
+        return subscriber
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            'in_flight': len(self.flights),
+            'subscribers': sum(len(f.subscribers) for f in self.flights.values()),
+        }
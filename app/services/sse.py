@@ -0,0 +1,348 @@
+import json
+import time
+import asyncio
+import logging
+from fastapi.responses import StreamingResponse
+from app.config import config
+from app.services.section_parser import SECTIONS
+from app.services.metrics import Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+# 事件类型：delta 为解析出的增量，sync 携带当前累计的完整结果，done/error 表示流结束
+DELTA = 'delta'
+SYNC = 'sync'
+DONE = 'done'
+ERROR = 'error'
+
+PROTOCOL_SNAPSHOT = 1
+PROTOCOL_DELTA = 2
+
+def format_event(data: dict) -> str:
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+class ResultState:
+    """累计三个段落的文本，用列表保存避免反复拼接长字符串"""
+
+    def __init__(self, snapshot: dict | None = None):
+        self.parts = {section: [] for section in SECTIONS}
+        if snapshot:
+            self.reset(snapshot)
+
+    def reset(self, snapshot: dict):
+        self.parts = {section: [snapshot.get(section, '')] for section in SECTIONS}
+
+    def apply(self, deltas: list[tuple[str, str]]):
+        for section, text in deltas:
+            self.parts[section].append(text)
+
+    def snapshot(self) -> dict:
+        return {section: ''.join(parts) for section, parts in self.parts.items()}
+
+    def __bool__(self) -> bool:
+        return any(any(parts) for parts in self.parts.values())
+
+class SnapshotEncoder:
+    """协议 v1：每次更新都发送完整结果，兼容旧版前端"""
+
+    version = PROTOCOL_SNAPSHOT
+
+    def __init__(self, sentence: str):
+        self.sentence = sentence
+        self.state = ResultState()
+
+    def encode(self, kind: str, data) -> list[str]:
+        if kind == ERROR:
+            return [format_event({'error': data})]
+        if kind == DELTA:
+            self.state.apply(data)
+        elif kind == SYNC:
+            self.state.reset(data)
+        else:
+            # v1 没有结束事件，最后一次更新已经是完整结果
+            return []
+        return [format_event({'original': self.sentence, **self.state.snapshot()})]
+
+    def encode_result(self, result: dict) -> list[str]:
+        """直接输出完整结果（如缓存命中）"""
+        return [format_event({'original': self.sentence, **result})]
+
+class DeltaEncoder:
+    """
+    协议 v2：只发送 {section, append} 增量，结束时发送一次完整结果。
+    事件格式：
+        {"v": 2, "type": "delta", "section": "grammar", "append": "..."}
+        {"v": 2, "type": "sync", "result": {...}}   客户端落后或中途加入时重置状态
+        {"v": 2, "type": "done", "result": {...}}
+        {"v": 2, "type": "error", "error": "..."}
+    """
+
+    version = PROTOCOL_DELTA
+
+    def __init__(self, sentence: str):
+        self.sentence = sentence
+
+    def encode(self, kind: str, data) -> list[str]:
+        if kind == DELTA:
+            return [
+                format_event({'v': self.version, 'type': DELTA, 'section': section, 'append': text})
+                for section, text in data
+            ]
+        if kind == ERROR:
+            return [format_event({'v': self.version, 'type': ERROR, 'error': data})]
+        return [format_event({
+            'v': self.version,
+            'type': kind,
+            'result': {'original': self.sentence, **data},
+        })]
+
+    def encode_result(self, result: dict) -> list[str]:
+        return self.encode(DONE, result)
+
+def make_encoder(protocol: int, sentence: str):
+    if protocol == PROTOCOL_DELTA:
+        return DeltaEncoder(sentence)
+    return SnapshotEncoder(sentence)
+
+FLUSH_IMMEDIATE = 'immediate'
+FLUSH_WINDOW = 'window'
+FLUSH_PACE = 'pace'
+
+def merge_deltas(deltas: list[tuple[str, str]]) -> list[tuple[str, str]]:
+    """合并相邻的同段落增量"""
+    merged = []
+    for section, text in deltas:
+        if merged and merged[-1][0] == section:
+            merged[-1] = (section, merged[-1][1] + text)
+        else:
+            merged.append((section, text))
+    return merged
+
+class FlushPolicy:
+    """
+    控制增量何时发送给客户端：
+    - immediate: 收到即发送
+    - window: 在 window_ms 毫秒或 window_tokens 个 token 内合并为一次发送
+    - pace: 从第一个 token 起按 tokens_per_second 匀速输出，落后于节奏时把已到期的 token 合并发送；
+      上游结束后缓冲的内容仍按节奏发送完，再发送 done/error
+    """
+
+    def __init__(self, mode: str = FLUSH_IMMEDIATE, window_ms: float = 50,
+                 window_tokens: int = 16, tokens_per_second: float = 40):
+        if mode not in (FLUSH_IMMEDIATE, FLUSH_WINDOW, FLUSH_PACE):
+            raise ValueError(f'未知的 flush 模式：{mode}')
+        self.mode = mode
+        self.window = window_ms / 1000
+        self.window_tokens = window_tokens
+        self.tokens_per_second = tokens_per_second
+
+    async def apply(self, events):
+        """包装 (kind, data) 事件流，按策略合并 DELTA 事件"""
+        if self.mode == FLUSH_IMMEDIATE:
+            async for event in events:
+                yield event
+            return
+        if self.mode == FLUSH_PACE:
+            async for event in self._pace(events):
+                yield event
+            return
+
+        loop = asyncio.get_running_loop()
+        iterator = events.__aiter__()
+        pending = None
+        buffer = []
+        tokens = 0
+        deadline = None
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(iterator.__anext__())
+                timeout = None if deadline is None else max(deadline - loop.time(), 0)
+                done, _ = await asyncio.wait({pending}, timeout=timeout)
+
+                if not done:
+                    # 窗口到期，发送已合并的增量
+                    yield (DELTA, merge_deltas(buffer))
+                    buffer, tokens, deadline = [], 0, None
+                    continue
+
+                try:
+                    kind, data = pending.result()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    pending = None
+
+                if kind != DELTA:
+                    if buffer:
+                        yield (DELTA, merge_deltas(buffer))
+                        buffer, tokens, deadline = [], 0, None
+                    yield (kind, data)
+                    continue
+
+                buffer.extend(data)
+                tokens += 1
+                if tokens >= self.window_tokens:
+                    yield (DELTA, merge_deltas(buffer))
+                    buffer, tokens, deadline = [], 0, None
+                elif deadline is None:
+                    deadline = loop.time() + self.window
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+        if buffer:
+            yield (DELTA, merge_deltas(buffer))
+
+    async def _pace(self, events):
+        """
+        第 i 个 token（从 0 开始）在 started + i / tokens_per_second 时发送，started 为收到第一个 token 的时间。
+        下一次发送的时间只由已发送的 token 数决定，不随缓冲区中 token 的增加而后移。
+        """
+        loop = asyncio.get_running_loop()
+        iterator = events.__aiter__()
+        pending = None
+        # 每个元素是一个 token 的增量
+        buffer: list[list[tuple[str, str]]] = []
+        emitted = 0
+        started = None
+
+        def next_at() -> float:
+            return started + emitted / self.tokens_per_second
+
+        def release() -> tuple[str, list]:
+            """发送所有已到期的 token（至少一个）"""
+            nonlocal buffer, emitted
+            due = int((loop.time() - started) * self.tokens_per_second) + 1 - emitted
+            count = min(max(due, 1), len(buffer))
+            released, buffer = buffer[:count], buffer[count:]
+            emitted += count
+            return (DELTA, merge_deltas([delta for token in released for delta in token]))
+
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(iterator.__anext__())
+                timeout = max(next_at() - loop.time(), 0) if buffer else None
+                done, _ = await asyncio.wait({pending}, timeout=timeout)
+
+                if not done:
+                    yield release()
+                    continue
+
+                try:
+                    kind, data = pending.result()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    pending = None
+
+                if kind == DELTA:
+                    if started is None:
+                        started = loop.time()
+                    buffer.append(data)
+                    continue
+                if kind == SYNC:
+                    # 完整结果已包含缓冲中的 token，直接丢弃，按已发送处理
+                    emitted += len(buffer)
+                    buffer = []
+                else:
+                    while buffer:
+                        await asyncio.sleep(max(next_at() - loop.time(), 0))
+                        yield release()
+                yield (kind, data)
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+        # 上游结束后剩余的 token 仍按节奏发送
+        while buffer:
+            await asyncio.sleep(max(next_at() - loop.time(), 0))
+            yield release()
+
+_flush_policy: FlushPolicy | None = None
+
+def get_flush_policy() -> FlushPolicy:
+    global _flush_policy
+    if _flush_policy is None:
+        _flush_policy = FlushPolicy(
+            mode=config.get('stream.flush.mode', FLUSH_IMMEDIATE),
+            window_ms=config.get('stream.flush.window_ms', 50),
+            window_tokens=config.get('stream.flush.window_tokens', 16),
+            tokens_per_second=config.get('stream.flush.tokens_per_second', 40),
+        )
+    return _flush_policy
+
+class StreamStats:
+    """记录每个请求的首字节时间（TTFB）与流总耗时"""
+
+    def __init__(self):
+        self.streams = 0
+        self.ttfb_total = 0.0
+        self.ttfb_max = 0.0
+        self.duration_total = 0.0
+        self.duration_max = 0.0
+        self.events = 0
+
+    def record(self, ttfb: float, duration: float, events: int):
+        self.streams += 1
+        self.ttfb_total += ttfb
+        self.ttfb_max = max(self.ttfb_max, ttfb)
+        self.duration_total += duration
+        self.duration_max = max(self.duration_max, duration)
+        self.events += events
+
+    def to_dict(self) -> dict:
+        streams = self.streams or 1
+        return {
+            'streams': self.streams,
+            'events': self.events,
+            'ttfb_avg_ms': round(self.ttfb_total / streams * 1000, 3),
+            'ttfb_max_ms': round(self.ttfb_max * 1000, 3),
+            'duration_avg_ms': round(self.duration_total / streams * 1000, 3),
+            'duration_max_ms': round(self.duration_max * 1000, 3),
+        }
+
+stream_stats = StreamStats()
+
+SSE_STREAMS_IN_FLIGHT = Gauge('sse_streams_in_flight', '正在发送的 SSE 流', ('source',))
+SSE_TTFB_SECONDS = Histogram('sse_ttfb_seconds', 'SSE 流的首字节时间', ('source',))
+
+async def timed_stream(events, label: str = '', started: float | None = None):
+    """包装已编码的 SSE 流，统计 TTFB 与总耗时，started 为请求开始时的 time.perf_counter()"""
+    if started is None:
+        started = time.perf_counter()
+    ttfb = None
+    count = 0
+    SSE_STREAMS_IN_FLIGHT.inc(label)
+    try:
+        async for event in events:
+            if ttfb is None:
+                ttfb = time.perf_counter() - started
+                SSE_TTFB_SECONDS.observe(ttfb, label)
+            count += 1
+            yield event
+    finally:
+        SSE_STREAMS_IN_FLIGHT.dec(label)
+        duration = time.perf_counter() - started
+        if ttfb is None:
+            ttfb = duration
+        stream_stats.record(ttfb, duration, count)
+        logger.info(f'[timed_stream] {label} ttfb={ttfb * 1000:.1f}ms duration={duration * 1000:.1f}ms events={count}')
+
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    响应结束后一定调用 on_close，包括客户端在响应体开始前就断开、流一次都没有被迭代的情况，
+    此时生成器里的 finally 不会执行，清理不能依赖它。
+    """
+
+    def __init__(self, content, on_close=None, **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.on_close is not None:
+                self.on_close()
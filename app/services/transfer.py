@@ -0,0 +1,225 @@
+import io
+import csv
+import json
+import codecs
+import asyncio
+import logging
+from sqlalchemy import text
+from app.config import config
+from app.models.database import AsyncSessionLocal
+from app.services.records import invalidate_count_cache
+
+logger = logging.getLogger(__name__)
+
+FORMAT_JSONL = 'jsonl'
+FORMAT_CSV = 'csv'
+
+MEDIA_TYPES = {FORMAT_JSONL: 'application/x-ndjson', FORMAT_CSV: 'text/csv; charset=utf-8'}
+
+EXPORT_FIELDS = ('id', 'original_sentence', 'translated_sentence', 'furigana', 'grammar')
+IMPORT_FIELDS = ('original_sentence', 'translated_sentence', 'furigana', 'grammar')
+REQUIRED_FIELDS = ('original_sentence', 'translated_sentence')
+# 与 POST /records 的请求体字段名兼容
+FIELD_ALIASES = {'original': 'original_sentence', 'translated': 'translated_sentence'}
+
+# 沿 (open_id, id) 索引按 id 递增分块读取，每块一个短查询
+EXPORT_CHUNK = (
+    'SELECT id, original_sentence, translated_sentence, furigana, grammar FROM translations '
+    'WHERE open_id = :owner AND id > :after ORDER BY id LIMIT :limit'
+)
+
+# 当前用户已有相同原句时跳过；同一事务里先插入的行对后面的语句可见，上传内容中的重复也会被跳过
+IMPORT_ROW = (
+    'INSERT INTO translations (original_sentence, translated_sentence, furigana, grammar, open_id) '
+    'SELECT :original_sentence, :translated_sentence, :furigana, :grammar, :owner '
+    'WHERE NOT EXISTS (SELECT 1 FROM translations WHERE original_sentence = :original_sentence AND open_id = :owner)'
+)
+
+class ImportFormatError(ValueError):
+    """上传内容无法继续解析（编码错误、单行过长、缺少表头等），已写入的批次保留"""
+
+def _encode_chunk(rows, fmt: str) -> bytes:
+    if fmt == FORMAT_JSONL:
+        return ''.join(json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False) + '\n' for row in rows).encode()
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(rows)
+    return buffer.getvalue().encode()
+
+async def export_records(open_id: str, fmt: str = FORMAT_JSONL):
+    """
+    按 id 递增导出当前用户的全部记录，逐块产出编码后的字节。
+    不使用贯穿整个导出的服务端游标：每块单独取一个连接、读完立即归还，
+    客户端读得慢时不会长期占住连接池中的连接，也不会让 SQLite 的读事务阻止 WAL checkpoint；
+    内存中同时只有一块数据。
+    """
+    chunk_size = config.get('records.export.chunk_size', 1000)
+    if fmt == FORMAT_CSV:
+        # BOM 让 Excel 按 UTF-8 打开，导入时会自动去掉
+        yield ('\ufeff' + ','.join(EXPORT_FIELDS) + '\n').encode()
+    after = 0
+    exported = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                text(EXPORT_CHUNK), {'owner': open_id, 'after': after, 'limit': chunk_size}
+            )).all()
+        if not rows:
+            break
+        after = rows[-1][0]
+        exported += len(rows)
+        yield _encode_chunk(rows, fmt)
+        if len(rows) < chunk_size:
+            break
+    logger.info(f'[export_records] {open_id} 导出 {exported} 条记录（{fmt}）')
+
+async def _iter_lines(chunks, max_line_length: int):
+    """把上传的字节流增量解码并切分成行，内存中最多保留一个未结束的行"""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    line_number = 0
+    buffer = ''
+    try:
+        async for chunk in chunks:
+            buffer += decoder.decode(chunk)
+            *lines, buffer = buffer.split('\n')
+            for line in lines:
+                line_number += 1
+                yield line_number, line.rstrip('\r')
+            if len(buffer) > max_line_length:
+                raise ImportFormatError(f'第 {line_number + 1} 行超过 {max_line_length} 个字符')
+        buffer += decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        raise ImportFormatError(f'第 {line_number + 1} 行不是有效的 UTF-8')
+    if buffer.strip():
+        yield line_number + 1, buffer.rstrip('\r')
+
+async def _jsonl_items(lines):
+    async for line_number, line in lines:
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, ValueError(f'JSON 格式错误：{e.msg}')
+            continue
+        yield line_number, item
+
+async def _csv_items(lines, max_record_length: int):
+    """
+    引号内的字段可以包含换行：按引号个数的奇偶判断一条记录是否结束（RFC 4180 中字段内的引号成对出现），
+    结束后再交给 csv 模块解析。第一条记录为表头。
+    """
+    header = None
+    pending = []
+    quotes = 0
+    length = 0
+    first_line = 0
+    async for line_number, line in lines:
+        if not pending:
+            first_line = line_number
+            if not line.strip():
+                continue
+        pending.append(line)
+        quotes += line.count('"')
+        length += len(line)
+        if quotes % 2:
+            # 多余的引号会让后面的内容都被当作同一条记录
+            if length > max_record_length:
+                raise ImportFormatError(f'第 {first_line} 行开始的记录超过 {max_record_length} 个字符，可能有未闭合的引号')
+            continue
+        record = next(csv.reader(['\n'.join(pending)]))
+        pending, quotes, length = [], 0, 0
+        if header is None:
+            header = [FIELD_ALIASES.get(name.strip(), name.strip()) for name in record]
+            missing = [name for name in REQUIRED_FIELDS if name not in header]
+            if missing:
+                raise ImportFormatError(f'CSV 表头缺少字段：{", ".join(missing)}')
+            continue
+        if len(record) != len(header):
+            yield first_line, ValueError(f'有 {len(record)} 列，表头有 {len(header)} 列')
+            continue
+        yield first_line, dict(zip(header, record))
+    if pending:
+        yield first_line, ValueError('引号未闭合')
+
+def _normalize(item) -> dict:
+    """校验一条导入记录，返回 IMPORT_FIELDS 对应的字典，不合法时抛出 ValueError"""
+    if isinstance(item, Exception):
+        raise item
+    if not isinstance(item, dict):
+        raise ValueError('每行应为一个 JSON 对象')
+    row = {}
+    for key, value in item.items():
+        key = FIELD_ALIASES.get(key, key)
+        if key in IMPORT_FIELDS:
+            if value is None:
+                value = ''
+            if not isinstance(value, str):
+                raise ValueError(f'{key} 应为字符串')
+            row[key] = value
+    for name in REQUIRED_FIELDS:
+        if not row.get(name, '').strip():
+            raise ValueError(f'缺少 {name}')
+    row['original_sentence'] = row['original_sentence'].strip()
+    row.setdefault('furigana', '')
+    row.setdefault('grammar', '')
+    return row
+
+async def _insert_batch(open_id: str, rows: list[dict]) -> int:
+    """一个事务写入一批记录，返回实际插入的条数（其余为重复）"""
+    params = [{**row, 'owner': open_id} for row in rows]
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(text(IMPORT_ROW), params)
+        await db.commit()
+    return result.rowcount
+
+async def import_records(open_id: str, chunks, fmt: str = FORMAT_JSONL) -> dict:
+    """
+    从上传的字节流（异步迭代器）中增量解析记录，每 batch_size 条在一个事务里写入当前用户名下，
+    original_sentence 与该用户已有记录相同的跳过。内存中只保留当前批次。
+    不合法的行跳过并计数，最多返回 max_errors 条错误明细；无法继续解析时停止并在结果的 error 中说明，
+    此前已提交的批次保留，重新导入同一文件时会作为重复跳过。
+    """
+    batch_size = config.get('records.import.batch_size', 1000)
+    max_rows = config.get('records.import.max_rows', 2000000)
+    max_errors = config.get('records.import.max_errors', 20)
+    max_line_length = config.get('records.import.max_line_length', 1024 * 1024)
+    lines = _iter_lines(chunks, max_line_length)
+    items = _csv_items(lines, max_line_length) if fmt == FORMAT_CSV else _jsonl_items(lines)
+
+    stats = {'rows': 0, 'imported': 0, 'duplicates': 0, 'invalid': 0, 'errors': []}
+    batch = []
+
+    async def flush():
+        inserted = await _insert_batch(open_id, batch)
+        stats['imported'] += inserted
+        stats['duplicates'] += len(batch) - inserted
+        batch.clear()
+
+    try:
+        async for line_number, item in items:
+            stats['rows'] += 1
+            if max_rows and stats['rows'] > max_rows:
+                raise ImportFormatError(f'一次最多导入 {max_rows} 条记录')
+            try:
+                batch.append(_normalize(item))
+            except ValueError as e:
+                stats['invalid'] += 1
+                if len(stats['errors']) < max_errors:
+                    stats['errors'].append({'line': line_number, 'error': str(e)})
+                continue
+            if len(batch) >= batch_size:
+                await flush()
+                # 批次之间让出事件循环和写锁
+                await asyncio.sleep(0)
+        if batch:
+            await flush()
+    except ImportFormatError as e:
+        stats['error'] = str(e)
+    finally:
+        if stats['imported']:
+            invalidate_count_cache(open_id)
+        logger.info(
+            f"[import_records] {open_id} 导入 {stats['imported']} 条，重复 {stats['duplicates']} 条，"
+            f"无效 {stats['invalid']} 条（{fmt}）"
+        )
+    return stats
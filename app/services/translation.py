@@ -1,133 +1,357 @@
-import httpx
+import asyncio
 import logging
-from urllib.parse import urljoin
+import httpx
 from app.config import config
+from app.logs import SampledLogger
+from app.services.llm import LLMProvider, Usage, get_provider, get_recorder, record_usage, get_usage_stats
+from app.services.cache import get_cache, cache_key
+from app.services.section_parser import SectionParser
+from app.services.singleflight import InFlightRegistry, Subscriber
+from app.services.metrics import Counter, Histogram
+from app.services.usage import record_request, record_tokens, check_quota
+from app.services.resilience import (
+    UpstreamError, UpstreamTimeout, get_circuit_breaker, backoff_delay, open_hedged, with_deadlines,
+    upstream_stats
+)
+from app.services.sse import (
+    ResultState, ClosingStreamingResponse, make_encoder, get_flush_policy, timed_stream, stream_stats,
+    PROTOCOL_SNAPSHOT, DELTA, DONE, ERROR
+)
 from fastapi.responses import StreamingResponse
-import asyncio
-import json
+from functools import lru_cache
+from contextlib import aclosing
+import hashlib
+import time
 
 logger = logging.getLogger(__name__)
+_updates_log = SampledLogger(logger, lambda: config.get('logging.sample.token_debug_every', 100))
 
-async def process_translation(sentence: str):
-    logger.debug('[process_translation] 进入函数')
-    base_url = config.get('deepseek.base_url', "https://api.deepseek.com")
-    chat_api = config.get('deepseek.chat_api', '/chat/completions')
-    api_key = config.get('deepseek.api_key', '')
-    timeout = config.get('deepseek.timeout', 10)
-    api_url = urljoin(base_url, chat_api)
+SYSTEM_PROMPT = (
+    '你是一个帮助用户进行中日翻译的助手。当用户输入中文时，'
+    '请将其翻译为日语，并提供以下格式的输出：\n'
+    '1. 翻译结果: [翻译后的日语句子]\n'
+    '2. 平假名注释: [日语句子的平假名形式]\n'
+    '3. 语法解析: [简单的语法分析和关键点]\n'
+    '当用户输入日语时，请提供句子的平假名注释、语法解析，'
+    '并翻译为中文，保持同样的格式输出。'
+)
 
-    if not api_key:
-        logger.error('DeepSeek API Key未配置，请在配置文件中提供有效的值。')
-        async def error_stream():
-            yield "data: {\"error\": \"DeepSeek API Key未配置\"}\n\n"
-        return StreamingResponse(error_stream(), media_type="text/event-stream")
+_registry: InFlightRegistry | None = None
+
+def get_registry() -> InFlightRegistry:
+    global _registry
+    if _registry is None:
+        _registry = InFlightRegistry(queue_size=config.get('singleflight.queue_size', 64))
+    return _registry
 
-    messages = [
-        {
-            'role': 'system',
-            'content': (
-                '你是一个帮助用户进行中日翻译的助手。当用户输入中文时，'
-                '请将其翻译为日语，并提供以下格式的输出：\n'
-                '1. 翻译结果: [翻译后的日语句子]\n'
-                '2. 平假名注释: [日语句子的平假名形式]\n'
-                '3. 语法解析: [简单的语法分析和关键点]\n'
-                '当用户输入日语时，请提供句子的平假名注释、语法解析，'
-                '并翻译为中文，保持同样的格式输出。'
-            )
-        },
+UPSTREAM_FIRST_TOKEN_SECONDS = Histogram(
+    'upstream_first_token_seconds', '从发起上游请求到拿到第一个 token 的耗时（含重试与对冲）', ('provider',)
+)
+UPSTREAM_STREAM_SECONDS = Histogram(
+    'upstream_stream_seconds', '上游流从发起到结束的总耗时', ('provider', 'outcome')
+)
+UPSTREAM_TOKENS = Counter('upstream_tokens_total', '上游报告的 token 用量', ('provider', 'kind'))
+UPSTREAM_ERRORS = Counter(
+    'upstream_errors_total', '上游错误次数，stage=open 为首个 token 之前，stage=stream 为输出中途', ('stage', 'error')
+)
+SECTION_DELTAS = Counter('translation_section_deltas_total', '各段落收到的增量数', ('section',))
+SECTION_ERRORS = Counter('translation_section_errors_total', '上游中断时正在输出的段落', ('section',))
+
+@lru_cache(maxsize=1)
+def prompt_fingerprint() -> str:
+    """模型与系统提示词的指纹，任一变化（包括切换到回放后端）都会让旧缓存失效"""
+    return hashlib.sha256(f'{get_provider().model}\n{SYSTEM_PROMPT}'.encode('utf-8')).hexdigest()[:16]
+
+def build_messages(sentence: str) -> list:
+    return [
+        {'role': 'system', 'content': SYSTEM_PROMPT},
         {'role': 'user', 'content': sentence}
     ]
 
-    payload = {
-        'model': 'deepseek-chat',
-        'messages': messages,
-        'stream': True  # 开启流式模式
-    }
-    logger.debug('[process_translation] 请求参数构造完成')
+def _is_retryable(error: Exception) -> bool:
+    """连接失败、首 token 超时、429 与 5xx 可以重试；401 等客户端错误重试也没有用"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, (httpx.TransportError, UpstreamTimeout))
 
-    async def stream_generator():
-        logger.debug('[process_translation] 进入stream_generator')
-        result = {
-            'original': sentence,
-            'translated': '',
-            'furigana': '',
-            'grammar': '',
-        }
+def _describe(error: Exception) -> str:
+    if isinstance(error, UpstreamError):
+        return str(error)
+    if isinstance(error, httpx.HTTPStatusError):
+        return f'翻译服务返回错误（HTTP {error.response.status_code}）'
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout)):
+        return '无法连接翻译服务'
+    return '未知错误'
+
+async def _open_upstream(sentence: str, provider: LLMProvider, open_id: str | None = None):
+    """
+    建立上游流并拿到第一个增量，返回 (first, stream, usage)。
+    只在把任何内容交给客户端之前重试（带抖动的指数退避），可选对冲请求；
+    熔断期间直接抛出 UpstreamError。
+    对冲中落败被取消的请求、以及等待首 token 时整体被取消的请求已经把提示词发给了上游，
+    按估算的提示词用量记到 open_id 名下；胜出请求的用量由调用方在流结束时记账。
+    """
+    messages = build_messages(sentence)
+    timeout = config.get('deepseek.timeout', 10)
+    first_token_timeout = config.get('deepseek.timeouts.first_token', timeout)
+    idle_timeout = config.get('deepseek.timeouts.idle', timeout)
+    # 每次尝试（包括对冲请求）各自记录用量
+    usages = {}
+    # 本轮（一次 open_hedged）发起的请求
+    launched = []
 
-        buffer = ''
-        section = None
+    def make_attempt():
+        usage = Usage()
+        stream = with_deadlines(provider.stream(messages, usage), first_token_timeout, idle_timeout)
+        usages[stream] = usage
+        launched.append(stream)
+        return stream
 
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            try:
-                logger.debug(f'DeepSeek API请求payload：{payload}')
-                response = await client.post(
-                    api_url,
-                    json=payload,
-                    headers={
-                        'Authorization': f'Bearer {api_key}',
-                        'Content-Type': 'application/json',
-                        'Accept': 'application/json'
-                    },
-                    timeout=timeout
-                )
-                response.raise_for_status()
-
-                async for line in response.aiter_lines():
-                    line = line.strip()
-                    if not line:
-                        continue
-
-                    if line == "data: [DONE]":
-                        logger.debug("[process_translation] 流式数据接收完毕")
-                        break
-
-                    try:
-                        json_data = json.loads(line[5:].strip())
-                        delta_content = json_data.get("choices", [{}])[0].get("delta", {}).get("content")
-
-                        if delta_content is None:
-                            continue
-
-                        logger.debug(f"接收到的内容: {delta_content}")
-                        buffer += delta_content
-                        logger.debug(f'buffer: {buffer}')
-
-                        if "1. 翻译结果:" in buffer:
-                            section = "translated"
-                        if "\n2. 平假名注释:" in buffer:
-                            section = "furigana"
-                        if "\n3. 语法解析:" in buffer:
-                            section = "grammar"
-
-                        if section == "translated":
-                            result["translated"] = buffer.replace('1. 翻译结果:', '')
-                        elif section == "furigana":
-                            if '\n2. 平假名注释' in result["translated"]:
-                                result["translated"] = result["translated"].replace('\n2. 平假名注释', '')
-                            if buffer.endswith('\n2. 平假名注释:'):
-                                buffer = buffer.split('\n2. 平假名注释:')[1]
-                            result["furigana"] = buffer
-                        elif section == "grammar":
-                            if '\n3. 语法解析' in result["furigana"]:
-                                result["furigana"] = result["furigana"].replace('\n3. 语法解析', '')
-                            if buffer.endswith('\n3. 语法解析:'):
-                                buffer = buffer.split('\n3. 语法解析:')[1]
-                            if buffer.startswith(' \n'):
-                                buffer = buffer.split(' \n')[1]
-                            result["grammar"] = buffer
-                        
-                        logger.debug(f'result: {result}')
-
-                        yield f"data: {json.dumps(result, ensure_ascii=False)}\n\n"
-                        await asyncio.sleep(0.05)
-
-                    except json.JSONDecodeError as e:
-                        logger.error(f"JSON解析失败: {e}, line: {line}")
-                        continue
+    breaker = get_circuit_breaker()
+    retries = config.get('deepseek.retry.attempts', 2)
+    hedge_delay = config.get('deepseek.hedge.delay', 1.5) if config.get('deepseek.hedge.enabled', False) else None
+
+    for attempt in range(retries + 1):
+        if not breaker.allow():
+            upstream_stats['fast_failed'] += 1
+            raise UpstreamError('翻译服务暂时不可用，请稍后重试')
+        launched.clear()
+        try:
+            first, stream = await open_hedged(make_attempt, hedge_delay)
+        except Exception as e:
+            breaker.record_failure()
+            upstream_stats['failures'] += 1
+            UPSTREAM_ERRORS.inc('open', type(e).__name__)
+            if attempt == retries or not _is_retryable(e):
+                logger.error(f'[_open_upstream] 上游请求失败（第 {attempt + 1} 次）：{e!r}')
+                raise UpstreamError(_describe(e)) from e
+            delay = backoff_delay(attempt, config.get('deepseek.retry.backoff', 0.3),
+                                  config.get('deepseek.retry.max_backoff', 2))
+            logger.warning(f'[_open_upstream] 上游请求失败（第 {attempt + 1} 次）：{e!r}，{delay:.2f}s 后重试')
+            upstream_stats['retries'] += 1
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            # CancelledError 不是 Exception：不释放的话 half_open 状态会一直认为探测还在进行
+            breaker.release_probe()
+            for abandoned in launched:
+                _charge_usage(sentence, provider, usages[abandoned], 0, open_id)
+            raise
+        breaker.record_success()
+        for abandoned in launched:
+            if abandoned is not stream:
+                _charge_usage(sentence, provider, usages[abandoned], 0, open_id)
+        return first, stream, usages[stream]
 
+def _charge_usage(sentence: str, provider: LLMProvider, usage: Usage, received: int, open_id: str | None):
+    """
+    记录一次上游流的 token 用量。流被取消或中途失败时上游还没有发出用量，
+    与 ReplayProvider 一样估算：提示词按字符数，生成部分按已收到的增量数。
+    """
+    if not usage.total_tokens:
+        usage.prompt_tokens = sum(len(m['content']) for m in build_messages(sentence))
+        usage.completion_tokens = received
+    UPSTREAM_TOKENS.inc(provider.name, 'prompt', amount=usage.prompt_tokens)
+    UPSTREAM_TOKENS.inc(provider.name, 'completion', amount=usage.completion_tokens)
+    record_usage(usage)
+    record_tokens(open_id, usage)
+
+async def stream_translation(sentence: str, provider: LLMProvider, open_id: str | None = None):
+    """
+    请求大模型并逐段解析，每收到一段内容就产出一组 (section, 追加文本)。
+    上游流打开后，无论正常结束、中断还是被取消，token 用量都记到 open_id 名下；
+    合并请求时只记到发起上游请求的用户。
+    """
+    logger.debug('[stream_translation] 进入函数')
+    state = ResultState()
+    parser = SectionParser()
+    recorder = get_recorder()
+    deltas = []
+
+    started = time.perf_counter()
+    try:
+        first, stream, usage = await _open_upstream(sentence, provider, open_id)
+    except UpstreamError:
+        UPSTREAM_STREAM_SECONDS.observe(time.perf_counter() - started, provider.name, 'open_failed')
+        raise
+    UPSTREAM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started, provider.name)
+    received = 0
+    try:
+        delta_content = first
+        while True:
+            received += 1
+            if recorder is not None:
+                deltas.append(delta_content)
+            updates = parser.feed(delta_content)
+            if updates:
+                state.apply(updates)
+                for section, _ in updates:
+                    SECTION_DELTAS.inc(section)
+                _updates_log.debug('updates: %s', updates)
+                yield updates
+            try:
+                delta_content = await stream.__anext__()
+            except StopAsyncIteration:
+                break
             except Exception as e:
-                logger.error(f'未知错误：{e}')
-                yield "data: {\"error\": \"未知错误\"}\n\n"
+                # 已经有内容发给客户端，不能再重试
+                get_circuit_breaker().record_failure()
+                upstream_stats['failures'] += 1
+                UPSTREAM_ERRORS.inc('stream', type(e).__name__)
+                SECTION_ERRORS.inc(parser.section or 'none')
+                UPSTREAM_STREAM_SECONDS.observe(time.perf_counter() - started, provider.name, 'interrupted')
+                logger.error(f'[stream_translation] 上游流中断：{e!r}')
+                raise UpstreamError(_describe(e) if isinstance(e, UpstreamError) else '翻译中断，请重试') from e
+    finally:
+        # 先记账再关闭连接：关闭时可能再次被取消
+        _charge_usage(sentence, provider, usage, received, open_id)
+        await stream.aclose()
+
+    UPSTREAM_STREAM_SECONDS.observe(time.perf_counter() - started, provider.name, 'completed')
+    if recorder is not None:
+        await recorder.record(sentence, deltas, usage)
+
+    updates = parser.finish()
+    if updates:
+        state.apply(updates)
+        yield updates
+
+    result = state.snapshot()
+    cache = get_cache()
+    if cache is not None and result['translated']:
+        await cache.set(sentence, result)
+
+async def _direct_events(producer):
+    """不合并请求时，把上游增量包装成与订阅者相同的事件流"""
+    state = ResultState()
+    try:
+        async for deltas in producer():
+            state.apply(deltas)
+            yield (DELTA, deltas)
+    except UpstreamError as e:
+        yield (ERROR, str(e))
+        return
+    except Exception as e:
+        logger.error(f'未知错误：{e}')
+        yield (ERROR, '未知错误')
+        return
+    yield (DONE, state.snapshot())
+
+class TranslationError(Exception):
+    """非流式翻译失败，message 可以直接展示给用户"""
+
+def _upstream_events(sentence: str, provider: LLMProvider, open_id: str | None = None):
+    """上游请求的 (kind, data) 事件流，开启合并时与相同句子的其他请求共享"""
+    def producer():
+        return stream_translation(sentence, provider, open_id)
+
+    if config.get('singleflight.enabled', True):
+        # 相同句子的并发请求共享同一个上游流
+        key = cache_key(sentence, prompt_fingerprint())
+        return get_registry().join(key, producer)
+    return _direct_events(producer)
+
+async def cached_result(sentence: str) -> dict | None:
+    """查询翻译缓存，一个请求只查一次；熔断期间也接受过期的结果，总比直接报错好"""
+    cache = get_cache()
+    if cache is None:
+        return None
+    cached, fresh = await cache.lookup(sentence, allow_stale=get_circuit_breaker().is_open())
+    if cached is not None and not fresh:
+        upstream_stats['stale_served'] += 1
+        logger.info('[cached_result] 上游熔断中，返回过期缓存')
+    return cached
+
+async def translate(sentence: str, use_cache: bool = True, open_id: str | None = None) -> dict:
+    """
+    非流式翻译，返回完整结果 {translated, furigana, grammar}。
+    与 process_translation 共用提示词、段落解析、缓存与合并请求，失败时抛出 TranslationError。
+    use_cache=False 时跳过缓存查询（调用方已用 cached_result 查过，包括熔断期间的过期缓存）。
+    指定 open_id 时请求计入该用户的用量，并在连接上游前检查每日额度（不做请求频率限制，由调用方控制）。
+    """
+    record_request(open_id)
+    if use_cache:
+        cached = await cached_result(sentence)
+        if cached is not None:
+            return cached
+
+    provider = get_provider()
+    error = provider.config_error()
+    if error:
+        raise TranslationError(error)
+    if open_id:
+        error = await check_quota(open_id, rate_limit=False)
+        if error:
+            raise TranslationError(error)
+
+    # 在第一次迭代之前被取消时也要退订
+    async with aclosing(_upstream_events(sentence, provider, open_id)) as events:
+        async for kind, data in events:
+            if kind == DONE:
+                return data
+            if kind == ERROR:
+                raise TranslationError(data)
+    raise TranslationError('未知错误')
+
+def get_singleflight_stats() -> dict:
+    return get_registry().get_stats()
+
+def get_stream_stats() -> dict:
+    return stream_stats.to_dict()
+
+def get_upstream_stats() -> dict:
+    return {**upstream_stats, 'circuit_breaker': get_circuit_breaker().to_dict(), 'usage': get_usage_stats()}
+
+async def process_translation(sentence: str, protocol: int = PROTOCOL_SNAPSHOT, open_id: str | None = None):
+    """
+    protocol=1 每次发送完整结果（旧版前端）；
+    protocol=2 只发送增量，结束时发送完整结果，见 app.services.sse.DeltaEncoder。
+    open_id 为当前用户：命中缓存不受限制，需要请求上游时先检查该用户的每日额度与请求频率。
+    """
+    logger.debug('[process_translation] 进入函数')
+    record_request(open_id)
+    started = time.perf_counter()
+    encoder = make_encoder(protocol, sentence)
+    cached = await cached_result(sentence)
+    if cached is not None:
+        logger.debug('[process_translation] 命中翻译缓存')
+        async def cached_stream():
+            for event in encoder.encode_result(cached):
+                yield event
+        return StreamingResponse(timed_stream(cached_stream(), 'cache', started), media_type="text/event-stream")
+
+    provider = get_provider()
+    error = provider.config_error()
+    if error:
+        logger.error(f'{error}，请在配置文件中提供有效的值。')
+    elif open_id:
+        # 在打开上游连接之前拒绝超限的请求
+        error = await check_quota(open_id)
+    if error:
+        async def error_stream():
+            for event in encoder.encode(ERROR, error):
+                yield event
+        return StreamingResponse(error_stream(), media_type="text/event-stream")
+
+    upstream = _upstream_events(sentence, provider, open_id)
+    events = get_flush_policy().apply(upstream)
+    logger.debug('[process_translation] 请求参数构造完成')
+
+    async def stream_generator():
+        logger.debug('[process_translation] 进入stream_generator')
+        try:
+            async for kind, data in events:
+                for event in encoder.encode(kind, data):
+                    yield event
+                if kind in (DONE, ERROR):
+                    break
+        except Exception as e:
+            logger.error(f'未知错误：{e}')
+            for event in encoder.encode(ERROR, '未知错误'):
+                yield event
 
     logger.debug('[stream_generator] 准备返回')
-    return StreamingResponse(stream_generator(), media_type="text/event-stream")
\ No newline at end of file
+    # 订阅者由响应负责退订，不依赖流是否开始迭代
+    on_close = upstream.close if isinstance(upstream, Subscriber) else None
+    return ClosingStreamingResponse(timed_stream(stream_generator(), 'upstream', started), on_close=on_close,
+                                    media_type="text/event-stream")
@@ -0,0 +1,270 @@
+import time
+import asyncio
+import logging
+from datetime import date, timedelta
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from app.config import config
+from app.models.database import AsyncSessionLocal, UserUsage
+from app.services.llm import Usage
+from app.services.ratelimit import TokenBucket
+from app.services.lifecycle import worker_count
+from app.services.metrics import Counter, GaugeFunc
+
+logger = logging.getLogger(__name__)
+
+USAGE_REJECTIONS = Counter('usage_rejections_total', '因用户限流或每日额度被拒绝的翻译请求', ('reason',))
+USAGE_FLUSHES = Counter('usage_flushes_total', '用量计数批量写入数据库的次数', ('result',))
+
+# 计数顺序：请求数、提示词 token、生成 token
+FIELDS = ('requests', 'prompt_tokens', 'completion_tokens')
+
+def today() -> str:
+    return date.today().isoformat()
+
+class UsageTracker:
+    """
+    按 (open_id, 日期) 累计翻译请求数与 token 用量。
+    请求路径上只做内存中的加法，后台任务每 flush_interval 秒把增量合并成一个事务累加到 user_usage 表；
+    检查额度时用数据库中的当日用量（缓存 refresh_interval 秒）加上本进程尚未写入的增量。
+    多个 worker 各自计数、各自写入，其他进程的用量最多延迟 flush_interval + refresh_interval 秒可见。
+    """
+
+    def __init__(self, refresh_interval: float = 10):
+        self.refresh_interval = refresh_interval
+        # (open_id, day) -> [requests, prompt_tokens, completion_tokens]
+        self._pending: dict[tuple[str, str], list[int]] = {}
+        # 正在写入数据库的增量，写入完成前仍计入用量
+        self._flushing: dict[tuple[str, str], list[int]] = {}
+        # (open_id, day) -> (loaded_at, 数据库中的计数)
+        self._stored: dict[tuple[str, str], tuple[float, list[int]]] = {}
+        self._stats = {'flushes': 0, 'rows_flushed': 0, 'flush_errors': 0, 'loads': 0}
+
+    def _counts(self, open_id: str) -> list[int]:
+        key = (open_id, today())
+        counts = self._pending.get(key)
+        if counts is None:
+            counts = self._pending[key] = [0, 0, 0]
+        return counts
+
+    def record_request(self, open_id: str):
+        self._counts(open_id)[0] += 1
+
+    def record_tokens(self, open_id: str, usage: Usage):
+        counts = self._counts(open_id)
+        counts[1] += usage.prompt_tokens
+        counts[2] += usage.completion_tokens
+
+    async def _load(self, key: tuple[str, str]) -> list[int]:
+        entry = self._stored.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.refresh_interval:
+            return entry[1]
+        async with AsyncSessionLocal() as db:
+            row = (await db.execute(
+                select(UserUsage.requests, UserUsage.prompt_tokens, UserUsage.completion_tokens)
+                .where(UserUsage.open_id == key[0], UserUsage.day == key[1])
+            )).first()
+        counts = list(row) if row else [0, 0, 0]
+        self._stored[key] = (time.monotonic(), counts)
+        self._stats['loads'] += 1
+        return counts
+
+    async def get(self, open_id: str, day: str | None = None) -> dict:
+        """某个用户某天的用量（默认今天），包含尚未写入数据库的部分"""
+        key = (open_id, day or today())
+        totals = list(await self._load(key))
+        for source in (self._flushing, self._pending):
+            counts = source.get(key)
+            if counts:
+                totals = [a + b for a, b in zip(totals, counts)]
+        result = dict(zip(FIELDS, totals))
+        result['total_tokens'] = result['prompt_tokens'] + result['completion_tokens']
+        return result
+
+    async def history(self, open_id: str, days: int) -> list[dict]:
+        """最近 days 天（含今天）的用量，按日期倒序"""
+        first = (date.today() - timedelta(days=days - 1)).isoformat()
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(UserUsage.day, UserUsage.requests, UserUsage.prompt_tokens, UserUsage.completion_tokens)
+                .where(UserUsage.open_id == open_id, UserUsage.day >= first)
+            )).all()
+        totals = {row[0]: list(row[1:]) for row in rows}
+        for source in (self._flushing, self._pending):
+            for (owner, day), counts in source.items():
+                if owner == open_id and day >= first:
+                    totals[day] = [a + b for a, b in zip(totals.get(day, [0, 0, 0]), counts)]
+        return [
+            {'day': day, **dict(zip(FIELDS, counts)), 'total_tokens': counts[1] + counts[2]}
+            for day, counts in sorted(totals.items(), reverse=True)
+        ]
+
+    async def flush(self) -> int:
+        """
+        把内存中的增量在一个事务里累加到 user_usage，返回写入的行数。
+        失败或被取消（CancelledError 不是 Exception）时增量放回，下次重试。
+        """
+        if not self._pending or self._flushing:
+            return 0
+        self._flushing, self._pending = self._pending, {}
+        rows = [
+            {'open_id': open_id, 'day': day, **dict(zip(FIELDS, counts))}
+            for (open_id, day), counts in self._flushing.items()
+        ]
+        stmt = insert(UserUsage)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserUsage.open_id, UserUsage.day],
+            set_={field: getattr(UserUsage, field) + getattr(stmt.excluded, field) for field in FIELDS},
+        )
+        committed = False
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(stmt, rows)
+                await db.commit()
+            committed = True
+        except Exception as e:
+            self._stats['flush_errors'] += 1
+            USAGE_FLUSHES.inc('error')
+            logger.error(f'[UsageTracker.flush] 写入用量失败，下次重试：{e}')
+            return 0
+        finally:
+            flushed, self._flushing = self._flushing, {}
+            if not committed:
+                for key, counts in flushed.items():
+                    pending = self._pending.setdefault(key, [0, 0, 0])
+                    for index, value in enumerate(counts):
+                        pending[index] += value
+
+        # 数据库中的值已经变化，下次检查时重新读取
+        for key in flushed:
+            self._stored.pop(key, None)
+        self._stats['flushes'] += 1
+        self._stats['rows_flushed'] += len(rows)
+        USAGE_FLUSHES.inc('ok')
+        return len(rows)
+
+    def prune(self):
+        """丢弃不是今天的缓存读数"""
+        current = today()
+        for key in [key for key in self._stored if key[1] != current]:
+            del self._stored[key]
+
+    def stats(self) -> dict:
+        return {**self._stats, 'pending_users': len(self._pending), 'cached_users': len(self._stored)}
+
+_tracker: UsageTracker | None = None
+
+def get_usage_tracker() -> UsageTracker:
+    global _tracker
+    if _tracker is None:
+        _tracker = UsageTracker(config.get('usage.refresh_interval', 10))
+    return _tracker
+
+def record_request(open_id: str | None):
+    if open_id:
+        get_usage_tracker().record_request(open_id)
+
+def record_tokens(open_id: str | None, usage: Usage):
+    if open_id:
+        get_usage_tracker().record_tokens(open_id, usage)
+
+# open_id -> 该用户的令牌桶
+_buckets: dict[str, TokenBucket] = {}
+
+def _bucket(open_id: str) -> TokenBucket | None:
+    rate = config.get('usage.rate_limit.per_second', 0.5)
+    if not rate or rate <= 0:
+        return None
+    bucket = _buckets.get(open_id)
+    if bucket is None:
+        if len(_buckets) >= config.get('usage.max_users', 10000):
+            _prune_buckets()
+        # 请求会被分到任意一个 worker，每个进程按比例分摊
+        workers = worker_count()
+        bucket = _buckets[open_id] = TokenBucket(
+            rate / workers, max(config.get('usage.rate_limit.burst', 5) / workers, 1)
+        )
+    return bucket
+
+def _prune_buckets():
+    """回收已补满（近期没有请求）的令牌桶，效果与重新创建一样"""
+    for open_id in [open_id for open_id, bucket in _buckets.items() if bucket.is_full()]:
+        del _buckets[open_id]
+
+async def check_quota(open_id: str, rate_limit: bool = True) -> str | None:
+    """
+    在连接上游之前检查用户的每日 token 额度与请求频率，超出时返回可以直接展示给用户的提示，否则返回 None。
+    token 用量在流结束后才知道，同时进行中的请求可能让当日用量略微超过额度。
+    """
+    quota = config.get('usage.daily_token_quota', 200000)
+    if quota and quota > 0:
+        used = await get_usage_tracker().get(open_id)
+        if used['total_tokens'] >= quota:
+            USAGE_REJECTIONS.inc('daily_quota')
+            logger.info(f'[check_quota] {open_id} 今日已用 {used["total_tokens"]} tokens，超过额度 {quota}')
+            return '今日翻译额度已用完，请明天再来'
+    if rate_limit:
+        bucket = _bucket(open_id)
+        if bucket is not None and not bucket.try_acquire():
+            USAGE_REJECTIONS.inc('rate_limit')
+            return '请求过于频繁，请稍后再试'
+    return None
+
+async def get_user_usage(open_id: str, days: int = 1) -> dict:
+    quota = config.get('usage.daily_token_quota', 200000) or 0
+    used = await get_usage_tracker().get(open_id)
+    return {
+        'open_id': open_id,
+        'today': used,
+        'daily_token_quota': quota,
+        'remaining_tokens': max(quota - used['total_tokens'], 0) if quota > 0 else None,
+        'rate_limit': {
+            'per_second': config.get('usage.rate_limit.per_second', 0.5),
+            'burst': config.get('usage.rate_limit.burst', 5),
+        },
+        'history': await get_usage_tracker().history(open_id, days) if days > 1 else [],
+    }
+
+def get_usage_tracker_stats() -> dict:
+    return {**get_usage_tracker().stats(), 'rate_limited_users': len(_buckets)}
+
+GaugeFunc('usage_pending_users', '尚未写入数据库的用量计数涉及的用户数',
+          lambda: _tracker.stats()['pending_users'] if _tracker is not None else 0)
+
+async def _flush_loop(interval: float, stopping: asyncio.Event):
+    while True:
+        try:
+            await asyncio.wait_for(stopping.wait(), interval)
+            return
+        except asyncio.TimeoutError:
+            pass
+        try:
+            tracker = get_usage_tracker()
+            await tracker.flush()
+            tracker.prune()
+            if len(_buckets) > config.get('usage.max_users', 10000) // 2:
+                _prune_buckets()
+        except Exception as e:
+            logger.error(f'[_flush_loop] 写入用量失败：{e}')
+
+_flusher: asyncio.Task | None = None
+_stopping: asyncio.Event | None = None
+
+def start_usage_flusher():
+    """每个 worker 都启动，各自写入本进程的计数"""
+    global _flusher, _stopping
+    if _flusher is None:
+        _stopping = asyncio.Event()
+        _flusher = asyncio.create_task(_flush_loop(max(config.get('usage.flush_interval', 5), 0.1), _stopping))
+
+async def stop_usage_flusher():
+    """
+    通知后台任务退出并写入剩余的计数。不取消任务：正在进行的写入完成后任务自己结束，
+    避免事务已提交、取消却让计数被放回而重复累加。
+    """
+    global _flusher, _stopping
+    if _flusher is not None:
+        _stopping.set()
+        await _flusher
+        _flusher, _stopping = None, None
+    await get_usage_tracker().flush()
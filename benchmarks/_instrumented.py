@@ -0,0 +1,60 @@
+"""
+基准测试用的 app.main:app：额外运行一个事件循环延迟采样任务，并提供 GET /__bench/runtime
+返回采样期间的循环延迟与进程 RSS，不修改应用本身的代码。
+
+    uvicorn benchmarks._instrumented:app
+"""
+import time
+import asyncio
+import resource
+from contextlib import asynccontextmanager
+
+from app.main import app
+
+SAMPLE_INTERVAL = 0.01
+
+_lags: list[float] = []
+
+async def _sample_loop_lag():
+    """每隔 SAMPLE_INTERVAL 秒醒来一次，实际醒来时间比预期晚多少就是循环延迟"""
+    while True:
+        expected = time.perf_counter() + SAMPLE_INTERVAL
+        await asyncio.sleep(SAMPLE_INTERVAL)
+        _lags.append(max(time.perf_counter() - expected, 0.0))
+
+def _rss_mb(field: str = 'VmRSS') -> float:
+    """field 为 RssAnon 时只统计堆等匿名内存，不含 SQLite mmap 映射的数据库文件页"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(f'{field}:'):
+                return round(int(line.split()[1]) / 1024, 1)
+    return 0.0
+
+_app_lifespan = app.router.lifespan_context
+
+@asynccontextmanager
+async def _lifespan(application):
+    async with _app_lifespan(application) as state:
+        sampler = asyncio.create_task(_sample_loop_lag())
+        try:
+            yield state
+        finally:
+            sampler.cancel()
+
+app.router.lifespan_context = _lifespan
+
+@app.get('/__bench/runtime')
+async def bench_runtime(reset: bool = False):
+    lags = sorted(_lags)
+    result = {
+        'loop_lag_samples': len(lags),
+        'loop_lag_p50_ms': round(lags[len(lags) // 2] * 1000, 3) if lags else 0.0,
+        'loop_lag_p99_ms': round(lags[min(int(len(lags) * 0.99), len(lags) - 1)] * 1000, 3) if lags else 0.0,
+        'loop_lag_max_ms': round(lags[-1] * 1000, 3) if lags else 0.0,
+        'rss_mb': _rss_mb(),
+        'rss_anon_mb': _rss_mb('RssAnon'),
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    if reset:
+        _lags.clear()
+    return result
@@ -0,0 +1,172 @@
+"""基准测试共用的工具：启动模拟上游与应用进程、准备数据库、统计分位数"""
+import os
+import sys
+import time
+import socket
+import sqlite3
+import tempfile
+import subprocess
+from pathlib import Path
+from datetime import datetime, timedelta
+from contextlib import contextmanager
+
+import yaml
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_for_port(port: int, timeout: float = 15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f'端口 {port} 在 {timeout}s 内未就绪')
+
+@contextmanager
+def _process(args: list[str], port: int, env: dict | None = None, log_path: Path | None = None):
+    log = open(log_path, 'w') if log_path else subprocess.DEVNULL
+    proc = subprocess.Popen(args, cwd=ROOT, env={**os.environ, **(env or {})},
+                            stdout=log, stderr=subprocess.STDOUT)
+    try:
+        wait_for_port(port)
+        yield proc
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        if log_path:
+            log.close()
+
+@contextmanager
+def run_fake_deepseek(tokens: int = 200, delay_ms: float = 5, extra_args: list[str] | None = None,
+                      port: int | None = None):
+    """启动模拟 DeepSeek 服务，返回 base_url；指定 port 可以在同一地址上停止后重新启动"""
+    port = port or free_port()
+    args = [sys.executable, '-m', 'benchmarks.fake_deepseek', '--port', str(port),
+            '--tokens', str(tokens), '--delay-ms', str(delay_ms), *(extra_args or [])]
+    with _process(args, port):
+        yield f'http://127.0.0.1:{port}'
+
+@contextmanager
+def run_mock_alipay(delay_ms: float = 50, fail_rate: float = 0.0):
+    """启动模拟支付宝网关，返回网关地址"""
+    port = free_port()
+    args = [sys.executable, '-m', 'benchmarks.mock_alipay', '--port', str(port),
+            '--delay-ms', str(delay_ms), '--fail-rate', str(fail_rate)]
+    with _process(args, port):
+        yield f'http://127.0.0.1:{port}/gateway.do'
+
+def deep_merge(base: dict, overrides: dict) -> dict:
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            deep_merge(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+def write_config(workdir: Path, overrides: dict) -> Path:
+    """以仓库的 config.yaml 为基础写入测试配置，数据库与日志都放在 workdir"""
+    with open(ROOT / 'config.yaml', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    deep_merge(config, {
+        'database': {'path': str(workdir / 'translations.db')},
+        'logging': {'level': 'WARNING', 'file': str(workdir / 'app.log')},
+        # 压测用同一个用户发起大量请求，默认关闭按用户的限流与每日额度
+        'usage': {'daily_token_quota': 0, 'rate_limit': {'per_second': 0}},
+    })
+    deep_merge(config, overrides)
+    path = workdir / 'config.yaml'
+    with open(path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+    return path
+
+@contextmanager
+def run_app(workdir: Path, overrides: dict, extra_args: list[str] | None = None, app: str = 'app.main:app'):
+    """用 uvicorn 启动应用（默认 app.main:app），返回 base_url"""
+    port = free_port()
+    config_path = write_config(workdir, overrides)
+    args = [sys.executable, '-m', 'uvicorn', app, '--port', str(port),
+            '--log-level', 'warning', *(extra_args or [])]
+    with _process(args, port, env={'HELLO_NIHONGO_CONFIG': str(config_path)},
+                  log_path=workdir / 'server.out') as proc:
+        yield f'http://127.0.0.1:{port}'
+
+@contextmanager
+def run_serve(workdir: Path, overrides: dict, workers: int, graceful_timeout: int = 30):
+    """用 python -m app.serve 启动多 worker 的应用，返回 (base_url, 主进程)，可以对主进程发送信号"""
+    port = free_port()
+    config_path = write_config(workdir, overrides)
+    args = [sys.executable, '-m', 'app.serve', '--host', '127.0.0.1', '--port', str(port),
+            '--workers', str(workers), '--graceful-timeout', str(graceful_timeout)]
+    with _process(args, port, env={'HELLO_NIHONGO_CONFIG': str(config_path)},
+                  log_path=workdir / 'server.out') as proc:
+        yield f'http://127.0.0.1:{port}', proc
+
+@contextmanager
+def temp_workdir(keep: bool = False):
+    path = Path(tempfile.mkdtemp(prefix='hello_nihongo_bench_'))
+    try:
+        yield path
+    finally:
+        if not keep:
+            for child in sorted(path.rglob('*'), reverse=True):
+                child.unlink() if child.is_file() else child.rmdir()
+            path.rmdir()
+
+def seed_session(db_path: Path, session_id: str = 'bench-session', open_id: str = 'bench-user') -> str:
+    """写入一个有效会话，返回可用作 session_id cookie 的值"""
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        'INSERT OR REPLACE INTO user_sessions (session_id, open_id, avatar, nick_name, expires_at) '
+        'VALUES (?, ?, ?, ?, ?)',
+        (session_id, open_id, '', 'bench', datetime.utcnow() + timedelta(days=1))
+    )
+    conn.commit()
+    conn.close()
+    return session_id
+
+def seed_records(db_path: Path, count: int, batch: int = 10000, owners: list[str] | None = None):
+    """批量写入 count 条翻译记录，依次轮流分配给 owners（默认与 seed_session 的用户相同）"""
+    owners = owners or ['bench-user']
+    conn = sqlite3.connect(db_path)
+    start = conn.execute('SELECT COALESCE(MAX(id), 0) FROM translations').fetchone()[0]
+    for offset in range(0, count, batch):
+        rows = [
+            (f'第{i}句：今天天气很好，我们去公园散步吧。', f'今日は天気がいいので、公園を散歩しましょう。({i})',
+             'きょうはてんきがいいので、こうえんをさんぽしましょう。', f'- 语法点 {i % 97}：〜ましょう 表示提议',
+             owners[i % len(owners)])
+            for i in range(start + offset, start + min(offset + batch, count))
+        ]
+        conn.executemany(
+            'INSERT INTO translations (original_sentence, translated_sentence, furigana, grammar, open_id) '
+            'VALUES (?, ?, ?, ?, ?)',
+            rows
+        )
+        conn.commit()
+    conn.close()
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+def summarize(values: list[float], scale: float = 1000) -> dict:
+    """返回毫秒为单位的 p50/p95/p99/max"""
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 50) * scale, 3),
+        'p95_ms': round(percentile(values, 95) * scale, 3),
+        'p99_ms': round(percentile(values, 99) * scale, 3),
+        'max_ms': round(max(values) * scale, 3) if values else 0.0,
+    }
@@ -0,0 +1,122 @@
+"""
+支付宝登录回调的吞吐：并发请求 /alipay/callback（换 token + 取用户信息 + 建会话），
+上游是本地模拟网关。同时以固定间隔请求一个轻量接口，
+其延迟反映回调期间事件循环是否被阻塞。
+
+用法：
+    python -m benchmarks.bench_alipay_callback
+    python -m benchmarks.bench_alipay_callback --requests 500 --concurrency 50 --delay-ms 100 --fail-rate 0.05 --json
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+from Crypto.PublicKey import RSA
+
+from benchmarks._support import run_mock_alipay, run_app, temp_workdir, summarize
+
+async def callbacks(base_url: str, total: int, concurrency: int) -> dict:
+    latencies = []
+    failures = 0
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal failures
+        while not queue.empty():
+            index = queue.get_nowait()
+            started = time.perf_counter()
+            response = await client.get('/alipay/callback', params={'auth_code': f'code{index}'})
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 303 or 'session_id=' not in response.headers.get('set-cookie', ''):
+                failures += 1
+
+    started = time.perf_counter()
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': total,
+        'failures': failures,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 1),
+        'latency': summarize(latencies),
+    }
+
+async def probe(base_url: str, interval: float, stop: asyncio.Event) -> dict:
+    latencies = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        while not stop.is_set():
+            started = time.perf_counter()
+            await client.get('/stats/pool')
+            latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(interval)
+    return summarize(latencies)
+
+async def run(args) -> dict:
+    # 每次运行生成一对临时密钥，应用用私钥签名（模拟网关不验签）
+    key = RSA.generate(2048)
+    with temp_workdir() as workdir, run_mock_alipay(args.delay_ms, args.fail_rate) as gateway:
+        overrides = {
+            'alipay': {
+                'api_gateway': gateway,
+                'app_private_key': key.export_key().decode(),
+                'alipay_public_key': key.publickey().export_key().decode(),
+                'pool': {'max_connections': args.pool_size, 'max_keepalive_connections': args.pool_size},
+            },
+        }
+        with run_app(workdir, overrides) as base_url:
+            async with httpx.AsyncClient(base_url=base_url) as client:
+                idle_probe = []
+                for _ in range(20):
+                    started = time.perf_counter()
+                    await client.get('/stats/pool')
+                    idle_probe.append(time.perf_counter() - started)
+
+            stop = asyncio.Event()
+            prober = asyncio.create_task(probe(base_url, args.probe_interval_ms / 1000, stop))
+            result = await callbacks(base_url, args.requests, args.concurrency)
+            stop.set()
+            loaded_probe = await prober
+
+    return {
+        'config': vars(args),
+        'callback': result,
+        'probe_idle': summarize(idle_probe),
+        'probe_under_load': loaded_probe,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200, help='回调总数')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--delay-ms', type=float, default=50, help='模拟网关每个请求的延迟')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='模拟网关返回 503 的概率')
+    parser.add_argument('--pool-size', type=int, default=20, help='应用到网关的连接池大小')
+    parser.add_argument('--probe-interval-ms', type=float, default=10)
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    callback = result['callback']
+    print(f"callbacks={callback['requests']} failures={callback['failures']} "
+          f"elapsed={callback['elapsed_s']}s throughput={callback['throughput_rps']} req/s")
+    latency = callback['latency']
+    print(f"callback latency p50={latency['p50_ms']}ms p95={latency['p95_ms']}ms p99={latency['p99_ms']}ms")
+    for name in ('probe_idle', 'probe_under_load'):
+        stats = result[name]
+        print(f"{name:<18} p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms max={stats['max_ms']}ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+批量翻译：对比 POST /process/batch 与浏览器逐句调用 /process（HTTP/1.1 下每个域名最多约 6 个并发连接）。
+
+指标：全部完成的耗时、第一条结果的到达时间、每秒完成的句子数。
+句子每次运行都不同，不会命中翻译缓存。
+
+用法：
+    python -m benchmarks.bench_batch
+    python -m benchmarks.bench_batch --sentences 200 --concurrency 8 --rps 20 --json
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+from benchmarks._support import run_fake_deepseek, run_app, temp_workdir, seed_session
+
+async def per_sentence(base_url: str, session_id: str, sentences: list[str], concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+    first = None
+
+    async def one(client: httpx.AsyncClient, sentence: str):
+        nonlocal first
+        async with semaphore:
+            async with client.stream('GET', '/process', params={'sentence': sentence, 'protocol': 2}) as response:
+                async for line in response.aiter_lines():
+                    if line.startswith('data:') and '"done"' in line:
+                        first = first or time.perf_counter() - started
+
+    async with httpx.AsyncClient(base_url=base_url, cookies={'session_id': session_id}, timeout=300) as client:
+        await asyncio.gather(*(one(client, sentence) for sentence in sentences))
+    elapsed = time.perf_counter() - started
+    return {'elapsed_s': round(elapsed, 3), 'first_result_s': round(first or 0, 3),
+            'sentences_per_s': round(len(sentences) / elapsed, 1)}
+
+async def batch(base_url: str, session_id: str, sentences: list[str], save: bool) -> dict:
+    started = time.perf_counter()
+    first = None
+    done = {}
+    async with httpx.AsyncClient(base_url=base_url, cookies={'session_id': session_id}, timeout=300) as client:
+        async with client.stream('POST', '/process/batch', json={'sentences': sentences, 'save': save}) as response:
+            async for line in response.aiter_lines():
+                if not line.startswith('data:'):
+                    continue
+                event = json.loads(line[5:])
+                if event['type'] == 'result':
+                    first = first or time.perf_counter() - started
+                elif event['type'] == 'done':
+                    done = event
+    elapsed = time.perf_counter() - started
+    return {'elapsed_s': round(elapsed, 3), 'first_result_s': round(first or 0, 3),
+            'sentences_per_s': round(len(sentences) / elapsed, 1), 'done': done}
+
+async def run(args) -> dict:
+    overrides = {
+        'cache': {'enabled': False},
+        'batch': {'concurrency': args.concurrency, 'requests_per_second': args.rps, 'burst': args.rps,
+                  'max_sentences': max(args.sentences, 500)},
+    }
+    stamp = int(time.time())
+    with temp_workdir() as workdir, run_fake_deepseek(args.tokens, args.delay_ms) as upstream:
+        overrides['deepseek'] = {'base_url': upstream, 'api_key': 'bench', 'pool': {'http2': False}}
+        with run_app(workdir, overrides) as base_url:
+            session_id = seed_session(workdir / 'translations.db')
+            browser = await per_sentence(
+                base_url, session_id, [f'逐句 {stamp} {i}' for i in range(args.sentences)], args.browser_concurrency
+            )
+            batched = await batch(
+                base_url, session_id, [f'批量 {stamp} {i}' for i in range(args.sentences)], args.save
+            )
+    return {'config': vars(args), 'per_sentence': browser, 'batch': batched}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sentences', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=8, help='batch.concurrency')
+    parser.add_argument('--rps', type=float, default=50, help='batch.requests_per_second')
+    parser.add_argument('--browser-concurrency', type=int, default=6, help='逐句调用时的并发连接数')
+    parser.add_argument('--save', action='store_true', help='批量请求同时写入记录')
+    parser.add_argument('--tokens', type=int, default=200)
+    parser.add_argument('--delay-ms', type=float, default=5)
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    for name in ('per_sentence', 'batch'):
+        stats = result[name]
+        print(f"{name:<14} elapsed={stats['elapsed_s']}s first={stats['first_result_s']}s "
+              f"rate={stats['sentences_per_s']} sentences/s")
+    print(f"batch done event: {result['batch']['done']}")
+
+if __name__ == '__main__':
+    main()
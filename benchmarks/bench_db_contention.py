@@ -0,0 +1,126 @@
+"""
+验证数据库访问不会阻塞事件循环：对比 /process 流在空闲和 /records 高负载下的延迟。
+
+指标：TTFB、相邻事件最大间隔（事件循环被阻塞时会明显变大）、流总耗时。
+
+用法：
+    python -m benchmarks.bench_db_contention
+    python -m benchmarks.bench_db_contention --records 200000 --readers 32 --streams 20 --json
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+from benchmarks._support import (
+    run_fake_deepseek, run_app, temp_workdir, seed_session, seed_records, summarize
+)
+
+async def one_stream(client: httpx.AsyncClient, index: int) -> dict:
+    started = time.perf_counter()
+    ttfb = None
+    last = started
+    max_gap = 0.0
+    async with client.stream('GET', '/process', params={'sentence': f'压测句子 {index} {time.time()}', 'protocol': 2}) as response:
+        async for line in response.aiter_lines():
+            if not line.startswith('data:'):
+                continue
+            now = time.perf_counter()
+            if ttfb is None:
+                ttfb = now - started
+            else:
+                max_gap = max(max_gap, now - last)
+            last = now
+    return {'ttfb': ttfb or 0.0, 'max_gap': max_gap, 'duration': time.perf_counter() - started}
+
+async def run_streams(base_url: str, count: int) -> dict:
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        results = await asyncio.gather(*(one_stream(client, i) for i in range(count)))
+    return {
+        'ttfb': summarize([r['ttfb'] for r in results]),
+        'max_gap': summarize([r['max_gap'] for r in results]),
+        'duration': summarize([r['duration'] for r in results]),
+    }
+
+async def records_load(base_url: str, session_id: str, readers: int, stop: asyncio.Event) -> dict:
+    latencies = []
+    cookies = {'session_id': session_id}
+
+    async def worker(index: int):
+        async with httpx.AsyncClient(base_url=base_url, cookies=cookies, timeout=120) as client:
+            n = 0
+            while not stop.is_set():
+                started = time.perf_counter()
+                if n % 5 == 4:
+                    await client.post('/records', json={
+                        'original': f'负载 {index}-{n}', 'translated': 't', 'furigana': 'f', 'grammar': 'g'
+                    })
+                else:
+                    await client.get('/records', params={'query': f'第{n * 7 % 1000}句', 'page': n % 20 + 1})
+                latencies.append(time.perf_counter() - started)
+                n += 1
+
+    tasks = [asyncio.create_task(worker(i)) for i in range(readers)]
+    await stop.wait()
+    await asyncio.gather(*tasks)
+    return summarize(latencies)
+
+async def run(args) -> dict:
+    overrides = {
+        'cache': {'enabled': False},
+        'singleflight': {'enabled': False},
+        'stream': {'flush': {'mode': 'immediate'}},
+    }
+    with temp_workdir() as workdir, run_fake_deepseek(args.tokens, args.delay_ms) as upstream:
+        overrides['deepseek'] = {'base_url': upstream, 'api_key': 'bench', 'pool': {'http2': False}}
+        with run_app(workdir, overrides) as base_url:
+            db_path = workdir / 'translations.db'
+            seed_records(db_path, args.records)
+            session_id = seed_session(db_path)
+
+            idle = await run_streams(base_url, args.streams)
+
+            stop = asyncio.Event()
+            load = asyncio.create_task(records_load(base_url, session_id, args.readers, stop))
+            await asyncio.sleep(1)
+            loaded = await run_streams(base_url, args.streams)
+            stop.set()
+            records = await load
+
+    return {
+        'config': vars(args),
+        'process_idle': idle,
+        'process_under_records_load': loaded,
+        'records_latency': records,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=50000, help='预先写入的记录数')
+    parser.add_argument('--readers', type=int, default=16, help='并发请求 /records 的客户端数')
+    parser.add_argument('--streams', type=int, default=10, help='并发 /process 流数')
+    parser.add_argument('--tokens', type=int, default=200)
+    parser.add_argument('--delay-ms', type=float, default=5)
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    for name in ('process_idle', 'process_under_records_load'):
+        print(name)
+        for metric, stats in result[name].items():
+            print(f"  {metric:<10} p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms max={stats['max_ms']}ms")
+    records = result['records_latency']
+    print(f"records    n={records['count']} p50={records['p50_ms']}ms p95={records['p95_ms']}ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+日志配置对流式翻译开销的影响：在进程内用回放后端（不等待）连续跑 --streams 个 stream_translation，
+比较不同日志配置下每个流消耗的 CPU 时间（含后台写日志线程）与事件循环上的耗时。
+
+    info_queue            INFO，队列 + 后台线程写文件（生产默认）
+    debug_sampled_queue   DEBUG，逐 token 日志按 1/100 采样
+    debug_all_queue       DEBUG，每个 token 都记录
+    debug_all_sync        DEBUG，每个 token 都记录，直接在事件循环里写文件（原来的方式）
+
+每个配置在独立的子进程中运行，日志写到临时目录，不输出到控制台。
+
+用法：
+    python -m benchmarks.bench_logging
+    python -m benchmarks.bench_logging --streams 2000 --json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks._support import ROOT, temp_workdir, write_config
+
+VARIANTS = {
+    'info_queue': {'level': 'INFO', 'queue': True, 'sample': {'token_debug_every': 100}},
+    'debug_sampled_queue': {'level': 'DEBUG', 'queue': True, 'sample': {'token_debug_every': 100}},
+    'debug_all_queue': {'level': 'DEBUG', 'queue': True, 'sample': {'token_debug_every': 1}},
+    'debug_all_sync': {'level': 'DEBUG', 'queue': False, 'sample': {'token_debug_every': 1}},
+}
+
+async def child_run(streams: int) -> dict:
+    from app.config import config
+    from app.logs import stop_logging
+    from app.services.llm import get_provider
+    from app.services.translation import stream_translation
+
+    config.setup_logging()
+    provider = get_provider()
+    # 预热：导入、首次创建对象等一次性开销不计入
+    async for _ in stream_translation('预热', provider):
+        pass
+
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+    deltas = 0
+    for index in range(streams):
+        async for updates in stream_translation(f'日志 {index}', provider):
+            deltas += len(updates)
+    loop_seconds = time.perf_counter() - wall_started
+    # 等后台线程写完队列里的日志，这部分 CPU 也算进去
+    stop_logging()
+    cpu_seconds = time.process_time() - cpu_started
+    return {
+        'streams': streams,
+        'deltas': deltas,
+        'cpu_ms_per_stream': round(cpu_seconds / streams * 1000, 3),
+        'loop_ms_per_stream': round(loop_seconds / streams * 1000, 3),
+    }
+
+def child(args):
+    result = asyncio.run(child_run(args.streams))
+    print(json.dumps(result))
+
+def run_variant(name: str, streams: int) -> dict:
+    with temp_workdir() as workdir:
+        config_path = write_config(workdir, {
+            'logging': {'console': False, 'json': False, 'max_bytes': 0, **VARIANTS[name]},
+            'cache': {'enabled': False},
+            'singleflight': {'enabled': False},
+            'metrics': {'enabled': False},
+            'llm': {'provider': 'replay', 'replay': {'tokens_per_second': 0, 'first_token_delay': 0}},
+        })
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_logging', '--child', '--streams', str(streams)],
+            cwd=ROOT, env={**os.environ, 'HELLO_NIHONGO_CONFIG': str(config_path)},
+            capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        log_file = workdir / 'app.log'
+        result['log_bytes'] = log_file.stat().st_size if log_file.exists() else 0
+        return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--streams', type=int, default=500)
+    parser.add_argument('--variants', default=','.join(VARIANTS), help='逗号分隔的日志配置')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    results = {name: run_variant(name, args.streams) for name in args.variants.split(',')}
+    if args.json:
+        print(json.dumps({'config': vars(args), 'variants': results}, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{'variant':<22}{'cpu ms/stream':>15}{'loop ms/stream':>16}{'log KB':>10}")
+    for name, item in results.items():
+        print(f"{name:<22}{item['cpu_ms_per_stream']:>15}{item['loop_ms_per_stream']:>16}"
+              f"{item['log_bytes'] // 1024:>10}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+记录按用户隔离后的查询开销：大量用户的记录交错存放在同一张表中，
+抽样若干用户测量列表、深翻页、游标翻页、搜索以及保存/删除的延迟。
+
+对照项 scan_count 用 NOT INDEXED 强制全表扫描统计同一用户的记录数，
+用来说明 (open_id, id) 复合索引省掉了多少工作。
+
+用法：
+    python -m benchmarks.bench_records_per_user                        # 默认 1 万用户 × 每人 1000 条
+    python -m benchmarks.bench_records_per_user --users 1000 --per-user 100 --json
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks._support import temp_workdir, write_config, seed_records, summarize
+
+LIMIT = 5
+
+async def run(args, workdir: Path) -> dict:
+    os.environ['HELLO_NIHONGO_CONFIG'] = str(write_config(workdir, {}))
+    # 配置写好后再导入，数据库建在 workdir 下
+    from sqlalchemy import text
+    from app.models.database import AsyncSessionLocal, TranslationRecord, init_database, close_database
+    from app.services.records import search_records, search_records_after
+
+    init_database()
+
+    owners = [f'bench-user-{i:08d}' for i in range(args.users)]
+    started = time.perf_counter()
+    # 轮流分配，同一用户的记录分散在整张表中
+    seed_records(workdir / 'translations.db', args.users * args.per_user, owners=owners)
+    seed_seconds = time.perf_counter() - started
+
+    rng = random.Random(args.seed)
+    sample = rng.sample(owners, min(args.sample, len(owners)))
+    last_page = max((args.per_user + LIMIT - 1) // LIMIT, 1)
+    timings = {name: [] for name in (
+        'list_first_page', 'list_last_page', 'cursor_two_pages', 'fts_search', 'fts_rare_search', 'like_search',
+        'save', 'delete', 'scan_count',
+    )}
+
+    async def timed(name, coro):
+        started = time.perf_counter()
+        result = await coro
+        timings[name].append(time.perf_counter() - started)
+        return result
+
+    async with AsyncSessionLocal() as db:
+        plan = (await db.execute(text(
+            'EXPLAIN QUERY PLAN SELECT id FROM translations WHERE open_id = :owner ORDER BY id LIMIT 5'
+        ), {'owner': sample[0]})).all()
+
+        for open_id in sample:
+            records, total = await timed('list_first_page', search_records(db, open_id, '', 1, LIMIT))
+            assert total == args.per_user, (open_id, total)
+            await timed('list_last_page', search_records(db, open_id, '', last_page, LIMIT))
+
+            async def two_pages():
+                _, cursor, _ = await search_records_after(db, open_id, '', '', LIMIT)
+                if cursor:
+                    await search_records_after(db, open_id, '', cursor, LIMIT)
+            await timed('cursor_two_pages', two_pages())
+
+            # 常见词（每条记录都匹配）与罕见词走不同的连接顺序
+            await timed('fts_search', search_records(db, open_id, '公园散步', 1, LIMIT))
+            rare = records[0]['original_sentence'].split('：')[0]
+            await timed('fts_rare_search', search_records(db, open_id, rare, 1, LIMIT))
+            await timed('like_search', search_records(db, open_id, '语法', 1, LIMIT))
+
+            async def save():
+                record = TranslationRecord(original_sentence='新句子', translated_sentence='新しい文',
+                                           furigana='あたらしいぶん', grammar='-', open_id=open_id)
+                db.add(record)
+                await db.commit()
+                return record
+            record = await timed('save', save())
+
+            async def delete():
+                await db.delete(await db.get(TranslationRecord, record.id))
+                await db.commit()
+            await timed('delete', delete())
+
+            await timed('scan_count', db.scalar(
+                text('SELECT count(*) FROM translations NOT INDEXED WHERE open_id = :owner'), {'owner': open_id}
+            ))
+    await close_database()
+
+    return {
+        'users': args.users,
+        'per_user': args.per_user,
+        'records': args.users * args.per_user,
+        'seed_seconds': round(seed_seconds, 1),
+        'sampled_users': len(sample),
+        'list_plan': [row[-1] for row in plan],
+        'timings': {name: summarize(values) for name, values in timings.items()},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--per-user', type=int, default=1000, help='每个用户的记录数')
+    parser.add_argument('--sample', type=int, default=50, help='抽样测量的用户数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    with temp_workdir() as workdir:
+        result = asyncio.run(run(args, workdir))
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    print(f"users={result['users']} per_user={result['per_user']} records={result['records']} "
+          f"seed={result['seed_seconds']}s sampled={result['sampled_users']}")
+    print(f"plan: {' / '.join(result['list_plan'])}")
+    print(f"{'operation':<20}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in result['timings'].items():
+        print(f"{name:<20}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+对比记录搜索的两种实现：
+- like: 原 get_records 的 LIKE '%q%'，count() 与分页各执行一次过滤
+- fts: app.services.records.search_records（FTS5 trigram + BM25 + 窗口函数取总数）
+
+用法：
+    python -m benchmarks.bench_records_search                 # 默认 100 万条记录
+    python -m benchmarks.bench_records_search --records 100000 --json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks._support import temp_workdir, write_config, seed_records, summarize
+
+QUERIES = ['公园散步', '第12345句', '〜ましょう', 'こうえん', '语法点 42', '不存在的内容']
+
+async def run(args, workdir: Path) -> dict:
+    os.environ['HELLO_NIHONGO_CONFIG'] = str(write_config(workdir, {}))
+    # 配置写好后再导入，数据库建在 workdir 下
+    from sqlalchemy import text
+    from app.models.database import AsyncSessionLocal, init_database, close_database
+    from app.services.records import search_records
+
+    init_database()
+
+    started = time.perf_counter()
+    seed_records(workdir / 'translations.db', args.records)
+    seed_seconds = time.perf_counter() - started
+
+    like_sql = (
+        'FROM translations WHERE original_sentence LIKE :q OR translated_sentence LIKE :q'
+    )
+    results = {}
+    async with AsyncSessionLocal() as db:
+        for query in QUERIES:
+            like, fts = [], []
+            for page in range(1, args.repeat + 1):
+                started = time.perf_counter()
+                await db.scalar(text(f'SELECT count(*) {like_sql}'), {'q': f'%{query}%'})
+                await db.execute(text(f'SELECT * {like_sql} LIMIT 5 OFFSET :offset'),
+                                 {'q': f'%{query}%', 'offset': (page - 1) * 5})
+                like.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                await search_records(db, 'bench-user', query, page, 5)
+                fts.append(time.perf_counter() - started)
+            results[query] = {'like': summarize(like), 'fts': summarize(fts)}
+    await close_database()
+    return {'records': args.records, 'seed_seconds': round(seed_seconds, 1), 'queries': results}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5, help='每个查询翻页的次数')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    with temp_workdir() as workdir:
+        result = asyncio.run(run(args, workdir))
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    print(f"records={result['records']} seed={result['seed_seconds']}s")
+    print(f"{'query':<16}{'like p50 ms':>14}{'fts p50 ms':>14}")
+    for query, stats in result['queries'].items():
+        print(f"{query:<16}{stats['like']['p50_ms']:>14}{stats['fts']['p50_ms']:>14}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+记录的批量导出与导入：写入 --records 条记录后，
+    export   GET /records/export 分别以 JSONL 与 CSV 流式下载，统计行数、字节数、耗时
+    import   把导出的文件以流的方式上传到另一个用户（POST /records/import），再上传一次验证去重
+每一步之后读取服务进程的 RSS、匿名内存（不含 SQLite mmap 映射的数据库文件页，后者上限为 mmap_size）
+与峰值 RSS（benchmarks._instrumented 的 /__bench/runtime），用来确认内存占用不随记录数增长。
+
+用法：
+    python -m benchmarks.bench_records_transfer
+    python -m benchmarks.bench_records_transfer --records 1000000 --json
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+from benchmarks._support import run_app, temp_workdir, seed_records, seed_session
+
+async def runtime(client: httpx.AsyncClient) -> dict:
+    stats = (await client.get('/__bench/runtime')).json()
+    return {'rss_mb': stats['rss_mb'], 'rss_anon_mb': stats['rss_anon_mb'], 'max_rss_mb': stats['max_rss_mb']}
+
+async def export(client: httpx.AsyncClient, fmt: str, path: Path) -> dict:
+    started = time.perf_counter()
+    first_byte = None
+    size = 0
+    with open(path, 'wb') as f:
+        async with client.stream('GET', '/records/export', params={'format': fmt}) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                first_byte = first_byte or time.perf_counter() - started
+                size += len(chunk)
+                f.write(chunk)
+    elapsed = time.perf_counter() - started
+    with open(path, 'rb') as f:
+        lines = sum(1 for _ in f)
+    return {
+        'lines': lines,
+        'mb': round(size / 1024 / 1024, 1),
+        'first_byte_ms': round((first_byte or 0) * 1000, 1),
+        'elapsed_s': round(elapsed, 2),
+        **await runtime(client),
+    }
+
+async def upload(client: httpx.AsyncClient, fmt: str, path: Path) -> dict:
+    async def body():
+        with open(path, 'rb') as f:
+            while chunk := f.read(64 * 1024):
+                yield chunk
+
+    started = time.perf_counter()
+    response = await client.post('/records/import', params={'format': fmt}, content=body(), timeout=3600)
+    elapsed = time.perf_counter() - started
+    result = response.json()
+    return {
+        'status': response.status_code,
+        'imported': result.get('imported'),
+        'duplicates': result.get('duplicates'),
+        'invalid': result.get('invalid'),
+        'elapsed_s': round(elapsed, 2),
+        'rows_per_s': round((result.get('rows') or 0) / elapsed),
+        **await runtime(client),
+    }
+
+async def run(args) -> dict:
+    with temp_workdir() as workdir, run_app(workdir, {'logging': {'console': False}},
+                                            app='benchmarks._instrumented:app') as base_url:
+        db_path = workdir / 'translations.db'
+        started = time.perf_counter()
+        seed_records(db_path, args.records)
+        seeded_s = time.perf_counter() - started
+        exporter = seed_session(db_path)
+        importer = seed_session(db_path, 'bench-importer', 'bench-importer')
+
+        result = {'config': vars(args), 'seed_s': round(seeded_s, 1)}
+        async with httpx.AsyncClient(base_url=base_url, cookies={'session_id': exporter}, timeout=3600) as client:
+            result['idle'] = await runtime(client)
+            for fmt in args.formats.split(','):
+                result[f'export_{fmt}'] = await export(client, fmt, workdir / f'export.{fmt}')
+
+        fmt = args.import_format
+        async with httpx.AsyncClient(base_url=base_url, cookies={'session_id': importer}, timeout=3600) as client:
+            result['import'] = await upload(client, fmt, workdir / f'export.{fmt}')
+            result['import_again'] = await upload(client, fmt, workdir / f'export.{fmt}')
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=200000)
+    parser.add_argument('--formats', default='jsonl,csv', help='导出的格式')
+    parser.add_argument('--import-format', default='jsonl', choices=('jsonl', 'csv'), help='导入时使用哪个导出文件')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    idle = result['idle']
+    print(f"写入 {args.records} 条记录用时 {result['seed_s']}s，空闲时 RSS {idle['rss_mb']} MB（匿名 {idle['rss_anon_mb']} MB）")
+    for name, item in result.items():
+        if name.startswith('export_'):
+            print(f"{name:<14} {item['lines']} 行 {item['mb']} MB，首字节 {item['first_byte_ms']} ms，"
+                  f"共 {item['elapsed_s']}s，RSS {item['rss_mb']} MB（匿名 {item['rss_anon_mb']} MB，峰值 {item['max_rss_mb']} MB）")
+    for name in ('import', 'import_again'):
+        item = result[name]
+        print(f"{name:<14} HTTP {item['status']}：导入 {item['imported']}，重复 {item['duplicates']}，"
+              f"无效 {item['invalid']}，{item['elapsed_s']}s（{item['rows_per_s']} 行/s），"
+              f"RSS {item['rss_mb']} MB（匿名 {item['rss_anon_mb']} MB，峰值 {item['max_rss_mb']} MB）")
+
+if __name__ == '__main__':
+    main()
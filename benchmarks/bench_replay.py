@@ -0,0 +1,116 @@
+"""
+离线压测整条 /process 链路：llm.provider 设为 replay，上游由 ReplayProvider 在进程内回放，
+不访问网络也不消耗 token，可以一次打开上千个并发流。
+
+指标：首个事件到达时间（TTFT）、完整流耗时、每秒完成的流数与事件数、失败数，以及服务端统计的 token 用量。
+句子各不相同，关闭缓存与请求合并，每个流都会真正走一遍上游路径。
+
+用法：
+    python -m benchmarks.bench_replay                                   # 1000 个并发流
+    python -m benchmarks.bench_replay --streams 3000 --tps 20 --recording streams.jsonl --json
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+from benchmarks._support import run_app, temp_workdir, seed_session, summarize
+
+async def drive(base_url: str, session_id: str, streams: int, protocol: int) -> dict:
+    ttft, totals = [], []
+    events = 0
+    errors = 0
+    started = time.perf_counter()
+
+    async def one(client: httpx.AsyncClient, index: int):
+        nonlocal events, errors
+        begin = time.perf_counter()
+        first = None
+        try:
+            async with client.stream('GET', '/process', params={'sentence': f'回放 {begin} {index}',
+                                                                'protocol': protocol}) as response:
+                async for line in response.aiter_lines():
+                    if not line.startswith('data:'):
+                        continue
+                    events += 1
+                    if first is None:
+                        first = time.perf_counter() - begin
+                    if '"error"' in line:
+                        errors += 1
+        except httpx.HTTPError:
+            errors += 1
+            return
+        ttft.append(first or 0)
+        totals.append(time.perf_counter() - begin)
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base_url, cookies={'session_id': session_id},
+                                 timeout=600, limits=limits) as client:
+        await asyncio.gather(*(one(client, index) for index in range(streams)))
+        elapsed = time.perf_counter() - started
+        stats = (await client.get('/stats/upstream')).json()
+    return {
+        'elapsed_s': round(elapsed, 3),
+        'completed': len(totals),
+        'errors': errors,
+        'streams_per_s': round(len(totals) / elapsed, 1),
+        'events_per_s': round(events / elapsed, 1),
+        'ttft': summarize(ttft),
+        'total': summarize(totals),
+        'usage': stats['usage'],
+    }
+
+async def run(args) -> dict:
+    overrides = {
+        'cache': {'enabled': False},
+        'singleflight': {'enabled': False},
+        'llm': {'provider': 'replay', 'replay': {
+            'path': str(Path(args.recording).resolve()) if args.recording else '',
+            'tokens_per_second': args.tps, 'first_token_delay': args.first_token_delay,
+            'jitter': args.jitter, 'seed': args.seed,
+        }},
+    }
+    with temp_workdir() as workdir, run_app(workdir, overrides, ['--backlog', str(max(args.streams, 2048))]) as base_url:
+        session_id = seed_session(workdir / 'translations.db')
+        result = await drive(base_url, session_id, args.streams, args.protocol)
+    return {'config': vars(args), **result}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--streams', type=int, default=1000, help='同时打开的 /process 流数')
+    parser.add_argument('--tps', type=float, default=20, help='每个流的回放速率（token/s）')
+    parser.add_argument('--first-token-delay', type=float, default=0.3)
+    parser.add_argument('--jitter', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--recording', default='', help='ReplayProvider 使用的录制文件（JSONL）')
+    parser.add_argument('--protocol', type=int, default=2, choices=(1, 2))
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    # 每个流在客户端和服务端各占一个文件描述符
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < args.streams * 2 + 256:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, args.streams * 2 + 256), hard))
+
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    print(f"streams={args.streams} tps={args.tps} elapsed={result['elapsed_s']}s completed={result['completed']} "
+          f"errors={result['errors']} streams/s={result['streams_per_s']} events/s={result['events_per_s']}")
+    print(f"{'metric':<10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name in ('ttft', 'total'):
+        stats = result[name]
+        print(f"{name:<10}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}{stats['max_ms']:>10}")
+    print(f"usage: {result['usage']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+对比流式响应的两种段落解析方式：
+- legacy: 原 stream_generator 中每个 token 都对整个 buffer 做 in/replace/split
+- incremental: app.services.section_parser.SectionParser
+
+用法：
+    python -m benchmarks.bench_section_parser
+    python -m benchmarks.bench_section_parser --tokens 1000 5000 20000 --repeat 5
+    python -m benchmarks.bench_section_parser --recorded stream.jsonl
+
+--recorded 文件每行是一条 DeepSeek SSE 数据（"data: {...}"）或一个 JSON 字符串 delta。
+"""
+import sys
+import json
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.section_parser import SectionParser
+
+FILLER = 'この文は日本語の文法を説明するための例文です。助詞「は」は主題を示し、「が」は主語を示します。'
+
+def synthetic_stream(tokens: int, seed: int = 0) -> list[str]:
+    """生成约 tokens 个 delta 的模拟响应，三个段落按 1:1:8 分配长度"""
+    rng = random.Random(seed)
+    chunks = []
+
+    def add_text(count):
+        for _ in range(count):
+            start = rng.randrange(len(FILLER) - 4)
+            chunks.append(FILLER[start:start + rng.randint(1, 4)])
+
+    # 标记本身也按随机长度切开，模拟跨 chunk 的情况
+    def add_marker(marker):
+        pos = 0
+        while pos < len(marker):
+            size = rng.randint(1, 3)
+            chunks.append(marker[pos:pos + size])
+            pos += size
+
+    add_marker('1. 翻译结果:')
+    add_text(max(tokens // 10, 1))
+    add_marker('\n2. 平假名注释:')
+    add_text(max(tokens // 10, 1))
+    add_marker('\n3. 语法解析: \n')
+    add_text(max(tokens - len(chunks), 1))
+    return chunks
+
+def load_recorded(path: str) -> list[str]:
+    deltas = []
+    for line in Path(path).read_text(encoding='utf-8').splitlines():
+        line = line.strip()
+        if not line or line == 'data: [DONE]':
+            continue
+        if line.startswith('data:'):
+            data = json.loads(line[5:].strip())
+            content = data.get('choices', [{}])[0].get('delta', {}).get('content')
+            if content is not None:
+                deltas.append(content)
+        else:
+            deltas.append(json.loads(line))
+    return deltas
+
+def parse_legacy(deltas: list[str]) -> dict:
+    """原 stream_generator 中的解析逻辑（去掉日志与网络部分）"""
+    result = {'translated': '', 'furigana': '', 'grammar': ''}
+    buffer = ''
+    section = None
+    for delta_content in deltas:
+        buffer += delta_content
+        if "1. 翻译结果:" in buffer:
+            section = "translated"
+        if "\n2. 平假名注释:" in buffer:
+            section = "furigana"
+        if "\n3. 语法解析:" in buffer:
+            section = "grammar"
+
+        if section == "translated":
+            result["translated"] = buffer.replace('1. 翻译结果:', '')
+        elif section == "furigana":
+            if '\n2. 平假名注释' in result["translated"]:
+                result["translated"] = result["translated"].replace('\n2. 平假名注释', '')
+            if buffer.endswith('\n2. 平假名注释:'):
+                buffer = buffer.split('\n2. 平假名注释:')[1]
+            result["furigana"] = buffer
+        elif section == "grammar":
+            if '\n3. 语法解析' in result["furigana"]:
+                result["furigana"] = result["furigana"].replace('\n3. 语法解析', '')
+            if buffer.endswith('\n3. 语法解析:'):
+                buffer = buffer.split('\n3. 语法解析:')[1]
+            if buffer.startswith(' \n'):
+                buffer = buffer.split(' \n')[1]
+            result["grammar"] = buffer
+    return result
+
+def parse_incremental(deltas: list[str]) -> dict:
+    parts = {'translated': [], 'furigana': [], 'grammar': []}
+    parser = SectionParser()
+    for delta in deltas:
+        for section, text in parser.feed(delta):
+            parts[section].append(text)
+    for section, text in parser.finish():
+        parts[section].append(text)
+    return {section: ''.join(texts) for section, texts in parts.items()}
+
+def best_of(func, deltas, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(deltas)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tokens', type=int, nargs='+', default=[1000, 2000, 5000, 10000, 20000])
+    parser.add_argument('--recorded', nargs='*', default=[], help='录制的流式响应文件')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    streams = [(f'synthetic-{n}', synthetic_stream(n)) for n in args.tokens]
+    streams += [(Path(path).name, load_recorded(path)) for path in args.recorded]
+
+    rows = []
+    for name, deltas in streams:
+        legacy = best_of(parse_legacy, deltas, args.repeat)
+        incremental = best_of(parse_incremental, deltas, args.repeat)
+        rows.append({
+            'stream': name,
+            'deltas': len(deltas),
+            'chars': sum(len(d) for d in deltas),
+            'legacy_ms': round(legacy * 1000, 3),
+            'incremental_ms': round(incremental * 1000, 3),
+            'speedup': round(legacy / incremental, 1) if incremental else None,
+        })
+
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{'stream':<20}{'deltas':>8}{'chars':>9}{'legacy ms':>12}{'incr ms':>10}{'speedup':>9}")
+    for row in rows:
+        print(f"{row['stream']:<20}{row['deltas']:>8}{row['chars']:>9}"
+              f"{row['legacy_ms']:>12}{row['incremental_ms']:>10}{row['speedup']:>8}x")
+
+if __name__ == '__main__':
+    main()
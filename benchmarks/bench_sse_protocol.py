@@ -0,0 +1,81 @@
+"""
+对比两种 SSE 协议在整条响应上的发送字节数与序列化耗时：
+- v1 (snapshot): 每次更新都 json.dumps 完整结果
+- v2 (delta): 只发送 {section, append}，结束时发送一次完整结果
+
+用法：
+    python -m benchmarks.bench_sse_protocol
+    python -m benchmarks.bench_sse_protocol --tokens 600 5000 --json
+"""
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.section_parser import SectionParser
+from app.services.sse import ResultState, SnapshotEncoder, DeltaEncoder, DELTA, DONE
+from benchmarks.bench_section_parser import synthetic_stream
+
+SENTENCE = '今天天气很好，我们去公园散步吧。'
+
+def parsed_updates(deltas: list[str]) -> list[list[tuple[str, str]]]:
+    """先把 delta 解析成段落增量，只测量编码部分"""
+    parser = SectionParser()
+    updates = [u for u in (parser.feed(d) for d in deltas) if u]
+    tail = parser.finish()
+    if tail:
+        updates.append(tail)
+    return updates
+
+def final_result(updates) -> dict:
+    state = ResultState()
+    for deltas in updates:
+        state.apply(deltas)
+    return state.snapshot()
+
+def run(encoder, updates, result: dict) -> tuple[int, int, float]:
+    events = 0
+    size = 0
+    started = time.perf_counter()
+    for deltas in updates:
+        for event in encoder.encode(DELTA, deltas):
+            events += 1
+            size += len(event.encode('utf-8'))
+    for event in encoder.encode(DONE, result):
+        events += 1
+        size += len(event.encode('utf-8'))
+    return events, size, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tokens', type=int, nargs='+', default=[600, 2000, 5000, 10000])
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    rows = []
+    for tokens in args.tokens:
+        updates = parsed_updates(synthetic_stream(tokens))
+        result = final_result(updates)
+        for name, encoder_cls in (('v1-snapshot', SnapshotEncoder), ('v2-delta', DeltaEncoder)):
+            events, size, elapsed = run(encoder_cls(SENTENCE), updates, result)
+            rows.append({
+                'tokens': tokens,
+                'protocol': name,
+                'events': events,
+                'bytes': size,
+                'serialize_ms': round(elapsed * 1000, 3),
+            })
+
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{'tokens':>8}  {'protocol':<12}{'events':>8}{'bytes':>14}{'serialize ms':>15}")
+    for row in rows:
+        print(f"{row['tokens']:>8}  {row['protocol']:<12}{row['events']:>8}{row['bytes']:>14}{row['serialize_ms']:>15}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""
+启动耗时：
+    import       python -c "import app.main" 的耗时（中位数），以及导入后是否已经解析了配置文件、
+                 工作目录里是否已经出现日志文件与数据库（导入副作用）；
+                 另附 -X importtime 下 app.main 直接导入的耗时最多的模块
+    cold_start   uvicorn 单进程从启动到第一个请求返回的耗时
+    workers      python -m app.serve --workers N 从启动到所有 worker 打印 Application startup complete 的耗时
+
+指定 --baseline <git 版本> 时会把该版本检出到临时 worktree，用同样的方法测一遍并列出对比。
+
+用法：
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --baseline HEAD~1 --workers 4 --json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+from benchmarks._support import ROOT, free_port, temp_workdir, write_config
+
+IMPORT_SNIPPET = (
+    'import sys, time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t); '
+    "print('yaml' in sys.modules)"
+)
+
+def overrides() -> dict:
+    return {
+        'logging': {'console': False},
+        'metrics': {'loop_lag': {'enabled': False}},
+        'llm': {'provider': 'replay'},
+    }
+
+def env_for(config_path: Path) -> dict:
+    return {**os.environ, 'HELLO_NIHONGO_CONFIG': str(config_path)}
+
+def measure_import(repo: Path, repeat: int) -> dict:
+    wall, in_process = [], []
+    side_effects = {}
+    for index in range(repeat):
+        with temp_workdir() as workdir:
+            config_path = write_config(workdir, overrides())
+            started = time.perf_counter()
+            output = subprocess.run([sys.executable, '-c', IMPORT_SNIPPET], cwd=repo, env=env_for(config_path),
+                                    capture_output=True, text=True, check=True).stdout
+            wall.append(time.perf_counter() - started)
+            elapsed, yaml_loaded = output.strip().splitlines()[-2:]
+            in_process.append(float(elapsed))
+            if index == 0:
+                side_effects = {
+                    'config_parsed': yaml_loaded == 'True',
+                    'log_file_created': (workdir / 'app.log').exists(),
+                    'database_created': (workdir / 'translations.db').exists(),
+                }
+
+    with temp_workdir() as workdir:
+        config_path = write_config(workdir, overrides())
+        stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app.main'], cwd=repo,
+                                env=env_for(config_path), capture_output=True, text=True, check=True).stderr
+    return {
+        'process_ms': round(statistics.median(wall) * 1000, 1),
+        'import_ms': round(statistics.median(in_process) * 1000, 1),
+        **side_effects,
+        'top_imports_ms': top_imports(stderr),
+    }
+
+def top_imports(stderr: str, limit: int = 10) -> dict:
+    """解析 -X importtime 的输出，返回 app.main 直接导入的模块中累计耗时最多的几个"""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, total, name = line.split('|', 2)
+        # app.main 自身没有缩进，它直接导入的模块缩进 2 个空格
+        if name.startswith('   ') and not name.startswith('    '):
+            try:
+                cumulative[name.strip()] = int(total) / 1000
+            except ValueError:
+                continue
+    ordered = sorted(cumulative.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return {name: round(ms, 1) for name, ms in ordered}
+
+def wait_until(predicate, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return False
+
+def port_open(port: int) -> bool:
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+            return True
+    except OSError:
+        return False
+
+def stop(proc: subprocess.Popen):
+    proc.terminate()
+    try:
+        proc.wait(timeout=20)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+def measure_cold_start(repo: Path, repeat: int) -> dict:
+    """uvicorn 在 lifespan 启动完成后才开始监听，端口可连接即启动完成"""
+    ready, first_response = [], []
+    for _ in range(repeat):
+        with temp_workdir() as workdir:
+            config_path = write_config(workdir, overrides())
+            port = free_port()
+            started = time.perf_counter()
+            proc = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'app.main:app', '--port', str(port)],
+                                    cwd=repo, env=env_for(config_path),
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                if not wait_until(lambda: port_open(port), 30):
+                    raise RuntimeError('uvicorn 未能在 30 秒内启动')
+                ready.append(time.perf_counter() - started)
+                httpx.get(f'http://127.0.0.1:{port}/healthz', timeout=10)
+                first_response.append(time.perf_counter() - started)
+            finally:
+                stop(proc)
+    return {
+        'ready_ms': round(statistics.median(ready) * 1000, 1),
+        'first_response_ms': round(statistics.median(first_response) * 1000, 1),
+    }
+
+def measure_workers(repo: Path, workers: int, repeat: int) -> dict:
+    """worker 由 multiprocessing 以 spawn 方式创建，每个 worker 都要重新导入 app.main 并执行 lifespan"""
+    all_ready = []
+    for _ in range(repeat):
+        with temp_workdir() as workdir:
+            config_path = write_config(workdir, overrides())
+            log_path = workdir / 'server.out'
+            started = time.perf_counter()
+            with open(log_path, 'w') as log:
+                proc = subprocess.Popen(
+                    [sys.executable, '-m', 'app.serve', '--host', '127.0.0.1', '--port', str(free_port()),
+                     '--workers', str(workers)],
+                    cwd=repo, env=env_for(config_path), stdout=log, stderr=subprocess.STDOUT,
+                )
+                try:
+                    done = wait_until(
+                        lambda: log_path.read_text(errors='replace').count('Application startup complete') >= workers,
+                        60,
+                    )
+                    if not done:
+                        raise RuntimeError(f'{workers} 个 worker 未能在 60 秒内全部启动')
+                    all_ready.append(time.perf_counter() - started)
+                finally:
+                    stop(proc)
+    return {'workers': workers, 'all_ready_ms': round(statistics.median(all_ready) * 1000, 1)}
+
+def measure(repo: Path, args) -> dict:
+    return {
+        'import': measure_import(repo, args.repeat),
+        'cold_start': measure_cold_start(repo, args.repeat),
+        'workers': measure_workers(repo, args.workers, max(args.repeat // 2, 1)),
+    }
+
+def measure_baseline(revision: str, args) -> dict:
+    path = Path(tempfile.mkdtemp(prefix='hello_nihongo_baseline_'))
+    subprocess.run(['git', 'worktree', 'add', '--detach', str(path), revision], cwd=ROOT,
+                   check=True, capture_output=True)
+    try:
+        return measure(path, args)
+    finally:
+        subprocess.run(['git', 'worktree', 'remove', '--force', str(path)], cwd=ROOT, capture_output=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='每项测量的重复次数，取中位数')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--baseline', help='对比的 git 版本，如 HEAD~1')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    results = {'current': measure(ROOT, args)}
+    if args.baseline:
+        results = {'baseline': measure_baseline(args.baseline, args), **results}
+    if args.json:
+        print(json.dumps({'config': vars(args), 'results': results}, ensure_ascii=False, indent=2))
+        return
+
+    rows = [
+        ('python 进程 + import app.main (ms)', lambda r: r['import']['process_ms']),
+        ('import app.main (ms)', lambda r: r['import']['import_ms']),
+        ('导入时解析配置文件', lambda r: r['import']['config_parsed']),
+        ('导入时创建日志文件', lambda r: r['import']['log_file_created']),
+        ('导入时创建数据库', lambda r: r['import']['database_created']),
+        ('uvicorn 开始监听 (ms)', lambda r: r['cold_start']['ready_ms']),
+        ('uvicorn 第一个响应 (ms)', lambda r: r['cold_start']['first_response_ms']),
+        (f'{args.workers} 个 worker 全部就绪 (ms)', lambda r: r['workers']['all_ready_ms']),
+    ]
+    print(f"{'':<36}" + ''.join(f'{name:>12}' for name in results))
+    for label, pick in rows:
+        print(f'{label:<36}' + ''.join(f'{str(pick(result)):>12}' for result in results.values()))
+    for name, result in results.items():
+        print(f'\n{name} 中 app.main 导入耗时最多的模块 (ms)：')
+        for module, ms in result['import']['top_imports_ms'].items():
+            print(f'  {module:<32}{ms:>10}')
+
+if __name__ == '__main__':
+    main()
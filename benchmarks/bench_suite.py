@@ -0,0 +1,271 @@
+"""
+端到端基准测试套件：启动模拟 DeepSeek、模拟支付宝网关与应用（benchmarks._instrumented），
+预先写入 --records 条记录（1 万 ~ 100 万），然后依次以 --concurrency 个并发客户端压测：
+
+    process         GET /process（protocol=2），每个句子都不同
+    records_page    GET /records 随机页码
+    records_cursor  GET /records 游标翻页
+    records_search  GET /records?query=...
+    records_save    POST /records
+    login           GET /alipay/callback（换 token + 取用户信息 + 建会话）
+
+每个场景输出延迟 p50/p95/p99、吞吐、错误数、事件循环延迟与 RSS，process 额外输出首个事件到达时间（TTFT）。
+结果以 JSON 写入 --output，附带 git 提交号，可以用 --compare 与另一次运行的结果对比。
+
+用法：
+    python -m benchmarks.bench_suite --output before.json
+    python -m benchmarks.bench_suite --records 1000000 --concurrency 50 --output after.json --compare before.json
+    python -m benchmarks.bench_suite --scenarios process,records_search --requests 500
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import subprocess
+from pathlib import Path
+from datetime import datetime
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+from Crypto.PublicKey import RSA
+
+from benchmarks._support import (
+    ROOT, run_fake_deepseek, run_mock_alipay, run_app, temp_workdir, seed_records, seed_session, summarize
+)
+
+SCENARIOS = ['process', 'records_page', 'records_cursor', 'records_search', 'records_save', 'login']
+QUERIES = ['公园散步', '第12345句', '〜ましょう', 'こうえん', '语法点 42', '不存在的内容']
+
+class Scenario:
+    """一个场景的请求逻辑；run() 发出一次请求，返回 TTFT（秒，仅流式接口）或 None，失败时抛出异常"""
+
+    def __init__(self, args, stamp: int):
+        self.args = args
+        self.stamp = stamp
+        self.rng = random.Random(args.seed)
+
+    async def run(self, client: httpx.AsyncClient, index: int, state: dict) -> float | None:
+        raise NotImplementedError
+
+class Process(Scenario):
+    async def run(self, client, index, state):
+        started = time.perf_counter()
+        ttft = None
+        params = {'sentence': f'套件 {self.stamp} {index}', 'protocol': 2}
+        async with client.stream('GET', '/process', params=params) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith('data:'):
+                    continue
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+                event = json.loads(line[5:])
+                if event.get('type') == 'error':
+                    raise RuntimeError(event['error'])
+        return ttft
+
+class RecordsPage(Scenario):
+    async def run(self, client, index, state):
+        pages = max(min(self.args.records // 5, 2000), 1)
+        response = await client.get('/records', params={'page': self.rng.randint(1, pages)})
+        response.raise_for_status()
+
+class RecordsCursor(Scenario):
+    async def run(self, client, index, state):
+        # 每个客户端沿着自己的游标往后翻，翻满 50 页后从头开始
+        cursor = state.get('cursor', '') if state.get('pages', 0) < 50 else ''
+        response = await client.get('/records', params={'cursor': cursor})
+        response.raise_for_status()
+        state['cursor'] = response.json().get('next_cursor') or ''
+        state['pages'] = state.get('pages', 0) + 1 if cursor else 1
+
+class RecordsSearch(Scenario):
+    async def run(self, client, index, state):
+        response = await client.get('/records', params={'query': self.rng.choice(QUERIES)})
+        response.raise_for_status()
+
+class RecordsSave(Scenario):
+    async def run(self, client, index, state):
+        response = await client.post('/records', json={
+            'original': f'套件保存 {self.stamp} {index}', 'translated': '保存のテスト', 'furigana': 'ほぞんのてすと',
+            'grammar': '- 基准测试写入'
+        })
+        response.raise_for_status()
+
+class Login(Scenario):
+    async def run(self, client, index, state):
+        response = await client.get('/alipay/callback', params={'auth_code': f'code{self.stamp}{index}'},
+                                    cookies={})
+        if response.status_code != 303 or 'session_id=' not in response.headers.get('set-cookie', ''):
+            raise RuntimeError(f'HTTP {response.status_code}')
+
+SCENARIO_CLASSES = {
+    'process': Process,
+    'records_page': RecordsPage,
+    'records_cursor': RecordsCursor,
+    'records_search': RecordsSearch,
+    'records_save': RecordsSave,
+    'login': Login,
+}
+
+async def runtime(client: httpx.AsyncClient, reset: bool = False) -> dict:
+    return (await client.get('/__bench/runtime', params={'reset': reset})).json()
+
+async def run_scenario(base_url: str, session_id: str, scenario: Scenario, total: int, concurrency: int) -> dict:
+    latencies, ttfts = [], []
+    errors: dict[str, int] = {}
+    queue = asyncio.Queue()
+    for index in range(total):
+        queue.put_nowait(index)
+
+    async def worker(client: httpx.AsyncClient):
+        state = {}
+        while not queue.empty():
+            index = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                ttft = await scenario.run(client, index, state)
+            except Exception as e:
+                name = type(e).__name__ if isinstance(e, httpx.HTTPError) else str(e)
+                errors[name] = errors.get(name, 0) + 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            if ttft is not None:
+                ttfts.append(ttft)
+
+    limits = httpx.Limits(max_connections=concurrency + 1, max_keepalive_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=base_url, cookies={'session_id': session_id},
+                                 timeout=120, limits=limits) as client:
+        await runtime(client, reset=True)
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        server = await runtime(client, reset=True)
+
+    result = {
+        'requests': total,
+        'succeeded': len(latencies),
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'latency': summarize(latencies),
+        'loop_lag': {key[len('loop_lag_'):]: value for key, value in server.items() if key.startswith('loop_lag_')},
+        'rss_mb': server['rss_mb'],
+        'max_rss_mb': server['max_rss_mb'],
+    }
+    if ttfts:
+        result['ttft'] = summarize(ttfts)
+    return result
+
+def git_revision() -> dict:
+    def git(*args) -> str:
+        try:
+            return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True, timeout=30).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ''
+    return {'commit': git('rev-parse', '--short', 'HEAD'), 'dirty': bool(git('status', '--porcelain', '--', 'app'))}
+
+async def run(args) -> dict:
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(names) - set(SCENARIO_CLASSES)
+    if unknown:
+        raise SystemExit(f'未知场景：{", ".join(sorted(unknown))}')
+
+    # 每次运行生成一对临时密钥，应用用私钥签名（模拟网关不验签）
+    key = RSA.generate(2048)
+    stamp = int(time.time())
+    results = {}
+    with temp_workdir() as workdir, \
+            run_fake_deepseek(args.tokens, args.delay_ms) as upstream, \
+            run_mock_alipay(args.alipay_delay_ms) as gateway:
+        overrides = {
+            'cache': {'enabled': False},
+            'singleflight': {'enabled': False},
+            'deepseek': {'base_url': upstream, 'api_key': 'bench', 'pool': {'http2': False}},
+            'alipay': {
+                'api_gateway': gateway,
+                'app_private_key': key.export_key().decode(),
+                'alipay_public_key': key.publickey().export_key().decode(),
+            },
+        }
+        with run_app(workdir, overrides, app='benchmarks._instrumented:app') as base_url:
+            db_path = workdir / 'translations.db'
+            started = time.perf_counter()
+            seed_records(db_path, args.records)
+            seed_seconds = time.perf_counter() - started
+            session_id = seed_session(db_path)
+
+            async with httpx.AsyncClient(base_url=base_url) as client:
+                idle = await runtime(client, reset=True)
+            for name in names:
+                scenario = SCENARIO_CLASSES[name](args, stamp)
+                results[name] = await run_scenario(base_url, session_id, scenario, args.requests, args.concurrency)
+                print(f'[bench_suite] {name} 完成', file=sys.stderr)
+
+    return {
+        'meta': {
+            **git_revision(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'config': vars(args),
+        'setup': {'seed_seconds': round(seed_seconds, 1), 'idle_rss_mb': idle['rss_mb']},
+        'scenarios': results,
+    }
+
+def print_table(result: dict, baseline: dict | None):
+    meta = result['meta']
+    print(f"commit={meta['commit']}{' (dirty)' if meta['dirty'] else ''} records={result['config']['records']} "
+          f"concurrency={result['config']['concurrency']} idle_rss={result['setup']['idle_rss_mb']}MB")
+    header = f"{'scenario':<16}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ttft p50':>10}" \
+             f"{'lag p99':>9}{'rss MB':>8}{'errors':>8}"
+    if baseline:
+        header += f"{'p99 vs base':>13}{'rps vs base':>13}"
+    print(header)
+    for name, item in result['scenarios'].items():
+        line = (f"{name:<16}{item['throughput_rps']:>9}{item['latency']['p50_ms']:>10}{item['latency']['p95_ms']:>10}"
+                f"{item['latency']['p99_ms']:>10}{item.get('ttft', {}).get('p50_ms', '-'):>10}"
+                f"{item['loop_lag']['p99_ms']:>9}{item['rss_mb']:>8}{sum(item['errors'].values()):>8}")
+        base = (baseline or {}).get('scenarios', {}).get(name)
+        if base:
+            p99 = item['latency']['p99_ms'] / base['latency']['p99_ms'] if base['latency']['p99_ms'] else 0
+            rps = item['throughput_rps'] / base['throughput_rps'] if base['throughput_rps'] else 0
+            line += f"{p99:>12.2f}x{rps:>12.2f}x"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=100_000, help='预先写入的记录数')
+    parser.add_argument('--requests', type=int, default=1000, help='每个场景的请求数')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='逗号分隔的场景列表')
+    parser.add_argument('--tokens', type=int, default=200, help='模拟 DeepSeek 每个回答的 delta 数')
+    parser.add_argument('--delay-ms', type=float, default=5, help='模拟 DeepSeek 相邻 delta 之间的间隔')
+    parser.add_argument('--alipay-delay-ms', type=float, default=50, help='模拟支付宝网关每个请求的延迟')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='把 JSON 结果写入该文件')
+    parser.add_argument('--compare', help='与之前某次运行的 JSON 结果对比')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_table(result, baseline)
+
+if __name__ == '__main__':
+    main()
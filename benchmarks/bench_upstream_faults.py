@@ -0,0 +1,169 @@
+"""
+上游故障下的表现：用 fake_deepseek 注入 503、首 token 前挂起、中途断开，
+对比不同重试/对冲配置下 /process 的成功率与延迟，以及上游完全不可用时熔断的效果。
+
+场景：
+    baseline      无故障
+    flaky         按 --fail-rate / --drop-rate 注入 503 与中途断开，分别测 retry=0 与 retry=2
+    stall         按 --stall-rate 注入首 token 前挂起，分别测不对冲与对冲
+    outage        先正常翻译一批句子写入缓存，缓存过期后停掉上游：
+                  统计熔断前后单个请求的耗时，以及熔断期间用过期缓存应答的比例
+
+用法：
+    python -m benchmarks.bench_upstream_faults
+    python -m benchmarks.bench_upstream_faults --requests 100 --fail-rate 0.3 --stall-rate 0.1 --json
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+from benchmarks._support import run_fake_deepseek, run_app, temp_workdir, free_port, seed_session, summarize
+
+async def fire(base_url: str, session_id: str, sentences: list[str], concurrency: int) -> dict:
+    """并发请求 /process（protocol=2），统计成功率与完整耗时"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, failed_latencies = [], []
+    errors: dict[str, int] = {}
+
+    async def one(client: httpx.AsyncClient, sentence: str):
+        async with semaphore:
+            started = time.perf_counter()
+            error = None
+            try:
+                async with client.stream('GET', '/process', params={'sentence': sentence, 'protocol': 2}) as response:
+                    async for line in response.aiter_lines():
+                        if line.startswith('data:'):
+                            event = json.loads(line[5:])
+                            if event.get('type') == 'error':
+                                error = event['error']
+            except httpx.HTTPError as e:
+                error = type(e).__name__
+            elapsed = time.perf_counter() - started
+            if error:
+                failed_latencies.append(elapsed)
+                errors[error] = errors.get(error, 0) + 1
+            else:
+                latencies.append(elapsed)
+
+    async with httpx.AsyncClient(base_url=base_url, cookies={'session_id': session_id}, timeout=120) as client:
+        await asyncio.gather(*(one(client, sentence) for sentence in sentences))
+    return {
+        'requests': len(sentences),
+        'success_rate': round(len(latencies) / len(sentences), 4),
+        'latency': summarize(latencies),
+        'failed_latency': summarize(failed_latencies),
+        'errors': errors,
+    }
+
+async def upstream_stats(base_url: str) -> dict:
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        return (await client.get('/stats/upstream')).json()
+
+def app_overrides(upstream: str, args, retry: int, hedge: bool) -> dict:
+    return {
+        'cache': {'enabled': False},
+        'singleflight': {'enabled': False},
+        'deepseek': {
+            'base_url': upstream, 'api_key': 'bench', 'pool': {'http2': False},
+            'timeouts': {'connect': 1, 'first_token': args.first_token_timeout, 'idle': 2},
+            'retry': {'attempts': retry, 'backoff': 0.1, 'max_backoff': 0.5},
+            'hedge': {'enabled': hedge, 'delay': args.hedge_delay},
+            # 故障率场景只看重试，不让熔断打断
+            'circuit_breaker': {'failure_threshold': 10 ** 6},
+        },
+    }
+
+async def scenario(args, name: str, fake_args: list[str], retry: int, hedge: bool) -> dict:
+    stamp = int(time.time() * 1000)
+    sentences = [f'{name} {stamp} {i}' for i in range(args.requests)]
+    with temp_workdir() as workdir, \
+            run_fake_deepseek(args.tokens, args.delay_ms, [*fake_args, '--seed', str(args.seed)]) as upstream:
+        with run_app(workdir, app_overrides(upstream, args, retry, hedge)) as base_url:
+            session_id = seed_session(workdir / 'translations.db')
+            result = await fire(base_url, session_id, sentences, args.concurrency)
+            stats = await upstream_stats(base_url)
+    result['upstream'] = {key: stats[key] for key in ('requests', 'retries', 'hedged', 'hedge_wins', 'failures')}
+    return result
+
+async def outage(args) -> dict:
+    """上游先正常后宕机：熔断打开后请求应立即失败，有过期缓存的句子仍能得到结果"""
+    port = free_port()
+    overrides = app_overrides(f'http://127.0.0.1:{port}', args, retry=2, hedge=False)
+    overrides['cache'] = {'enabled': True, 'ttl': 1}
+    overrides['deepseek']['circuit_breaker'] = {'failure_threshold': 5, 'recovery_timeout': 60}
+    stamp = int(time.time() * 1000)
+    cached = [f'outage-cached {stamp} {i}' for i in range(args.requests)]
+    fresh = [f'outage-new {stamp} {i}' for i in range(args.requests)]
+
+    with temp_workdir() as workdir, run_app(workdir, overrides) as base_url:
+        session_id = seed_session(workdir / 'translations.db')
+        with run_fake_deepseek(args.tokens, args.delay_ms, port=port):
+            warm = await fire(base_url, session_id, cached, args.concurrency)
+        # 上游已停止，等缓存过期
+        await asyncio.sleep(1.5)
+        # 逐个请求，观察熔断前后的耗时变化
+        before_open = await fire(base_url, session_id, fresh[:5], 1)
+        after_open = await fire(base_url, session_id, fresh[5:], args.concurrency)
+        stale = await fire(base_url, session_id, cached, args.concurrency)
+        stats = await upstream_stats(base_url)
+    return {
+        'warm_success_rate': warm['success_rate'],
+        'until_open': before_open,
+        'open_new_sentences': after_open,
+        'open_cached_sentences': stale,
+        'upstream': stats,
+    }
+
+async def run(args) -> dict:
+    faults = ['--fail-rate', str(args.fail_rate), '--drop-rate', str(args.drop_rate)]
+    stall = ['--stall-rate', str(args.stall_rate)]
+    return {
+        'config': vars(args),
+        'baseline': await scenario(args, 'baseline', [], retry=2, hedge=False),
+        'flaky_no_retry': await scenario(args, 'flaky0', faults, retry=0, hedge=False),
+        'flaky_retry': await scenario(args, 'flaky2', faults, retry=2, hedge=False),
+        'stall_no_hedge': await scenario(args, 'stall0', stall, retry=2, hedge=False),
+        'stall_hedge': await scenario(args, 'stall1', stall, retry=2, hedge=True),
+        'outage': await outage(args),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=60, help='每个场景的请求数')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--tokens', type=int, default=100)
+    parser.add_argument('--delay-ms', type=float, default=2)
+    parser.add_argument('--fail-rate', type=float, default=0.3)
+    parser.add_argument('--drop-rate', type=float, default=0.05)
+    parser.add_argument('--stall-rate', type=float, default=0.1)
+    parser.add_argument('--first-token-timeout', type=float, default=3)
+    parser.add_argument('--hedge-delay', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{'scenario':<18}{'success':>9}{'p50 ms':>10}{'p99 ms':>10}{'upstream':>10}{'retries':>9}{'hedged':>8}")
+    for name in ('baseline', 'flaky_no_retry', 'flaky_retry', 'stall_no_hedge', 'stall_hedge'):
+        item = result[name]
+        print(f"{name:<18}{item['success_rate']:>9.2%}{item['latency']['p50_ms']:>10}{item['latency']['p99_ms']:>10}"
+              f"{item['upstream']['requests']:>10}{item['upstream']['retries']:>9}{item['upstream']['hedged']:>8}")
+    outage_result = result['outage']
+    print(f"outage: 熔断前失败请求 p50 {outage_result['until_open']['failed_latency']['p50_ms']} ms，"
+          f"熔断后新句子 p50 {outage_result['open_new_sentences']['failed_latency']['p50_ms']} ms，"
+          f"过期缓存应答率 {outage_result['open_cached_sentences']['success_rate']:.2%}，"
+          f"breaker={outage_result['upstream']['circuit_breaker']}")
+
+if __name__ == '__main__':
+    main()
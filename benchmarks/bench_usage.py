@@ -0,0 +1,164 @@
+"""
+按用户的用量统计与额度（回放后端，不访问网络）：
+    overhead     同一个用户连续打开 --streams 个不重复句子的 /process 流，对比关闭与开启用量统计/额度检查时的吞吐
+    daily_quota  每日额度设为 --quota 个 token，逐个发送请求直到被拒绝，核对被拒绝的请求没有到达上游
+    rate_limit   每秒 1 个请求、突发 5 个，同时发送 --burst-requests 个请求，统计放行与拒绝的数量
+
+上游请求数取自 /stats/upstream 的 requests，被拒绝的请求不应计入。
+
+用法：
+    python -m benchmarks.bench_usage
+    python -m benchmarks.bench_usage --streams 2000 --json
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+from benchmarks._support import run_app, temp_workdir, seed_session
+
+def overrides(usage: dict) -> dict:
+    return {
+        'cache': {'enabled': False},
+        'singleflight': {'enabled': False},
+        'llm': {'provider': 'replay', 'replay': {'tokens_per_second': 0, 'first_token_delay': 0}},
+        'usage': {'flush_interval': 1, **usage},
+    }
+
+async def process(client: httpx.AsyncClient, sentence: str) -> str | None:
+    """读完一个 /process 流，返回错误信息，成功时返回 None"""
+    async with client.stream('GET', '/process', params={'sentence': sentence, 'protocol': 2}) as response:
+        async for line in response.aiter_lines():
+            if not line.startswith('data:'):
+                continue
+            event = json.loads(line[5:])
+            if event.get('type') == 'error':
+                return event['error']
+            if event.get('type') == 'done':
+                return None
+    return '流意外结束'
+
+def client_for(base_url: str, session_id: str, connections: int = 32) -> httpx.AsyncClient:
+    return httpx.AsyncClient(base_url=base_url, cookies={'session_id': session_id}, timeout=120,
+                             limits=httpx.Limits(max_connections=connections))
+
+async def upstream_requests(client: httpx.AsyncClient) -> int:
+    return (await client.get('/stats/upstream')).json()['requests']
+
+async def throughput(usage: dict, args) -> dict:
+    stamp = time.time()
+    with temp_workdir() as workdir, run_app(workdir, overrides(usage)) as base_url:
+        session_id = seed_session(workdir / 'translations.db')
+        async with client_for(base_url, session_id, args.concurrency) as client:
+            queue = asyncio.Queue()
+            for index in range(args.streams):
+                queue.put_nowait(index)
+            errors = 0
+
+            async def worker():
+                nonlocal errors
+                while not queue.empty():
+                    if await process(client, f'用量 {stamp} {queue.get_nowait()}'):
+                        errors += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+            # 等后台任务写入数据库后再读取
+            await asyncio.sleep(1.5)
+            used = (await client.get('/usage')).json()['today']
+            tracker = (await client.get('/stats/usage')).json()
+    return {
+        'streams_per_s': round(args.streams / elapsed, 1),
+        'errors': errors,
+        'recorded_requests': used['requests'],
+        'recorded_tokens': used['total_tokens'],
+        'flushes': tracker['flushes'],
+    }
+
+async def daily_quota(args) -> dict:
+    usage = {'daily_token_quota': args.quota, 'rate_limit': {'per_second': 0}}
+    with temp_workdir() as workdir, run_app(workdir, overrides(usage)) as base_url:
+        session_id = seed_session(workdir / 'translations.db')
+        async with client_for(base_url, session_id) as client:
+            accepted = 0
+            rejected_with = None
+            for index in range(10000):
+                error = await process(client, f'额度 {index}')
+                if error:
+                    rejected_with = error
+                    break
+                accepted += 1
+            # 额度用完后再发几次，都应在连接上游前被拒绝
+            extra_rejected = sum([1 for index in range(10) if await process(client, f'额度后 {index}')])
+            used = (await client.get('/usage')).json()
+            upstream = await upstream_requests(client)
+    return {
+        'quota': args.quota,
+        'accepted': accepted,
+        'rejected_with': rejected_with,
+        'extra_rejected': extra_rejected,
+        'used_tokens': used['today']['total_tokens'],
+        'upstream_requests': upstream,
+    }
+
+async def rate_limit(args) -> dict:
+    usage = {'daily_token_quota': 0, 'rate_limit': {'per_second': 1, 'burst': 5}}
+    with temp_workdir() as workdir, run_app(workdir, overrides(usage)) as base_url:
+        session_id = seed_session(workdir / 'translations.db')
+        async with client_for(base_url, session_id, args.burst_requests) as client:
+            results = await asyncio.gather(*(process(client, f'限流 {index}') for index in range(args.burst_requests)))
+            upstream = await upstream_requests(client)
+    return {
+        'requests': args.burst_requests,
+        'accepted': sum(1 for result in results if result is None),
+        'rejected': sum(1 for result in results if result is not None),
+        'upstream_requests': upstream,
+    }
+
+async def run(args) -> dict:
+    unlimited = {'daily_token_quota': 0, 'rate_limit': {'per_second': 0}}
+    # 额度与频率都设得足够大，只衡量计数与检查本身的开销
+    generous = {'daily_token_quota': 10 ** 12, 'rate_limit': {'per_second': 10 ** 6, 'burst': 10 ** 6}}
+    return {
+        'config': vars(args),
+        'overhead': {
+            'unlimited': await throughput(unlimited, args),
+            'quota_checked': await throughput(generous, args),
+        },
+        'daily_quota': await daily_quota(args),
+        'rate_limit': await rate_limit(args),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--streams', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--quota', type=int, default=3000, help='daily_quota 场景的每日 token 额度')
+    parser.add_argument('--burst-requests', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    for name, item in result['overhead'].items():
+        print(f"{name:<14} {item['streams_per_s']:>8} streams/s  errors={item['errors']}  "
+              f"记录 {item['recorded_requests']} 次请求 / {item['recorded_tokens']} tokens，写入 {item['flushes']} 批")
+    quota = result['daily_quota']
+    print(f"daily_quota    额度 {quota['quota']} tokens：放行 {quota['accepted']} 个后拒绝（{quota['rejected_with']}），"
+          f"实际用量 {quota['used_tokens']}，之后 {quota['extra_rejected']}/10 被拒绝，上游请求 {quota['upstream_requests']} 次")
+    limited = result['rate_limit']
+    print(f"rate_limit     同时 {limited['requests']} 个请求：放行 {limited['accepted']}，拒绝 {limited['rejected']}，"
+          f"上游请求 {limited['upstream_requests']} 次")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+多 worker 的扩展性与优雅关闭：用 python -m app.serve 分别以 --workers 指定的进程数启动应用（回放后端，不访问网络），
+测量 /process 与 GET /records 的吞吐；最后在流进行到一半时向主进程发送 SIGTERM，
+统计有多少个进行中的 SSE 流完整结束、关闭用了多久。
+
+吞吐能否随 worker 数增长取决于机器的 CPU 核数，结果中附带 cpu_count。
+
+用法：
+    python -m benchmarks.bench_workers
+    python -m benchmarks.bench_workers --workers 1,2,4,8 --streams 400 --json
+"""
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+from benchmarks._support import run_serve, temp_workdir, seed_records, seed_session, summarize
+
+def overrides(tokens_per_second: float) -> dict:
+    return {
+        'cache': {'enabled': False},
+        'singleflight': {'enabled': False},
+        'logging': {'console': False},
+        'llm': {'provider': 'replay', 'replay': {'tokens_per_second': tokens_per_second, 'first_token_delay': 0.05}},
+    }
+
+async def read_stream(client: httpx.AsyncClient, sentence: str) -> bool:
+    """读完一个 /process 流，收到 done 事件返回 True"""
+    async with client.stream('GET', '/process', params={'sentence': sentence, 'protocol': 2}) as response:
+        async for line in response.aiter_lines():
+            if line.startswith('data:') and '"type": "done"' in line:
+                return True
+    return False
+
+async def throughput(base_url: str, session_id: str, args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    stamp = time.time()
+
+    async def drive(total: int, request) -> dict:
+        latencies = []
+        queue = asyncio.Queue()
+        for index in range(total):
+            queue.put_nowait(index)
+
+        async def worker(client):
+            while not queue.empty():
+                index = queue.get_nowait()
+                started = time.perf_counter()
+                await request(client, index)
+                latencies.append(time.perf_counter() - started)
+
+        async with httpx.AsyncClient(base_url=base_url, cookies={'session_id': session_id},
+                                     timeout=120, limits=limits) as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+        return {'rps': round(total / elapsed, 1), 'latency': summarize(latencies)}
+
+    async def process(client, index):
+        await read_stream(client, f'扩展 {stamp} {index}')
+
+    async def records(client, index):
+        (await client.get('/records', params={'page': index % 50 + 1})).raise_for_status()
+
+    return {
+        'process': await drive(args.streams, process),
+        'records': await drive(args.requests, records),
+    }
+
+async def drain(args) -> dict:
+    """慢速回放，流进行到一半时发送 SIGTERM"""
+    workers = max(int(value) for value in args.workers.split(','))
+    with temp_workdir() as workdir, run_serve(workdir, overrides(args.drain_tps), workers,
+                                              graceful_timeout=args.graceful_timeout) as (base_url, proc):
+        session_id = seed_session(workdir / 'translations.db')
+        async with httpx.AsyncClient(base_url=base_url, cookies={'session_id': session_id}, timeout=120,
+                                     limits=httpx.Limits(max_connections=None)) as client:
+            tasks = [asyncio.create_task(read_stream(client, f'关闭 {index}')) for index in range(args.drain_streams)]
+            await asyncio.sleep(1)
+            started = time.perf_counter()
+            proc.send_signal(signal.SIGTERM)
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            streams_done = time.perf_counter() - started
+            while proc.poll() is None and time.perf_counter() - started < args.graceful_timeout + 10:
+                await asyncio.sleep(0.05)
+            exited = time.perf_counter() - started
+    return {
+        'workers': workers,
+        'streams': args.drain_streams,
+        'completed': sum(1 for result in results if result is True),
+        'truncated': sum(1 for result in results if result is not True),
+        'streams_finished_after_s': round(streams_done, 3),
+        'process_exited_after_s': round(exited, 3),
+    }
+
+async def run(args) -> dict:
+    results = {}
+    for workers in (int(value) for value in args.workers.split(',')):
+        with temp_workdir() as workdir, run_serve(workdir, overrides(0), workers) as (base_url, proc):
+            db_path = workdir / 'translations.db'
+            seed_records(db_path, args.records)
+            session_id = seed_session(db_path)
+            # 等所有 worker 都完成启动
+            await asyncio.sleep(1 + workers * 0.5)
+            results[workers] = await throughput(base_url, session_id, args)
+        print(f'[bench_workers] workers={workers} 完成', file=sys.stderr)
+    return {'config': vars(args), 'cpu_count': os.cpu_count(), 'throughput': results, 'drain': await drain(args)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default='1,2,4', help='逗号分隔的 worker 数')
+    parser.add_argument('--streams', type=int, default=300, help='每种配置的 /process 请求数')
+    parser.add_argument('--requests', type=int, default=1000, help='每种配置的 GET /records 请求数')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--drain-streams', type=int, default=50)
+    parser.add_argument('--drain-tps', type=float, default=20, help='关闭测试中每个流的回放速率')
+    parser.add_argument('--graceful-timeout', type=int, default=30)
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    print(f"cpu_count={result['cpu_count']}")
+    print(f"{'workers':<9}{'process rps':>13}{'p99 ms':>10}{'records rps':>13}{'p99 ms':>10}")
+    for workers, item in result['throughput'].items():
+        print(f"{workers:<9}{item['process']['rps']:>13}{item['process']['latency']['p99_ms']:>10}"
+              f"{item['records']['rps']:>13}{item['records']['latency']['p99_ms']:>10}")
+    drained = result['drain']
+    print(f"drain: workers={drained['workers']} {drained['completed']}/{drained['streams']} 个流完整结束，"
+          f"{drained['streams_finished_after_s']}s 后全部结束，主进程 {drained['process_exited_after_s']}s 后退出")
+
+if __name__ == '__main__':
+    main()
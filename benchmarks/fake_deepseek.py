@@ -0,0 +1,104 @@
+"""
+本地模拟的 DeepSeek 流式接口，用于压测与基准测试，不消耗真实 token。
+
+可以注入故障来验证超时、重试、对冲与熔断：
+    --first-token-delay-ms  首个 token 之前的额外延迟
+    --fail-rate             直接返回 503 的概率
+    --stall-rate            在首个 token 之前一直挂起的概率
+    --drop-rate             输出一半后断开连接的概率
+
+用法：
+    python -m benchmarks.fake_deepseek --port 9001 --tokens 200 --delay-ms 5
+    python -m benchmarks.fake_deepseek --fail-rate 0.2 --stall-rate 0.1 --first-token-delay-ms 300
+"""
+import json
+import random
+import asyncio
+import argparse
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import StreamingResponse, JSONResponse
+from starlette.routing import Route
+
+GRAMMAR_LINE = '- 「は」是提示主题的助词，「が」表示主语；动词「行きます」为ます形。\n'
+
+def build_answer(tokens: int) -> list[str]:
+    """生成符合系统提示词格式的回答，并按 2~3 个字符切分成约 tokens 个 delta"""
+    text = '1. 翻译结果: 今日はいい天気ですね。\n2. 平假名注释: きょうはいいてんきですね。\n3. 语法解析: \n'
+    while len(text) < tokens * 2.5:
+        text += GRAMMAR_LINE
+    chunks = []
+    pos = 0
+    while pos < len(text):
+        size = 2 + (len(chunks) % 2)
+        chunks.append(text[pos:pos + size])
+        pos += size
+    return chunks
+
+def create_app(tokens: int = 200, delay_ms: float = 5, first_token_delay_ms: float = 0,
+               fail_rate: float = 0.0, stall_rate: float = 0.0, drop_rate: float = 0.0,
+               seed: int | None = None) -> Starlette:
+    chunks = build_answer(tokens)
+    rng = random.Random(seed)
+    stats = {'requests': 0, 'failed': 0, 'stalled': 0, 'dropped': 0}
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats['requests'] += 1
+        if rng.random() < fail_rate:
+            stats['failed'] += 1
+            return JSONResponse({'error': {'message': 'Service Unavailable'}}, status_code=503)
+        stall = rng.random() < stall_rate
+        drop_at = len(chunks) // 2 if rng.random() < drop_rate else None
+
+        async def stream():
+            if stall:
+                stats['stalled'] += 1
+                await asyncio.sleep(3600)
+            if first_token_delay_ms:
+                await asyncio.sleep(first_token_delay_ms / 1000)
+            for index, chunk in enumerate(chunks):
+                if index == drop_at:
+                    stats['dropped'] += 1
+                    # 抛出异常让服务器直接断开连接，模拟上游中途掉线
+                    raise ConnectionAbortedError('injected drop')
+                if delay_ms:
+                    await asyncio.sleep(delay_ms / 1000)
+                data = {'choices': [{'index': 0, 'delta': {'content': chunk}}]}
+                yield f'data: {json.dumps(data, ensure_ascii=False)}\n\n'
+            if (body.get('stream_options') or {}).get('include_usage'):
+                prompt_tokens = sum(len(message['content']) for message in body.get('messages', []))
+                usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': len(chunks),
+                         'total_tokens': prompt_tokens + len(chunks)}
+                yield f'data: {json.dumps({"choices": [], "usage": usage})}\n\n'
+            yield 'data: [DONE]\n\n'
+
+        return StreamingResponse(stream(), media_type='text/event-stream')
+
+    async def fault_stats(request: Request):
+        return JSONResponse(stats)
+
+    return Starlette(routes=[
+        Route('/chat/completions', chat_completions, methods=['POST']),
+        Route('/stats', fault_stats),
+    ])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9001)
+    parser.add_argument('--tokens', type=int, default=200, help='每个回答的 delta 数')
+    parser.add_argument('--delay-ms', type=float, default=5, help='相邻 delta 之间的间隔')
+    parser.add_argument('--first-token-delay-ms', type=float, default=0, help='首个 delta 之前的额外延迟')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='返回 503 的概率')
+    parser.add_argument('--stall-rate', type=float, default=0.0, help='首个 delta 之前挂起的概率')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='中途断开连接的概率')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    app = create_app(args.tokens, args.delay_ms, args.first_token_delay_ms,
+                     args.fail_rate, args.stall_rate, args.drop_rate, args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
+
+if __name__ == '__main__':
+    main()
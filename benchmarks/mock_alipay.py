@@ -0,0 +1,53 @@
+"""
+本地模拟的支付宝开放平台网关，只实现登录用到的两个接口，用于基准测试。
+
+用法：
+    python -m benchmarks.mock_alipay --port 9002 --delay-ms 50 --fail-rate 0.05
+"""
+import random
+import asyncio
+import argparse
+from urllib.parse import parse_qsl
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+def create_app(delay_ms: float = 50, fail_rate: float = 0.0) -> Starlette:
+    async def gateway(request: Request):
+        # 直接解析表单，不依赖 python-multipart
+        form = dict(parse_qsl((await request.body()).decode('utf-8')))
+        if delay_ms:
+            await asyncio.sleep(delay_ms / 1000)
+        # 模拟网关偶发的 503，验证客户端重试
+        if fail_rate and random.random() < fail_rate:
+            return JSONResponse({'error': 'service unavailable'}, status_code=503)
+
+        method = form.get('method')
+        if method == 'alipay.system.oauth.token':
+            code = form.get('code', '')
+            return JSONResponse({'alipay_system_oauth_token_response': {
+                'access_token': f'token-{code}', 'user_id': code, 'expires_in': 1296000,
+            }})
+        if method == 'alipay.user.info.share':
+            token = form.get('auth_token', '')
+            user = token.removeprefix('token-')
+            return JSONResponse({'alipay_user_info_share_response': {
+                'code': '10000', 'open_id': f'open-{user}', 'avatar': '', 'nick_name': f'用户{user}',
+            }})
+        return JSONResponse({'error_response': {'code': '40004', 'msg': f'unknown method {method}'}})
+
+    return Starlette(routes=[Route('/gateway.do', gateway, methods=['POST'])])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9002)
+    parser.add_argument('--delay-ms', type=float, default=50, help='每个请求的处理延迟')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='返回 503 的概率')
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.delay_ms, args.fail_rate), host=args.host, port=args.port, log_level='warning')
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,9 @@
 
 # 启动脚本: run.sh
 # 用于在服务器上启动或停止 hello_nihongo 项目
+#   start  生产模式：python -m app.serve（多 worker，按 config.yaml 的 server 段配置）
+#   dev    开发模式：单进程 uvicorn --reload
+#   stop   发送 SIGTERM，等待进行中的请求结束后退出
 
 # 设置项目目录
 PROJECT_DIR=$(cd "$(dirname "$0")"; pwd)
@@ -23,7 +26,11 @@ start() {
     source venv/bin/activate
 
     # 启动 FastAPI 服务
-    uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload > $LOG_FILE 2>&1 &
+    if [ "$1" = "dev" ]; then
+        uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload > $LOG_FILE 2>&1 &
+    else
+        python -m app.serve > $LOG_FILE 2>&1 &
+    fi
 
     # 获取进程 ID 并保存到文件
     echo $! > "$PID_FILE"
@@ -35,8 +42,17 @@ stop() {
     if [ -f "$PID_FILE" ]; then
         PID=$(cat "$PID_FILE")
         if kill -0 "$PID" 2>/dev/null; then
-            echo "停止服务器 (PID: $PID)..."
-            kill "$PID"
+            echo "停止服务器 (PID: $PID)，等待进行中的请求结束..."
+            kill -TERM "$PID"
+            # 最多等待 graceful_timeout（默认 30 秒）再多留 10 秒
+            for _ in $(seq 40); do
+                kill -0 "$PID" 2>/dev/null || break
+                sleep 1
+            done
+            if kill -0 "$PID" 2>/dev/null; then
+                echo "进程仍未退出，强制结束。"
+                kill -KILL "$PID"
+            fi
             rm -f "$PID_FILE"
             echo "服务器已停止。"
         else
@@ -52,11 +68,14 @@ case "$1" in
     start)
         start
         ;;
+    dev)
+        start dev
+        ;;
     stop)
         stop
         ;;
     *)
-        echo "用法: $0 {start|stop}"
+        echo "用法: $0 {start|dev|stop}"
         exit 1
         ;;
 esac
\ No newline at end of file
@@ -0,0 +1,89 @@
+import asyncio
+from app.services.cache import TranslationCache
+
+VALUE = {'translated': '翻訳', 'furigana': 'ほんやく', 'grammar': ''}
+
+def make_cache(tmp_path, **kwargs) -> TranslationCache:
+    return TranslationCache('test', sqlite_path=str(tmp_path / 'cache.db'), **kwargs)
+
+def test_memory_hit_and_miss(tmp_path):
+    cache = make_cache(tmp_path)
+
+    async def run():
+        assert await cache.get('翻译') is None
+        await cache.set('翻译', VALUE)
+        assert await cache.get(' 翻译 ') == VALUE
+
+    asyncio.run(run())
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+    cache.close()
+
+def test_fresh_sqlite_row_is_promoted(tmp_path):
+    cache = make_cache(tmp_path)
+
+    async def run():
+        await cache.set('翻译', VALUE)
+        cache._entries.clear()
+        assert await cache.get('翻译') == VALUE
+        assert await cache.get('翻译') == VALUE
+
+    asyncio.run(run())
+    stats = cache.stats()
+    assert stats['sqlite_hits'] == 1 and stats['hits'] == 1
+    cache.close()
+
+def test_stale_sqlite_row_is_not_promoted(tmp_path):
+    # SQLite 中的行写入后立即过期
+    cache = make_cache(tmp_path, sqlite_ttl=-1)
+
+    async def run():
+        await cache.set('翻译', VALUE)
+        cache._entries.clear()
+        assert await cache.get('翻译') is None
+        assert await cache.get('翻译', allow_stale=True) == VALUE
+        # 兜底之后正常查询仍然未命中，不能被当作新鲜结果
+        assert await cache.get('翻译') is None
+
+    asyncio.run(run())
+    stats = cache.stats()
+    assert stats['stale_hits'] == 1 and stats['sqlite_hits'] == 0 and stats['entries'] == 0
+    cache.close()
+
+def test_promoted_row_keeps_its_sqlite_expiry(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, ttl=3600, sqlite_ttl=10)
+    now = [1000.0]
+    monkeypatch.setattr('app.services.cache.time.time', lambda: now[0])
+    monkeypatch.setattr('app.services.cache.time.monotonic', lambda: now[0])
+
+    async def run():
+        await cache.set('翻译', VALUE)
+        cache._entries.clear()
+        now[0] += 8
+        # 从 SQLite 读出时只剩 2 秒
+        assert await cache.get('翻译') == VALUE
+        now[0] += 3
+        assert await cache.get('翻译') is None
+
+    asyncio.run(run())
+    cache.close()
+
+def test_stale_lookup_counts_once(tmp_path, monkeypatch):
+    from app.services import translation
+    from app.services.resilience import CircuitBreaker
+
+    cache = make_cache(tmp_path, ttl=-1, sqlite_ttl=-1)
+    breaker = CircuitBreaker(failure_threshold=1)
+    monkeypatch.setattr(translation, 'get_cache', lambda: cache)
+    monkeypatch.setattr(translation, 'get_circuit_breaker', lambda: breaker)
+
+    async def run():
+        await cache.set('翻译', VALUE)
+        # 熔断之前：过期条目不返回
+        assert await translation.cached_result('翻译') is None
+        breaker.record_failure()
+        assert await translation.cached_result('翻译') == VALUE
+
+    asyncio.run(run())
+    stats = cache.stats()
+    assert (stats['hits'], stats['sqlite_hits'], stats['stale_hits'], stats['misses']) == (0, 0, 1, 1)
+    cache.close()
@@ -0,0 +1,45 @@
+import logging
+from sqlalchemy import create_engine
+from app.config import config
+from app.models.migrations import run_migrations, assign_legacy_records
+
+def old_database(tmp_path):
+    """迁移之前的 translations 表，没有 open_id 列"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'translations.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            'CREATE TABLE translations (id INTEGER PRIMARY KEY, original_sentence VARCHAR NOT NULL, '
+            'translated_sentence VARCHAR NOT NULL, furigana VARCHAR NOT NULL, grammar TEXT NOT NULL)'
+        )
+        conn.exec_driver_sql('CREATE TABLE user_sessions (session_id VARCHAR PRIMARY KEY, expires_at DATETIME)')
+        for index in range(3):
+            conn.exec_driver_sql(
+                "INSERT INTO translations (original_sentence, translated_sentence, furigana, grammar) "
+                f"VALUES ('句子{index}', '文{index}', 'ぶん', '')"
+            )
+    return engine
+
+def owners(engine) -> list:
+    with engine.connect() as conn:
+        return [row[0] for row in conn.exec_driver_sql('SELECT open_id FROM translations ORDER BY id')]
+
+def test_legacy_owner_set_after_upgrade_still_applies(tmp_path, monkeypatch, caplog):
+    engine = old_database(tmp_path)
+    monkeypatch.setattr(config, '_config_data', {'records': {'legacy_owner': ''}})
+    with caplog.at_level(logging.WARNING):
+        run_migrations(engine)
+        assign_legacy_records(engine)
+    assert owners(engine) == [None, None, None]
+    assert '有 3 条没有归属的旧记录' in caplog.text
+
+    # 升级完成（user_version 已是最新）之后才配置 legacy_owner
+    monkeypatch.setattr(config, '_config_data', {'records': {'legacy_owner': 'owner-1'}})
+    run_migrations(engine)
+    assign_legacy_records(engine)
+    assert owners(engine) == ['owner-1'] * 3
+
+    # 重复执行不会改动已有归属的记录
+    monkeypatch.setattr(config, '_config_data', {'records': {'legacy_owner': 'owner-2'}})
+    assign_legacy_records(engine)
+    assert owners(engine) == ['owner-1'] * 3
+    engine.dispose()
@@ -0,0 +1,20 @@
+from app.services.records import _like_snippet, _escape_snippet, MARK_OPEN, MARK_CLOSE
+
+def record(**values) -> dict:
+    return {'original_sentence': '', 'translated_sentence': '', 'grammar': '', **values}
+
+def test_like_snippet_ignores_ascii_case_and_keeps_original_text():
+    snippet = _like_snippet(record(original_sentence='Say Hello to 友達'), 'hello')
+    assert snippet == 'Say <mark>Hello</mark> to 友達'
+
+def test_like_snippet_escapes_record_text():
+    snippet = _like_snippet(record(grammar='<i>x</i> & <b>バカ</b>'), 'バカ')
+    assert snippet == '&lt;i&gt;x&lt;/i&gt; &amp; &lt;b&gt;<mark>バカ</mark>&lt;/b&gt;'
+
+def test_like_snippet_without_match():
+    assert _like_snippet(record(original_sentence='猫'), '犬') is None
+
+def test_fts_snippet_is_escaped_except_marks():
+    raw = f'…<script>{MARK_OPEN}公园{MARK_CLOSE}</script>'
+    assert _escape_snippet(raw) == '…&lt;script&gt;<mark>公园</mark>&lt;/script&gt;'
+    assert _escape_snippet(None) is None
@@ -0,0 +1,89 @@
+import asyncio
+import pytest
+from app.services import translation
+from app.services.llm import LLMProvider
+from app.services.resilience import CircuitBreaker, UpstreamError, CLOSED, OPEN, HALF_OPEN
+
+class HangingProvider(LLMProvider):
+    """第一个增量永远不会到达，用来模拟客户端断开时仍在等待上游的探测请求"""
+    name = 'hanging'
+
+    def __init__(self):
+        self.started = asyncio.Event()
+
+    async def stream(self, messages: list, usage):
+        self.started.set()
+        await asyncio.Event().wait()
+        yield ''
+
+def open_breaker(recovery_timeout: float = 30) -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=recovery_timeout)
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    return breaker
+
+def test_opens_after_threshold_and_probes_once():
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # 探测进行中，其余请求被拒绝
+    breaker.recovery_timeout = 30
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow()
+
+def test_failed_probe_reopens():
+    breaker = open_breaker(recovery_timeout=0)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+def test_released_probe_lets_next_request_probe():
+    breaker = open_breaker(recovery_timeout=0)
+    assert breaker.allow()
+    breaker.recovery_timeout = 30
+    assert not breaker.allow()
+    breaker.release_probe()
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+
+def test_stuck_probe_expires_after_recovery_timeout(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('app.services.resilience.time.monotonic', lambda: now[0])
+    breaker = open_breaker(recovery_timeout=30)
+    assert not breaker.allow()
+    now[0] += 30
+    assert breaker.allow()
+    assert not breaker.allow()
+    now[0] += 30
+    assert breaker.allow()
+
+def test_cancelled_probe_does_not_wedge_breaker(monkeypatch):
+    breaker = open_breaker(recovery_timeout=0)
+    monkeypatch.setattr(translation, 'get_circuit_breaker', lambda: breaker)
+
+    async def run():
+        provider = HangingProvider()
+        task = asyncio.create_task(translation._open_upstream('探测', provider))
+        await provider.started.wait()
+        assert breaker.state == HALF_OPEN
+        # 与 Flight.unsubscribe 一样，最后一个订阅者断开时直接取消上游任务
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    breaker.recovery_timeout = 30
+    assert breaker.allow()
+
+def test_open_breaker_fails_fast(monkeypatch):
+    breaker = open_breaker(recovery_timeout=30)
+    monkeypatch.setattr(translation, 'get_circuit_breaker', lambda: breaker)
+    assert breaker.is_open()
+    with pytest.raises(UpstreamError):
+        asyncio.run(translation._open_upstream('熔断', HangingProvider()))
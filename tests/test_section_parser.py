@@ -0,0 +1,40 @@
+from app.services.section_parser import SectionParser, TRANSLATED, FURIGANA, GRAMMAR
+
+ANSWER = (
+    '1. 翻译结果: 今日は公園を散歩しました。\n'
+    '2. 平假名注释：きょうはこうえんをさんぽしました。\n'
+    '3. 语法解析: 「を」表示动作的对象。'
+)
+EXPECTED = {
+    TRANSLATED: '今日は公園を散歩しました。',
+    FURIGANA: 'きょうはこうえんをさんぽしました。',
+    GRAMMAR: '「を」表示动作的对象。',
+}
+
+def parse(deltas) -> dict:
+    parser = SectionParser()
+    result = {TRANSLATED: '', FURIGANA: '', GRAMMAR: ''}
+    for delta in deltas:
+        for section, text in parser.feed(delta):
+            result[section] += text
+    for section, text in parser.finish():
+        result[section] += text
+    return result
+
+def test_whole_answer():
+    assert parse([ANSWER]) == EXPECTED
+
+def test_markers_split_at_every_position():
+    for split in range(1, len(ANSWER)):
+        assert parse([ANSWER[:split], ANSWER[split:]]) == EXPECTED, split
+
+def test_one_character_per_delta():
+    assert parse(list(ANSWER)) == EXPECTED
+
+def test_text_before_first_marker_is_dropped():
+    assert parse(['好的，', ANSWER]) == EXPECTED
+
+def test_finish_flushes_held_marker_prefix():
+    parser = SectionParser()
+    assert parser.feed('1. 翻译结果: 猫\n2. 平') == [(TRANSLATED, '猫')]
+    assert parser.finish() == [(TRANSLATED, '\n2. 平')]
@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+from starlette.requests import ClientDisconnect
+from app.services.singleflight import InFlightRegistry
+from app.services.sse import ClosingStreamingResponse, DELTA, DONE
+
+def endless_producer(started: asyncio.Event):
+    async def produce():
+        started.set()
+        while True:
+            await asyncio.sleep(0.01)
+            yield [('translated', '猫')]
+    return produce
+
+def test_closing_unstarted_subscriber_cancels_flight():
+    async def run():
+        registry = InFlightRegistry(queue_size=4)
+        started = asyncio.Event()
+        subscriber = registry.join('key', endless_producer(started))
+        flight = subscriber.flight
+        await started.wait()
+        # 从未迭代过的订阅者
+        subscriber.close()
+        subscriber.close()
+        with pytest.raises(asyncio.CancelledError):
+            await flight.task
+        assert not flight.subscribers and not registry.flights
+
+    asyncio.run(run())
+
+def test_flight_continues_while_other_subscribers_remain():
+    async def run():
+        registry = InFlightRegistry(queue_size=64)
+
+        async def produce():
+            for text in ('一', '二'):
+                await asyncio.sleep(0.01)
+                yield [('translated', text)]
+
+        first = registry.join('key', lambda: produce())
+        second = registry.join('key', lambda: produce())
+        async with first:
+            pass
+        kinds = [kind async for kind, _ in second]
+        assert kinds == [DELTA, DELTA, DONE]
+
+    asyncio.run(run())
+
+def test_response_runs_on_close_when_client_is_gone():
+    closed = []
+
+    async def body():
+        yield 'data: {}\n\n'
+
+    async def receive():
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        raise OSError('连接已断开')
+
+    async def run():
+        response = ClosingStreamingResponse(body(), on_close=lambda: closed.append(True),
+                                            media_type='text/event-stream')
+        with pytest.raises((OSError, ClientDisconnect)):
+            await response({'type': 'http', 'asgi': {'spec_version': '2.4'}}, receive, send)
+
+    asyncio.run(run())
+    assert closed == [True]
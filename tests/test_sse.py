@@ -0,0 +1,70 @@
+import asyncio
+from app.services.sse import FlushPolicy, FLUSH_PACE, FLUSH_WINDOW, DELTA, DONE, SYNC
+
+TPS = 50
+
+async def upstream(count: int, interval: float = 0, tail=(DONE, None), sent: list | None = None):
+    for index in range(count):
+        if interval:
+            await asyncio.sleep(interval)
+        if sent is not None:
+            sent.append(asyncio.get_running_loop().time())
+        yield (DELTA, [('translated', str(index))])
+    if tail is not None:
+        yield tail
+
+async def collect(events) -> list[tuple[float, str, object]]:
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    return [(loop.time() - started, kind, data) async for kind, data in events]
+
+def text_of(received) -> str:
+    return ''.join(text for _, kind, data in received if kind == DELTA for _, text in data)
+
+def test_pace_releases_buffered_tokens_after_upstream_finishes():
+    policy = FlushPolicy(FLUSH_PACE, tokens_per_second=TPS)
+    received = asyncio.run(collect(policy.apply(upstream(10))))
+
+    assert text_of(received) == ''.join(str(index) for index in range(10))
+    assert received[-1][1] == DONE
+    deltas = [item for item in received if item[1] == DELTA]
+    assert len(deltas) == 10
+    # 第 i 个 token 在 i / TPS 秒时发送，done 排在最后一个 token 之后
+    assert received[-1][0] >= 9 / TPS * 0.9
+    for index, (at, _, _) in enumerate(deltas):
+        assert at >= index / TPS * 0.9
+
+def test_pace_deadline_does_not_recede_while_upstream_is_faster():
+    policy = FlushPolicy(FLUSH_PACE, tokens_per_second=TPS)
+    sent = []
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        return [loop.time() async for kind, _ in policy.apply(upstream(40, interval=0.005, sent=sent)) if kind == DELTA]
+
+    released = asyncio.run(run())
+    # 上游 0.2s 内发完 40 个 token，比节奏快；这期间仍应按每秒 TPS 个的节奏持续发送
+    assert sum(1 for at in released if at < sent[-1]) >= 5
+
+def test_pace_catches_up_when_upstream_is_slower():
+    policy = FlushPolicy(FLUSH_PACE, tokens_per_second=1000)
+    received = asyncio.run(collect(policy.apply(upstream(5, interval=0.01))))
+    assert [kind for _, kind, _ in received] == [DELTA] * 5 + [DONE]
+    assert text_of(received) == '01234'
+
+def test_pace_sync_replaces_buffered_tokens():
+    async def events():
+        for index in range(3):
+            yield (DELTA, [('translated', str(index))])
+        yield (SYNC, {'translated': '012'})
+        yield (DONE, None)
+
+    policy = FlushPolicy(FLUSH_PACE, tokens_per_second=TPS)
+    kinds = [kind for _, kind, _ in asyncio.run(collect(policy.apply(events())))]
+    assert kinds[-2:] == [SYNC, DONE]
+
+def test_window_merges_tokens():
+    policy = FlushPolicy(FLUSH_WINDOW, window_ms=1000, window_tokens=4)
+    received = asyncio.run(collect(policy.apply(upstream(10))))
+    assert [kind for _, kind, _ in received] == [DELTA] * 3 + [DONE]
+    assert text_of(received) == '0123456789'
@@ -0,0 +1,137 @@
+import asyncio
+import pytest
+from app.services import translation
+from app.services.llm import LLMProvider
+from app.services.resilience import CircuitBreaker
+from app.services.usage import get_usage_tracker
+
+class StalledProvider(LLMProvider):
+    """发出 deltas 个增量后不再输出，也不会报告用量"""
+    name = 'stalled'
+
+    def __init__(self, deltas: int, fail: bool = False):
+        self.deltas = deltas
+        self.fail = fail
+
+    async def stream(self, messages: list, usage):
+        for index in range(self.deltas):
+            yield f'{index}'
+        if self.fail:
+            raise RuntimeError('连接被重置')
+        await asyncio.Event().wait()
+
+@pytest.fixture(autouse=True)
+def breaker(monkeypatch):
+    breaker = CircuitBreaker()
+    monkeypatch.setattr(translation, 'get_circuit_breaker', lambda: breaker)
+    return breaker
+
+def today_usage(open_id: str) -> dict:
+    return asyncio.run(get_usage_tracker().get(open_id))
+
+def prompt_tokens(sentence: str) -> int:
+    return sum(len(m['content']) for m in translation.build_messages(sentence))
+
+def test_cancelled_stream_is_charged(monkeypatch):
+    monkeypatch.setattr(get_usage_tracker(), '_load', lambda key: asyncio.sleep(0, [0, 0, 0]))
+
+    async def run():
+        stream = translation.stream_translation('取消', StalledProvider(3), 'user-cancelled')
+        task = asyncio.create_task(stream.__anext__())
+        await asyncio.sleep(0.05)
+        # 客户端断开：订阅者取消任务后关闭生成器
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await stream.aclose()
+
+    asyncio.run(run())
+    used = today_usage('user-cancelled')
+    assert used['prompt_tokens'] == prompt_tokens('取消')
+    assert used['completion_tokens'] == 3
+
+def test_failed_stream_is_charged(monkeypatch):
+    monkeypatch.setattr(get_usage_tracker(), '_load', lambda key: asyncio.sleep(0, [0, 0, 0]))
+
+    async def run():
+        async for _ in translation.stream_translation('中断', StalledProvider(2, fail=True), 'user-failed'):
+            pass
+
+    with pytest.raises(translation.UpstreamError):
+        asyncio.run(run())
+    used = today_usage('user-failed')
+    assert used['prompt_tokens'] == prompt_tokens('中断')
+    assert used['completion_tokens'] == 2
+
+class StalledSession:
+    """execute 一直不返回的数据库会话，用来在写入过程中取消 flush"""
+
+    def __init__(self, started: asyncio.Event):
+        self.started = started
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, stmt, rows):
+        self.started.set()
+        await asyncio.Event().wait()
+
+def test_cancelled_flush_keeps_counts(monkeypatch):
+    from app.services import usage
+    from app.services.llm import Usage
+
+    tracker = usage.UsageTracker()
+    monkeypatch.setattr(tracker, '_load', lambda key: asyncio.sleep(0, [0, 0, 0]))
+    started = asyncio.Event()
+    monkeypatch.setattr(usage, 'AsyncSessionLocal', lambda: StalledSession(started))
+
+    async def run():
+        tracker.record_request('user-flush')
+        spent = Usage()
+        spent.prompt_tokens, spent.completion_tokens = 10, 5
+        tracker.record_tokens('user-flush', spent)
+        task = asyncio.create_task(tracker.flush())
+        await started.wait()
+        # 写入过程中又来了新的计数
+        tracker.record_request('user-flush')
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return await tracker.get('user-flush')
+
+    used = asyncio.run(run())
+    assert (used['requests'], used['prompt_tokens'], used['completion_tokens']) == (2, 10, 5)
+    assert not tracker._flushing
+
+class SlowFirstProvider(LLMProvider):
+    """第一次请求一直等不到首 token，之后的请求立即返回并报告用量"""
+    name = 'slow-first'
+
+    def __init__(self):
+        self.calls = 0
+
+    async def stream(self, messages: list, usage):
+        self.calls += 1
+        if self.calls == 1:
+            await asyncio.Event().wait()
+        yield '1. 翻译结果: 猫'
+        usage.prompt_tokens, usage.completion_tokens = 100, 7
+
+def test_hedge_loser_is_charged(monkeypatch):
+    monkeypatch.setattr(get_usage_tracker(), '_load', lambda key: asyncio.sleep(0, [0, 0, 0]))
+    monkeypatch.setattr(translation.config, '_config_data', {'deepseek': {'hedge': {'enabled': True, 'delay': 0.05}}})
+    provider = SlowFirstProvider()
+
+    async def run():
+        async for _ in translation.stream_translation('对冲', provider, 'user-hedged'):
+            pass
+
+    asyncio.run(run())
+    assert provider.calls == 2
+    used = today_usage('user-hedged')
+    # 胜出请求报告的用量，加上落败请求估算的提示词
+    assert used['prompt_tokens'] == 100 + prompt_tokens('对冲')
+    assert used['completion_tokens'] == 7